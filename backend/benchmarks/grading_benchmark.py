@@ -0,0 +1,421 @@
+"""
+Grading Benchmark
+End-to-end grading throughput without a real Judge0: seeds a synthetic exam
+(students x questions submissions), queues it like process-submissions does,
+grades it with in-process queue workers against the Judge0 stub and reports
+submissions/sec, per-submission latency (p50/p95) and the database write rate.
+
+    python -m backend.benchmarks.grading_benchmark --students 200 --questions 3 \\
+        --tests 10 --graders 2 --workers 16 --latency-ms 100 --jitter-ms 40
+
+Needs the database from DATABASE_URL. Everything it creates is tagged with
+extra_data.benchmark and deleted afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import math
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import engine, init_schema, load_models
+from ..wait_for_db import wait_for_db
+from ..services import grading_queue
+from ..services.executors import JUDGE0
+from ..services.grading_scheduler import AdaptiveConcurrencyLimiter
+from ..services.grading_store import run_in_session
+from ..services.judge0_callbacks import CALLBACK_PATH, judge0_callbacks
+from ..services.judge0_client import Judge0Client
+from ..services.submission_processor import LeetCodeAPI, SubmissionProcessor
+from .judge0_stub import Judge0Stub, add_stub_arguments, stub_config_from_args
+
+logger = logging.getLogger(__name__)
+
+load_models()
+
+# Synthetic question: add two numbers
+SOLUTION_SOURCE = "a, b = map(int, input().split())\nprint(a + b)\n"
+MONITOR_INTERVAL = 0.5
+
+
+def seed_exam(db: Session, run_id: str, students: int, questions: int, tests: int) -> Dict[str, Any]:
+    """Insert the synthetic exam; returns its ids"""
+    tag = {"benchmark": run_id}
+    now = datetime.utcnow()
+    teacher_id = uuid.uuid4()
+    category_id = uuid.uuid4()
+    course_id = uuid.uuid4()
+    exam_id = uuid.uuid4()
+    student_ids = [uuid.uuid4() for _ in range(students)]
+    question_ids = [uuid.uuid4() for _ in range(questions)]
+
+    db.execute(insert(models.User), [
+        {"id": user_id, "email": f"bench-{run_id}-{i}@benchmark.invalid", "password_hash": "!",
+         "role": role, "extra_data": tag}
+        for i, (user_id, role) in enumerate(
+            [(teacher_id, models.UserRole.TEACHER)] + [(sid, models.UserRole.STUDENT) for sid in student_ids]
+        )
+    ])
+    db.execute(insert(models.QuestionCategory), [
+        {"id": category_id, "name": f"benchmark-{run_id}", "extra_data": tag}
+    ])
+    db.execute(insert(models.Course), [
+        {"id": course_id, "course_code": f"BM-{run_id}", "course_name": "Grading benchmark", "credits": 0}
+    ])
+    db.execute(insert(models.Exam), [{
+        "id": exam_id, "course_id": course_id, "created_by": teacher_id, "title": f"Grading benchmark {run_id}",
+        "start_time": now - timedelta(hours=1), "end_time": now, "duration_minutes": 60,
+        "exam_type": models.ExamType.PRACTICE, "status": models.ExamStatus.COMPLETED, "extra_data": tag,
+    }])
+    db.execute(insert(models.Question), [
+        {"id": qid, "category_id": category_id, "created_by": teacher_id, "title": f"Benchmark question {q + 1}",
+         "problem_statement": "Print the sum of two integers.", "difficulty": models.Difficulty.EASY,
+         "max_score": 100, "extra_data": tag}
+        for q, qid in enumerate(question_ids)
+    ])
+    db.execute(insert(models.ExamQuestion), [
+        {"exam_id": exam_id, "question_id": qid, "question_order": q + 1, "points": 100}
+        for q, qid in enumerate(question_ids)
+    ])
+    db.execute(insert(models.QuestionTestCase), [
+        {"question_id": qid, "input_data": f"{t} {q}", "expected_output": str(t + q), "weight": 1}
+        for q, qid in enumerate(question_ids) for t in range(tests)
+    ])
+    # Distinct sources, so no submission is answered from the execution result cache
+    submissions = [
+        {"id": uuid.uuid4(), "exam_id": exam_id, "question_id": qid, "student_id": sid,
+         "source_code": f"{SOLUTION_SOURCE}# {run_id} {s} {q}\n", "language": "python3",
+         "extra_data": tag}
+        for s, sid in enumerate(student_ids) for q, qid in enumerate(question_ids)
+    ]
+    if submissions:
+        db.execute(insert(models.Submission), submissions)
+    db.commit()
+    return {
+        "exam_id": exam_id,
+        "user_ids": [teacher_id] + student_ids,
+        "question_ids": question_ids,
+        "category_id": category_id,
+        "course_id": course_id,
+        "submission_ids": [s["id"] for s in submissions],
+    }
+
+
+def create_job(db: Session, exam_id: uuid.UUID, submission_ids: List[uuid.UUID]) -> models.GradingJob:
+    """A job with one pending task per seeded submission (no attempt selection to do)"""
+    job = models.GradingJob(
+        exam_id=exam_id,
+        status=models.GradingJobStatus.PROCESSING,
+        total=len(submission_ids),
+        errors=[],
+    )
+    db.add(job)
+    db.flush()
+    db.execute(
+        insert(models.GradingTask),
+        [{"job_id": job.id, "submission_id": submission_id} for submission_id in submission_ids],
+    )
+    db.commit()
+    return job
+
+
+def cleanup(db: Session, seeded: Dict[str, Any]):
+    """Delete everything seed_exam created, and what grading it produced"""
+    submission_ids = seeded["submission_ids"]
+    exam_id = seeded["exam_id"]
+    question_ids = seeded["question_ids"]
+    # Jobs cascade to their tasks and events
+    db.execute(delete(models.GradingJob).where(models.GradingJob.exam_id == exam_id))
+    for model in (models.SubmissionResult, models.SubmissionEvent):
+        db.execute(delete(model).where(model.submission_id.in_(submission_ids)))
+    db.execute(delete(models.Submission).where(models.Submission.exam_id == exam_id))
+    db.execute(delete(models.ExamQuestion).where(models.ExamQuestion.exam_id == exam_id))
+    db.execute(delete(models.QuestionTestCase).where(models.QuestionTestCase.question_id.in_(question_ids)))
+    db.execute(delete(models.Question).where(models.Question.id.in_(question_ids)))
+    db.execute(delete(models.Exam).where(models.Exam.id == exam_id))
+    db.execute(delete(models.Course).where(models.Course.id == seeded["course_id"]))
+    db.execute(delete(models.QuestionCategory).where(models.QuestionCategory.id == seeded["category_id"]))
+    db.execute(delete(models.User).where(models.User.id.in_(seeded["user_ids"])))
+    db.commit()
+
+
+def read_write_counters(db: Session) -> Optional[Dict[str, int]]:
+    """Database-wide commit and row counters (Postgres only; None elsewhere)"""
+    try:
+        # Stats of other backends reach pg_stat_database with a short delay
+        db.execute(text("SELECT pg_stat_clear_snapshot()"))
+        row = db.execute(text(
+            "SELECT xact_commit, tup_inserted, tup_updated, tup_deleted "
+            "FROM pg_stat_database WHERE datname = current_database()"
+        )).one()
+        db.rollback()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"pg_stat_database unavailable, no DB write rate: {e}")
+        return None
+    return {"commits": row[0], "rows_inserted": row[1], "rows_updated": row[2], "rows_deleted": row[3]}
+
+
+def load_task_timings(db: Session, job_id: uuid.UUID) -> List[Dict[str, Any]]:
+    rows = db.execute(
+        select(
+            models.GradingTask.status,
+            models.GradingTask.created_at,
+            models.GradingTask.claimed_at,
+            models.GradingTask.finished_at,
+        ).where(models.GradingTask.job_id == job_id)
+    ).all()
+    return [
+        {"status": row.status.value, "created_at": row.created_at,
+         "claimed_at": row.claimed_at, "finished_at": row.finished_at}
+        for row in rows
+    ]
+
+
+def count_results(db: Session, submission_ids: List[uuid.UUID]) -> Dict[str, int]:
+    rows = db.execute(
+        select(models.SubmissionResult.status, func.count())
+        .where(models.SubmissionResult.submission_id.in_(submission_ids))
+        .group_by(models.SubmissionResult.status)
+    ).all()
+    return {status.value: count for status, count in rows}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": _round(percentile(values, 50)),
+        "p95": _round(percentile(values, 95)),
+        "max": _round(max(values) if values else None),
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+async def _start_callback_receiver() -> web.AppRunner:
+    """Stands in for the API's callback endpoint, feeding this process's registry"""
+    async def receive(request: web.Request) -> web.Response:
+        if not judge0_callbacks.check_secret(request.query.get("secret")):
+            return web.json_response({"detail": "Invalid callback secret"}, status=403)
+        return web.json_response({"matched": judge0_callbacks.resolve(await request.json())})
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_put(CALLBACK_PATH, receive)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    host, port = runner.addresses[0][:2]
+    judge0_callbacks.base_url = f"http://{host}:{port}"
+    return runner
+
+
+async def grade_job(
+    job_id: uuid.UUID,
+    judge0_url: str,
+    graders: int,
+    concurrency: Optional[int],
+    use_batch: bool,
+    use_callbacks: bool,
+    timeout: float,
+) -> Dict[str, Any]:
+    """Run `graders` queue workers until the job is done; returns timing and worker stats"""
+    client = Judge0Client(judge0_url)
+    processors = []
+    for _ in range(graders):
+        processor = SubmissionProcessor()
+        processor.leetcode_api = LeetCodeAPI(
+            judge0_url, use_batch=use_batch, use_callbacks=use_callbacks, client=client, executor_backend=JUDGE0
+        )
+        processors.append(processor)
+
+    overrides = {"ceiling": concurrency} if concurrency else {}
+    stop_event = asyncio.Event()
+    started = time.monotonic()
+    workers = [
+        asyncio.create_task(processor.run_queue_worker(
+            stop_event,
+            worker_id=f"benchmark-{index}",
+            limiter=AdaptiveConcurrencyLimiter.from_env(**overrides)
+        ))
+        for index, processor in enumerate(processors)
+    ]
+
+    job, status = None, None
+    try:
+        while time.monotonic() - started < timeout:
+            await asyncio.sleep(MONITOR_INTERVAL)
+            job = await run_in_session(lambda db: grading_queue.job_to_status(grading_queue.get_job(db, job_id)))
+            status = job["status"]
+            if status != models.GradingJobStatus.PROCESSING.value:
+                break
+            if all(worker.done() for worker in workers):
+                break
+        elapsed = time.monotonic() - started
+    finally:
+        stop_event.set()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await client.close()
+
+    return {
+        "elapsed": elapsed,
+        "job": job,
+        "timed_out": status == models.GradingJobStatus.PROCESSING.value,
+        "client": client.stats(),
+        "workers": [processor.worker_stats for processor in processors],
+    }
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    run_id = uuid.uuid4().hex[:12]
+    stub = Judge0Stub(stub_config_from_args(args))
+    judge0_url = await stub.start()
+    receiver = await _start_callback_receiver() if args.callbacks else None
+
+    seeded = await run_in_session(seed_exam, run_id, args.students, args.questions, args.tests)
+    submission_ids = seeded["submission_ids"]
+    try:
+        before = await run_in_session(read_write_counters)
+        job = await run_in_session(create_job, seeded["exam_id"], submission_ids)
+        job_id = job.id
+
+        # process_single_submission prints a trace per submission
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with output:
+            graded = await grade_job(
+                job_id, judge0_url, args.graders, args.concurrency,
+                use_batch=not args.no_batch, use_callbacks=args.callbacks, timeout=args.timeout
+            )
+
+        # Let the last transactions' statistics reach pg_stat_database
+        await asyncio.sleep(1)
+        after = await run_in_session(read_write_counters)
+        timings = await run_in_session(load_task_timings, job_id)
+        results = await run_in_session(count_results, submission_ids)
+    finally:
+        if receiver is not None:
+            await receiver.cleanup()
+        await stub.stop()
+        if not args.keep:
+            await run_in_session(cleanup, seeded)
+
+    elapsed = graded["elapsed"]
+    finished = [t for t in timings if t["finished_at"] is not None]
+    latencies = [
+        (t["finished_at"] - t["claimed_at"]).total_seconds() for t in finished if t["claimed_at"] is not None
+    ]
+    turnaround = [(t["finished_at"] - t["created_at"]).total_seconds() for t in finished]
+
+    db_writes = None
+    if before is not None and after is not None:
+        delta = {key: after[key] - before[key] for key in before}
+        rows_written = delta["rows_inserted"] + delta["rows_updated"] + delta["rows_deleted"]
+        db_writes = {
+            **delta,
+            "commits_per_sec": round(delta["commits"] / elapsed, 1),
+            "rows_written_per_sec": round(rows_written / elapsed, 1),
+        }
+
+    return {
+        "run_id": run_id,
+        "kept": args.keep,
+        "exam_id": str(seeded["exam_id"]),
+        "config": {
+            "students": args.students, "questions": args.questions, "tests": args.tests,
+            "graders": args.graders, "concurrency": args.concurrency,
+            "batch": not args.no_batch, "callbacks": args.callbacks,
+            "stub": {"workers": args.workers, "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                     "verdicts": args.verdicts, "compile_error_rate": args.compile_error_rate},
+        },
+        "submissions": len(submission_ids),
+        "graded": len(finished),
+        "timed_out": graded["timed_out"],
+        "elapsed_seconds": round(elapsed, 3),
+        "submissions_per_sec": round(len(finished) / elapsed, 2) if elapsed else None,
+        "test_runs_per_sec": round(len(finished) * args.tests / elapsed, 1) if elapsed else None,
+        # claimed -> results stored, and queued -> results stored
+        "latency_seconds": latency_summary(latencies),
+        "turnaround_seconds": latency_summary(turnaround),
+        "result_rows": results,
+        "result_rows_per_sec": round(sum(results.values()) / elapsed, 1) if elapsed else None,
+        "db_writes": db_writes,
+        "job": graded["job"],
+        "judge0_stub": stub.stats(),
+        "judge0_client": graded["client"],
+        "callbacks": judge0_callbacks.stats() if args.callbacks else None,
+        "workers": graded["workers"],
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"Grading benchmark {report['run_id']}: {report['graded']}/{report['submissions']} submissions "
+          f"in {report['elapsed_seconds']}s" + (" (TIMED OUT)" if report["timed_out"] else ""))
+    print(f"  throughput   {report['submissions_per_sec']} submissions/s, {report['test_runs_per_sec']} test runs/s")
+    latency, turnaround = report["latency_seconds"], report["turnaround_seconds"]
+    print(f"  latency      p50 {latency['p50']}s  p95 {latency['p95']}s  max {latency['max']}s (claim -> stored)")
+    print(f"  turnaround   p50 {turnaround['p50']}s  p95 {turnaround['p95']}s  max {turnaround['max']}s (queued -> stored)")
+    db_writes = report["db_writes"]
+    if db_writes:
+        print(f"  db writes    {db_writes['commits_per_sec']} commits/s, {db_writes['rows_written_per_sec']} rows/s "
+              f"({db_writes['commits']} commits, {db_writes['rows_inserted']} inserted, "
+              f"{db_writes['rows_updated']} updated)")
+    print(f"  results      {report['result_rows_per_sec']} rows/s {report['result_rows']}")
+    stub = report["judge0_stub"]
+    print(f"  judge0 stub  {stub['created']} runs, {stub['batches']} batches, {stub['polls']} polls, "
+          f"{stub['callbacks_sent']} callbacks, {stub['rejected']} rejected")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a synthetic exam against the Judge0 stub")
+    parser.add_argument("--students", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--tests", type=int, default=10, help="Test cases per question")
+    parser.add_argument("--graders", type=int, default=1, help="Queue workers in this process")
+    parser.add_argument(
+        "--concurrency", type=int, default=None,
+        help="Max submissions in flight per grader (default: GRADING_MAX_CONCURRENCY)"
+    )
+    parser.add_argument("--no-batch", action="store_true", help="Per-test submissions instead of /submissions/batch")
+    parser.add_argument("--callbacks", action="store_true", help="Finish submissions via callback_url instead of polling")
+    parser.add_argument("--timeout", type=float, default=600, help="Give up after this many seconds")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic exam and its results")
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Keep the per-submission grading output")
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    wait_for_db(engine, timeout=60)
+    init_schema()
+
+    report = asyncio.run(run_benchmark(args))
+    if args.json:
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+    else:
+        print_report(report)
+    # Non-zero when anything was left ungraded, so CI can run it as a smoke test
+    return 0 if report["graded"] == report["submissions"] and not report["timed_out"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
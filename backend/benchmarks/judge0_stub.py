@@ -0,0 +1,420 @@
+"""
+Judge0 Stub
+A Judge0-compatible server that runs nothing: every submission waits in a
+simulated worker queue for a configurable latency and gets a verdict drawn
+from a configurable distribution. Implements what the grader uses:
+POST/GET /submissions (wait=true/false, callback_url), /submissions/batch
+and GET /workers.
+
+    python -m backend.benchmarks.judge0_stub --port 2358 --workers 8 \\
+        --latency-ms 150 --jitter-ms 50 \\
+        --verdicts accepted=0.8,wrong_answer=0.15,time_limit_exceeded=0.05
+
+Point JUDGE0_API_URL at it to exercise the API or a grader without a real
+Judge0. The multi-file language (packed runs, compile-once) is rejected like
+on a Judge0 without it, so graders fall back to per-test submissions.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import logging
+import random
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# verdict name -> (Judge0 status id, description)
+VERDICTS = {
+    "accepted": (3, "Accepted"),
+    "wrong_answer": (4, "Wrong Answer"),
+    "time_limit_exceeded": (5, "Time Limit Exceeded"),
+    "runtime_error": (11, "Runtime Error (NZEC)"),
+    "internal_error": (13, "Internal Error"),
+}
+COMPILATION_ERROR = (6, "Compilation Error")
+IN_QUEUE = (1, "In Queue")
+PROCESSING = (2, "Processing")
+
+DEFAULT_VERDICTS = "accepted=0.8,wrong_answer=0.15,time_limit_exceeded=0.03,runtime_error=0.02"
+
+# MAX_SUBMISSION_BATCH_SIZE in judge0.conf
+MAX_BATCH_SIZE = 20
+MULTI_FILE_LANGUAGE_ID = 89
+TEXT_FIELDS = ("source_code", "stdin", "expected_output", "stdout", "stderr", "compile_output", "message")
+DEFAULT_FIELDS = ("token", "stdout", "time", "memory", "stderr", "compile_output", "message", "status")
+
+
+def parse_verdicts(spec: str) -> Dict[str, float]:
+    """"accepted=0.8,wrong_answer=0.2" -> weights by verdict name"""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in VERDICTS:
+            raise ValueError(f"Unknown verdict {name!r} (expected one of {', '.join(VERDICTS)})")
+        weights[name] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("Verdict weights must add up to more than 0")
+    return weights
+
+
+class StubConfig:
+    def __init__(
+        self,
+        workers: int = 8,
+        latency_ms: float = 100,
+        jitter_ms: float = 0,
+        verdicts: Optional[Dict[str, float]] = None,
+        compile_error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        max_retained: int = 100000,
+    ):
+        self.workers = max(1, workers)
+        self.latency_ms = max(0.0, latency_ms)
+        self.jitter_ms = max(0.0, jitter_ms)
+        self.verdicts = verdicts or parse_verdicts(DEFAULT_VERDICTS)
+        # Share of distinct sources that "fail to compile" (every test of that source)
+        self.compile_error_rate = compile_error_rate
+        self.seed = seed
+        # Finished submissions kept for GET; the oldest are forgotten first
+        self.max_retained = max_retained
+
+
+class Judge0Stub:
+    """In-memory submissions, a queue and `workers` simulated Judge0 workers"""
+
+    def __init__(self, config: Optional[StubConfig] = None):
+        self.config = config or StubConfig()
+        self.rng = random.Random(self.config.seed)
+        self.submissions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._done: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._callbacks: set = set()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.busy = 0
+        self.stats_counters = {
+            "created": 0,
+            "finished": 0,
+            "batches": 0,
+            "waited": 0,
+            "polls": 0,
+            "callbacks_sent": 0,
+            "callback_failures": 0,
+            "rejected": 0,
+        }
+
+    # --- Server lifecycle ---
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/submissions/batch", self.create_batch)
+        app.router.add_get("/submissions/batch", self.get_batch)
+        app.router.add_post("/submissions", self.create_submission)
+        app.router.add_get("/submissions/{token}", self.get_submission)
+        app.router.add_get("/workers", self.get_workers)
+        app.router.add_get("/stub/stats", self.get_stats)
+        app.on_startup.append(lambda _: self._start_workers())
+        app.on_cleanup.append(lambda _: self._stop_workers())
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in the running event loop; returns the base URL (port 0 picks a free one)"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_host, bound_port = self._runner.addresses[0][:2]
+        return f"http://{bound_host}:{bound_port}/"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _start_workers(self):
+        self._queue = asyncio.Queue()
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.config.workers)]
+
+    async def _stop_workers(self):
+        for task in self._workers + list(self._callbacks):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._callbacks, return_exceptions=True)
+        self._workers = []
+        if self._session is not None:
+            await self._session.close()
+
+    # --- Simulation ---
+
+    def _enqueue(self, body: Dict[str, Any], base64_encoded: bool) -> str:
+        if base64_encoded:
+            body = {key: _b64decode(value) if key in TEXT_FIELDS else value for key, value in body.items()}
+        token = str(uuid.uuid4())
+        self.submissions[token] = {
+            "token": token,
+            "request": body,
+            "status": {"id": IN_QUEUE[0], "description": IN_QUEUE[1]},
+            "stdout": None,
+            "stderr": None,
+            "compile_output": None,
+            "message": None,
+            "exit_code": None,
+            "time": None,
+            "memory": None,
+            "created_at": time.time(),
+        }
+        self._done[token] = asyncio.Event()
+        self._queue.put_nowait(token)
+        self.stats_counters["created"] += 1
+        while len(self.submissions) > self.config.max_retained:
+            old_token, _ = self.submissions.popitem(last=False)
+            self._done.pop(old_token, None)
+        return token
+
+    async def _work(self):
+        while True:
+            token = await self._queue.get()
+            submission = self.submissions.get(token)
+            if submission is None:
+                continue
+            self.busy += 1
+            try:
+                submission["status"] = {"id": PROCESSING[0], "description": PROCESSING[1]}
+                jitter = self.rng.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+                await asyncio.sleep(max(0.0, self.config.latency_ms + jitter) / 1000)
+                submission.update(self._verdict(submission["request"]))
+                self.stats_counters["finished"] += 1
+                self._done[token].set()
+                callback_url = submission["request"].get("callback_url")
+                if callback_url:
+                    task = asyncio.create_task(self._send_callback(callback_url, submission))
+                    self._callbacks.add(task)
+                    task.add_done_callback(self._callbacks.discard)
+            finally:
+                self.busy -= 1
+
+    def _verdict(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        source = request.get("source_code") or ""
+        # Per source, so every test of a "broken" submission fails to compile
+        bucket = int(hashlib.sha1(source.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if bucket < self.config.compile_error_rate:
+            return {
+                "status": {"id": COMPILATION_ERROR[0], "description": COMPILATION_ERROR[1]},
+                "compile_output": "main: stub compilation error\n",
+                "exit_code": None,
+                "time": None,
+                "memory": None,
+            }
+
+        name = self.rng.choices(list(self.config.verdicts), weights=list(self.config.verdicts.values()))[0]
+        status_id, description = VERDICTS[name]
+        cpu_time_limit = float(request.get("cpu_time_limit") or 5)
+        expected = request.get("expected_output")
+        result = {
+            "status": {"id": status_id, "description": description},
+            "stdout": None,
+            "stderr": None,
+            "exit_code": 0,
+            "time": f"{self.rng.uniform(0.005, min(0.2, cpu_time_limit)):.3f}",
+            "memory": self.rng.randint(3000, 20000),
+        }
+        if name == "accepted":
+            # Without expected_output Judge0 accepts whatever the program printed
+            result["stdout"] = expected if expected is not None else ""
+        elif name == "wrong_answer":
+            result["stdout"] = "stub wrong answer\n"
+            if expected is None:
+                result["status"] = {"id": VERDICTS["accepted"][0], "description": VERDICTS["accepted"][1]}
+        elif name == "time_limit_exceeded":
+            result["time"] = f"{cpu_time_limit:.3f}"
+            result["exit_code"] = None
+        elif name == "runtime_error":
+            result["stderr"] = "Traceback (most recent call last):\nRuntimeError: stub runtime error\n"
+            result["exit_code"] = 1
+        else:
+            result["message"] = "stub internal error"
+            result["exit_code"] = None
+        return result
+
+    async def _send_callback(self, url: str, submission: Dict[str, Any]):
+        # Judge0 PUTs the finished submission with base64 encoded text fields
+        body = {key: submission.get(key) for key in DEFAULT_FIELDS + ("exit_code",)}
+        try:
+            async with self._session.put(url, json=_encode_fields(body)) as response:
+                if response.status >= 400:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info, response.history, status=response.status
+                    )
+            self.stats_counters["callbacks_sent"] += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Like Judge0: a failed callback is not retried, clients fall back to polling
+            self.stats_counters["callback_failures"] += 1
+            logger.debug(f"Callback to {url} failed: {e}")
+
+    def _view(self, token: str, fields: Optional[str], base64_encoded: bool) -> Optional[Dict[str, Any]]:
+        submission = self.submissions.get(token)
+        if submission is None:
+            return None
+        names = DEFAULT_FIELDS if not fields else tuple(f.strip() for f in fields.split(","))
+        if "*" in names:
+            names = tuple(key for key in submission if key != "request") + tuple(submission["request"])
+        view = {name: submission.get(name, submission["request"].get(name)) for name in names}
+        return _encode_fields(view) if base64_encoded else view
+
+    def _validate(self, body: Any) -> Optional[Dict[str, List[str]]]:
+        if not isinstance(body, dict):
+            return {"submission": ["must be a JSON object"]}
+        if not isinstance(body.get("language_id"), int):
+            return {"language_id": ["can't be blank"]}
+        if body["language_id"] == MULTI_FILE_LANGUAGE_ID:
+            return {"language_id": [f"language with id {MULTI_FILE_LANGUAGE_ID} doesn't exist"]}
+        if not body.get("source_code"):
+            return {"source_code": ["can't be blank"]}
+        return None
+
+    # --- Handlers ---
+
+    async def create_submission(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        error = self._validate(body)
+        if error:
+            self.stats_counters["rejected"] += 1
+            return web.json_response(error, status=422)
+        base64_encoded = _flag(request, "base64_encoded")
+        token = self._enqueue(body, base64_encoded)
+        if not _flag(request, "wait"):
+            return web.json_response({"token": token}, status=201)
+        self.stats_counters["waited"] += 1
+        await self._done[token].wait()
+        return web.json_response(
+            self._view(token, request.query.get("fields"), base64_encoded), status=201
+        )
+
+    async def create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        submissions = body.get("submissions") if isinstance(body, dict) else None
+        if not isinstance(submissions, list) or not submissions:
+            return web.json_response({"error": "submissions must be a non-empty array"}, status=422)
+        if len(submissions) > MAX_BATCH_SIZE:
+            return web.json_response(
+                {"error": f"number of submissions in a batch should be less than or equal to {MAX_BATCH_SIZE}"},
+                status=422,
+            )
+        self.stats_counters["batches"] += 1
+        base64_encoded = _flag(request, "base64_encoded")
+        created = []
+        for item in submissions:
+            error = self._validate(item)
+            if error:
+                # Judge0 answers per item: a token, or that item's errors
+                self.stats_counters["rejected"] += 1
+                created.append(error)
+            else:
+                created.append({"token": self._enqueue(item, base64_encoded)})
+        return web.json_response(created, status=201)
+
+    async def get_submission(self, request: web.Request) -> web.Response:
+        self.stats_counters["polls"] += 1
+        view = self._view(request.match_info["token"], request.query.get("fields"), _flag(request, "base64_encoded"))
+        if view is None:
+            return web.json_response({"error": "submission not found"}, status=404)
+        return web.json_response(view)
+
+    async def get_batch(self, request: web.Request) -> web.Response:
+        self.stats_counters["polls"] += 1
+        fields = request.query.get("fields")
+        base64_encoded = _flag(request, "base64_encoded")
+        tokens = [t for t in request.query.get("tokens", "").split(",") if t]
+        return web.json_response({
+            "submissions": [self._view(token, fields, base64_encoded) for token in tokens]
+        })
+
+    async def get_workers(self, request: web.Request) -> web.Response:
+        return web.json_response([{
+            "queue": "default",
+            "size": self._queue.qsize() if self._queue else 0,
+            "available": self.config.workers,
+            "idle": self.config.workers - self.busy,
+            "working": self.busy,
+            "paused": 0,
+            "failed": 0,
+        }])
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats_counters,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "working": self.busy,
+            "workers": self.config.workers,
+        }
+
+
+def _flag(request: web.Request, name: str) -> bool:
+    return request.query.get(name, "false").lower() == "true"
+
+
+def _b64decode(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    return base64.b64decode(value).decode("utf-8", errors="replace")
+
+
+def _encode_fields(view: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: base64.b64encode(value.encode()).decode() if key in TEXT_FIELDS and isinstance(value, str) else value
+        for key, value in view.items()
+    }
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Stub options, shared with the grading benchmark"""
+    parser.add_argument("--workers", type=int, default=8, help="Simulated Judge0 workers")
+    parser.add_argument("--latency-ms", type=float, default=100, help="Run time per submission")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Uniform +/- jitter on the latency")
+    parser.add_argument(
+        "--verdicts", default=DEFAULT_VERDICTS,
+        help=f"Weighted verdicts per test, e.g. {DEFAULT_VERDICTS}"
+    )
+    parser.add_argument(
+        "--compile-error-rate", type=float, default=0.0,
+        help="Share of sources that fail to compile (0-1)"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible verdicts")
+
+
+def stub_config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        workers=args.workers,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        verdicts=parse_verdicts(args.verdicts),
+        compile_error_rate=args.compile_error_rate,
+        seed=args.seed,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Judge0-compatible stub server for benchmarks")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=2358)
+    add_stub_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    stub = Judge0Stub(stub_config_from_args(args))
+    web.run_app(stub.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
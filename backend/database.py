@@ -1,6 +1,7 @@
 from typing import Generator
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.schema import CreateIndex
 from backend.config import settings
 
 # SQLAlchemy 2.x style
@@ -29,3 +30,25 @@ def get_db() -> Generator:
         yield db
     finally:
         db.close()
+
+def load_models():
+    """Import every model module so Base.metadata and relationship lookups are complete"""
+    # Imported here: the model modules import Base from this one
+    import backend.models  # noqa: F401
+    import backend.models_assessment  # noqa: F401
+
+# Indexes added to tables that already existed. create_all only creates
+# missing tables, so init_schema adds these to older databases.
+ADDED_INDEXES = [
+    "idx_submissions_exam_id_submitted_at_id",
+    "idx_submissions_exam_student_question",
+]
+
+def init_schema():
+    """Create missing tables and any ADDED_INDEXES an existing database lacks"""
+    load_models()
+    Base.metadata.create_all(bind=engine)
+    indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+    with engine.begin() as conn:
+        for name in ADDED_INDEXES:
+            conn.execute(CreateIndex(indexes[name], if_not_exists=True))
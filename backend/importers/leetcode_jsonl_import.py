@@ -159,7 +159,9 @@ def process_single_file(file_path: str, content_mapping: dict, existing_question
                             "tags": tags,
                             "starter_code": starter_code,
                             "imported_from": "jsonl_human_eval_with_content",
-                            "imported_at": datetime.now().isoformat()
+                            "imported_at": datetime.now().isoformat(),
+                            # Small stdin/stdout tests: grade them all in one sandbox run
+                            "multi_test_harness": True
                         }
                     }
                     
@@ -6,6 +6,7 @@ Generated routes for all models
 from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
+import asyncio
 import os
 
 from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Body, Form, Query
@@ -23,7 +24,7 @@ import zipfile
 import logging
 import time
 from sqlalchemy import desc, or_, and_, func  # <-- Add func import
-from backend.database import Base, engine, get_db, SessionLocal
+from backend.database import engine, get_db, SessionLocal, init_schema
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -49,6 +50,11 @@ from backend import models, schemas, crud
 from backend.auth.passwords import hash_password
 
 from backend.importers.leetcode_jsonl_import import import_from_jsonl_files
+from backend.services.test_case_cache import test_case_cache
+from backend.services.submission_processor import submission_processor
+from backend.services.judge0_client import judge0_client
+from backend.services.executors import close_executors, warm_up_executors
+from backend.services.grader import GRADING_DRAIN_TIMEOUT
 
 from backend.bootstrap import bootstrap_admin
 
@@ -157,11 +163,38 @@ app.include_router(
 @app.on_event("startup")
 def on_startup():
     wait_for_db(engine, timeout=60)
-    # Import models so Base is populated
-    import backend.models 
-    Base.metadata.create_all(bind=engine)
+    # Tables, plus indexes added to existing ones since they were created
+    init_schema()
     bootstrap_admin()
 
+# --- Grading worker: claims queued grading tasks from the database ---
+# Set GRADING_WORKER_IN_API=false when graders run as separate processes
+grading_worker_stop = asyncio.Event()
+grading_worker_task = None
+
+@app.on_event("startup")
+async def start_grading_worker():
+    global grading_worker_task
+    if os.getenv("GRADING_WORKER_IN_API", "true").lower() == "true":
+        grading_worker_task = asyncio.create_task(
+            submission_processor.run_queue_worker(grading_worker_stop)
+        )
+    # Local sandbox workers, when RUN_CODE_EXECUTOR/GRADING_EXECUTOR=local
+    await warm_up_executors()
+
+@app.on_event("shutdown")
+async def stop_grading_worker():
+    if grading_worker_task:
+        grading_worker_stop.set()
+        try:
+            # A stuck Judge0 call must not hang shutdown; unfinished tasks go back to the queue
+            await asyncio.wait_for(grading_worker_task, GRADING_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Grading worker did not drain within {GRADING_DRAIN_TIMEOUT}s; cancelled it")
+    # Shared Judge0 connection pool (run-code, execute and grading)
+    await judge0_client.close()
+    await close_executors()
+
 # --- Health check ---
 @app.get("/health", tags=["health"])
 def health() -> dict:
@@ -440,6 +473,7 @@ def delete_question(question_id: UUID, db: Session = Depends(get_db)):
     db_question = crud.delete_question(db, id=question_id)
     if db_question is None:
         raise HTTPException(status_code=404, detail="Question not found")
+    test_case_cache.invalidate(question_id)
     return db_question
 
 # QuestionTestCase routes
@@ -457,20 +491,25 @@ def read_question_test_case(test_case_id: UUID, db: Session = Depends(get_db)):
 
 @app.post("/question-test-cases/", response_model=schemas.QuestionTestCase)
 def create_question_test_case(test_case: schemas.QuestionTestCaseCreate, db: Session = Depends(get_db)):
-    return crud.create_question_test_case(db=db, obj_in=test_case)
+    db_test_case = crud.create_question_test_case(db=db, obj_in=test_case)
+    test_case_cache.invalidate(db_test_case.question_id)
+    return db_test_case
 
 @app.put("/question-test-cases/{test_case_id}", response_model=schemas.QuestionTestCase)
 def update_question_test_case(test_case_id: UUID, test_case: schemas.QuestionTestCaseUpdate, db: Session = Depends(get_db)):
     db_test_case = crud.get_question_test_case(db, id=test_case_id)
     if db_test_case is None:
         raise HTTPException(status_code=404, detail="Question test case not found")
-    return crud.update_question_test_case(db=db, db_obj=db_test_case, obj_in=test_case)
+    db_test_case = crud.update_question_test_case(db=db, db_obj=db_test_case, obj_in=test_case)
+    test_case_cache.invalidate(db_test_case.question_id)
+    return db_test_case
 
 @app.delete("/question-test-cases/{test_case_id}", response_model=schemas.QuestionTestCase)
 def delete_question_test_case(test_case_id: UUID, db: Session = Depends(get_db)):
     db_test_case = crud.delete_question_test_case(db, id=test_case_id)
     if db_test_case is None:
         raise HTTPException(status_code=404, detail="Question test case not found")
+    test_case_cache.invalidate(db_test_case.question_id)
     return db_test_case
 
 # Get all test cases for a specific question
@@ -491,7 +530,9 @@ def update_question_test_case(
     db_test_case = crud.get_question_test_case(db, id=test_case_id)
     if not db_test_case:
         raise HTTPException(status_code=404, detail="Question test case not found")
-    return crud.update_question_test_case(db=db, db_obj=db_test_case, obj_in=test_case)
+    db_test_case = crud.update_question_test_case(db=db, db_obj=db_test_case, obj_in=test_case)
+    test_case_cache.invalidate(db_test_case.question_id)
+    return db_test_case
 
 # Delete a test case
 @app.delete("/question-test-cases/{test_case_id}", response_model=schemas.QuestionTestCase)
@@ -499,6 +540,7 @@ def delete_question_test_case(test_case_id: UUID, db: Session = Depends(get_db))
     db_test_case = crud.get_question_test_case(db, id=test_case_id)
     if not db_test_case:
         raise HTTPException(status_code=404, detail="Question test case not found")
+    test_case_cache.invalidate(db_test_case.question_id)
     return crud.delete_question_test_case(db, id=test_case_id)
 
 @app.delete("/questions/{question_id}/test-cases", response_model=List[schemas.QuestionTestCase])
@@ -506,6 +548,7 @@ def delete_all_test_cases_for_question(question_id: UUID, db: Session = Depends(
     deleted_test_cases = crud.delete_test_cases_by_question(db=db, question_id=question_id)
     if deleted_test_cases is None:
         raise HTTPException(status_code=404, detail="No test cases found for this question")
+    test_case_cache.invalidate(question_id)
     return deleted_test_cases
 
 
@@ -1036,6 +1079,8 @@ def import_leetcode_jsonl(payload: dict = Body(...), db: Session = Depends(get_d
     
     try:
         result = import_from_jsonl_files(db, file_paths, overwrite=overwrite)
+        # Imports can rewrite test cases for many questions at once
+        test_case_cache.invalidate()
         return {"status": "ok", **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -126,6 +126,17 @@ class NotificationType(enum.Enum):
     SUBMISSION_RECEIVED = "submission_received"
     GENERAL = "general"
 
+class GradingJobStatus(enum.Enum):
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class GradingTaskStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
 # Core Models
 class User(Base):
     __tablename__ = "users"
@@ -613,6 +624,10 @@ class Submission(Base):
 
     __table_args__ = (
         Index("idx_submissions_exam_id", "exam_id"),   # NEW index
+        # Keyset pagination of an exam's submissions when queueing them for grading
+        Index("idx_submissions_exam_id_submitted_at_id", "exam_id", "submitted_at", "id"),
+        # DISTINCT ON (student_id, question_id) attempt selection per exam
+        Index("idx_submissions_exam_student_question", "exam_id", "student_id", "question_id"),
         Index("idx_submissions_question_id", "question_id"),
         Index("idx_submissions_student_id", "student_id"),
         Index("idx_submissions_status", "status"),
@@ -669,6 +684,75 @@ class SubmissionEvent(Base):
         Index("idx_submission_events_created_at", "created_at"),
     )
 
+# Grading Queue Models
+class GradingJob(Base):
+    __tablename__ = "grading_jobs"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    exam_id = Column(UUID(as_uuid=True), ForeignKey("exams.id", ondelete="CASCADE"), nullable=False)
+    status = Column(SQLEnum(GradingJobStatus), default=GradingJobStatus.PROCESSING, nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    completed = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    errors = Column(JSONB, default=list)
+    event_seq = Column(Integer, default=0, nullable=False)  # seq of the job's latest GradingJobEvent
+    started_at = Column(DateTime(timezone=False), default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=False), nullable=True)
+    created_at = Column(DateTime(timezone=False), default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=False), default=func.now(), onupdate=func.now(), nullable=False)
+    extra_data = Column(JSONB, default=dict)
+    
+    # Relationships
+    tasks = relationship("GradingTask", back_populates="job", cascade="all, delete-orphan", passive_deletes=True)
+    events = relationship("GradingJobEvent", back_populates="job", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        Index("idx_grading_jobs_exam_id", "exam_id"),
+        Index("idx_grading_jobs_status", "status"),
+    )
+
+class GradingTask(Base):
+    __tablename__ = "grading_tasks"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job_id = Column(UUID(as_uuid=True), ForeignKey("grading_jobs.id", ondelete="CASCADE"), nullable=False)
+    submission_id = Column(UUID(as_uuid=True), ForeignKey("submissions.id", ondelete="CASCADE"), nullable=False)
+    status = Column(SQLEnum(GradingTaskStatus), default=GradingTaskStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+    claimed_by = Column(String(255), nullable=True)  # worker id (host:pid)
+    claimed_at = Column(DateTime(timezone=False), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=False), nullable=True)  # refreshed while the worker is alive
+    finished_at = Column(DateTime(timezone=False), nullable=True)
+    created_at = Column(DateTime(timezone=False), default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=False), default=func.now(), onupdate=func.now(), nullable=False)
+    
+    # Relationships
+    job = relationship("GradingJob", back_populates="tasks")
+    
+    __table_args__ = (
+        Index("idx_grading_tasks_job_id_status", "job_id", "status"),
+        Index("idx_grading_tasks_status_created_at", "status", "created_at"),
+        Index("idx_grading_tasks_submission_id", "submission_id"),
+    )
+
+class GradingJobEvent(Base):
+    __tablename__ = "grading_job_events"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job_id = Column(UUID(as_uuid=True), ForeignKey("grading_jobs.id", ondelete="CASCADE"), nullable=False)
+    seq = Column(Integer, nullable=False)  # 1, 2, 3... per job; used as the SSE event id
+    event_type = Column(String(50), nullable=False)
+    data = Column(JSONB, default=dict)
+    created_at = Column(DateTime(timezone=False), default=func.now(), nullable=False)
+    
+    # Relationships
+    job = relationship("GradingJob", back_populates="events")
+    
+    __table_args__ = (
+        UniqueConstraint("job_id", "seq", name="uq_grading_job_events_job_seq"),
+    )
+
 class ExamEvent(Base):
     __tablename__ = "exam_events"
     
@@ -1,19 +1,30 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Body, Depends
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Dict, Any, Optional
 from pydantic import BaseModel
 import uuid
-import aiohttp
 import asyncio
-from ..services.submission_processor import submission_processor
-from ..auth.dependencies import get_current_user
+from ..services.submission_processor import LeetCodeAPI, submission_processor
+from ..services import attempt_selection, grading_events, grading_queue, grading_store, regrade, rescoring, time_limits
+from ..services.test_case_cache import test_case_cache
+from ..services.preflight import run_preflight
+from ..services.result_cache import make_run_key, run_result_cache
+from ..services.executors import RUN_CODE_EXECUTOR, executor_stats, get_executor
+from ..services.judge0_client import judge0_client
+from ..services.judge0_dispatch import LANE_INTERACTIVE, judge0_dispatcher
+from ..services.run_admission import RunRejected, run_admission
+from ..services.early_exit import EarlyExitPolicy
+from ..services.judge0_callbacks import (
+    CALLBACK_PATH, Judge0RequestError, judge0_callbacks
+)
+from ..auth.dependencies import get_current_user, require_role
 from ..models import (
-    User, Activity, ActivitySubmission, ActivityCodeSubmission,
-    ActivityFinalSubmission, ActivityQuestion
+    User, UserRole, Activity, ActivitySubmission, ActivityCodeSubmission,
+    ActivityFinalSubmission, ActivityQuestion, Question
 )
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
 from ..database import get_db
-import os
 
 router = APIRouter()
 
@@ -22,6 +33,13 @@ class RunCodeRequest(BaseModel):
     source_code: str
     language: str
     stdin: Optional[str] = ""
+    # Use this question's time limit instead of the default
+    question_id: Optional[uuid.UUID] = None
+
+class CalibrateTimeLimitRequest(BaseModel):
+    source_code: str
+    language: str
+    safety_factor: Optional[float] = None
 
 class UpdateMarksRequest(BaseModel):
     marks: float
@@ -36,6 +54,9 @@ RUN_CODE_CONFIG = {
     "max_file_size": 1024  # 1MB
 }
 
+# Sample runs use grading's batched/packed paths, in the interactive Judge0 lane
+sample_runner = LeetCodeAPI(judge0_client.api_url, lane=LANE_INTERACTIVE, executor_backend=RUN_CODE_EXECUTOR)
+
 def get_language_id(language: str) -> int:
     """Map language string to Judge0 language ID"""
     language_map = {
@@ -48,52 +69,80 @@ def get_language_id(language: str) -> int:
     }
     return language_map.get(language.lower(), 71)  # Default to Python
 
+async def run_code_limits(request: RunCodeRequest) -> Dict[str, Any]:
+    """RUN_CODE_CONFIG with the question's CPU/wall limit when a question is given"""
+    if request.question_id is None:
+        return RUN_CODE_CONFIG
+    options = await grading_store.run_in_session(
+        grading_store.load_question_grading_options, request.question_id
+    )
+    cpu_time_limit = time_limits.resolve_cpu_time_limit(
+        options["time_limit_seconds"], options["reference_runtimes"], get_language_id(request.language)
+    )
+    return {**RUN_CODE_CONFIG, **time_limits.sandbox_time_limits(cpu_time_limit)}
+
 @router.post("/submissions/execute")
 async def execute_code(request: RunCodeRequest):
     """Execute code using Judge0 API"""
     try:
-        # Judge0 API endpoint
-        judge0_url = os.getenv("JUDGE0_URL", "http://localhost:2358")
-        
-        async with aiohttp.ClientSession() as session:
-            # Create submission
-            async with session.post(
-                f"{judge0_url}/submissions",
-                json={
-                    "source_code": request.source_code,
-                    "language_id": get_language_id(request.language),
-                    "stdin": request.stdin,
-                    **RUN_CODE_CONFIG
-                }
-            ) as response:
-                submission = await response.json()
-                token = submission.get("token")
-
-                if not token:
-                    raise HTTPException(status_code=500, detail="Failed to create submission")
-
-            # Wait for results
-            while True:
-                await asyncio.sleep(1)  # Polling interval
-                async with session.get(
-                    f"{judge0_url}/submissions/{token}"
-                ) as response:
-                    result = await response.json()
-                    if result.get("status", {}).get("id") not in [1, 2]:  # Not queued or processing
-                        break
+        language_id = get_language_id(request.language)
+        # The shared executor: pooled Judge0 client (JUDGE0_API_URL) or the local sandbox
+        executor = get_executor(RUN_CODE_EXECUTOR, language_id)
 
+        ok, preflight_error = run_preflight(request.source_code, language_id, executor.name)
+        if not ok:
             return {
-                "status": result.get("status", {}).get("description", "Unknown"),
-                "output": result.get("stdout", ""),
-                "error": result.get("stderr", ""),
-                "compile_output": result.get("compile_output", ""),
-                "time": result.get("time", "0"),
-                "memory": result.get("memory", "0")
+                "status": "Compilation Error",
+                "output": "",
+                "error": "",
+                "compile_output": preflight_error,
+                "time": "0",
+                "memory": "0"
             }
 
+        limits = await run_code_limits(request)
+        # Identical runs within RUN_CODE_CACHE_TTL (or already executing) share one execution
+        result = await run_result_cache.get_or_run(
+            make_run_key(request.source_code, language_id, request.stdin or "", limits, executor.name),
+            lambda: executor.execute(request.source_code, language_id, request.stdin or "", limits=limits)
+        )
+
+        return {
+            "status": result.get("status", {}).get("description", "Unknown"),
+            "output": result.get("stdout", ""),
+            "error": result.get("stderr", ""),
+            "compile_output": result.get("compile_output", ""),
+            "time": result.get("time", "0"),
+            "memory": result.get("memory", "0")
+        }
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.put(CALLBACK_PATH, include_in_schema=False)
+async def receive_judge0_callback(request: Request, secret: Optional[str] = None):
+    """Judge0 PUTs finished submissions here when they carry a callback_url"""
+    if not judge0_callbacks.check_secret(secret):
+        raise HTTPException(status_code=403, detail="Invalid callback secret")
+    
+    payload = await request.json()
+    # Always 200: an unmatched token belongs to another process, which polls for it
+    return {"matched": judge0_callbacks.resolve(payload)}
+
+@router.get("/internal/judge0/stats")
+async def get_judge0_stats(
+    current_user: User = Depends(require_role(UserRole.ADMIN))
+):
+    """Connection-pool, callback, per-lane dispatch and run-code admission metrics for this process"""
+    return {
+        "client": judge0_client.stats(),
+        "callbacks": judge0_callbacks.stats(),
+        "executors": executor_stats(),
+        "dispatch": judge0_dispatcher.stats(),
+        "run_code": run_admission.stats(),
+        "run_code_cache": run_result_cache.stats()
+    }
+
 @router.get("/activities/{activity_id}/submissions")
 async def get_activity_submissions(
     activity_id: str,
@@ -180,11 +229,15 @@ async def update_question_marks(
 @router.post("/exams/{exam_id}/run-code")
 async def run_code(
     exam_id: str,
-    request: RunCodeRequest
+    request: RunCodeRequest,
+    current_user: User = Depends(get_current_user)
 ):
     """
     Run user code during exam with immediate feedback
     This is a stateless operation - results are not saved
+    Admission-controlled per student (see run_admission): a run while the
+    previous one is pending, over the rate limit or with the queue full is
+    answered at once with 429/503, Retry-After and the queue position.
     """
     try:
         # Validate inputs
@@ -196,69 +249,168 @@ async def run_code(
 
         # Prepare Judge0 submission
         language_id = get_language_id(request.language)
+        # Judge0 (JUDGE0_API_URL), or the local sandbox with RUN_CODE_EXECUTOR=local
+        executor = get_executor(RUN_CODE_EXECUTOR, language_id)
+
+        # Syntax errors are reported without a round trip to the executor
+        ok, preflight_error = run_preflight(request.source_code, language_id, executor.name)
+        if not ok:
+            return {
+                "success": True,
+                "stdout": "",
+                "stderr": "",
+                "compile_output": preflight_error,
+                "exit_code": None,
+                "status_id": 6,
+                "status": "Compilation Error",
+                "execution_time": 0,
+                "memory_used": 0,
+                "language": request.language,
+                "message": get_user_friendly_message(6, "Compilation Error")
+            }
         
-        # Get Judge0 API URL (use service name for Docker)
-        judge0_api_url = os.getenv("JUDGE0_API_URL", "http://server:2358/")
+        limits = await run_code_limits(request)
+        run_key = make_run_key(request.source_code, language_id, request.stdin or "", limits, executor.name)
+        # Pressing Run again on unchanged code costs neither Judge0 nor the student's run budget
+        result = run_result_cache.get(run_key)
+        cached = result is not None
+        try:
+            if result is None:
+                async with run_admission.run(str(current_user.id)):
+                    # Identical runs already executing are joined, not repeated
+                    result = await run_result_cache.get_or_run(
+                        run_key,
+                        lambda: executor.execute(request.source_code, language_id, request.stdin or "", limits=limits)
+                    )
+        except Judge0RequestError as e:
+            raise HTTPException(
+                status_code=e.status, 
+                detail=f"Judge0 execution error: {e.detail}"
+            )
         
-        submission_payload = {
-            "source_code": request.source_code,
-            "language_id": language_id,
-            "stdin": request.stdin or "",
-            "cpu_time_limit": RUN_CODE_CONFIG["cpu_time_limit"],
-            "memory_limit": RUN_CODE_CONFIG["memory_limit"],
-            "max_processes_and_or_threads": RUN_CODE_CONFIG["max_processes_and_or_threads"],
-            "enable_per_process_and_thread_time_limit": RUN_CODE_CONFIG["enable_per_process_and_thread_time_limit"],
-            "enable_per_process_and_thread_memory_limit": RUN_CODE_CONFIG["enable_per_process_and_thread_memory_limit"],
-            "max_file_size": RUN_CODE_CONFIG["max_file_size"]
+        # Extract status information
+        status_info = result.get("status", {})
+        status_id = status_info.get("id") if isinstance(status_info, dict) else None
+        status_description = status_info.get("description") if isinstance(status_info, dict) else "Unknown"
+        
+        # Prepare response
+        execution_result = {
+            "success": True,
+            "stdout": result.get("stdout", ""),
+            "stderr": result.get("stderr", ""),
+            "compile_output": result.get("compile_output", ""),
+            "exit_code": result.get("exit_code", 0),
+            "status_id": status_id,
+            "status": status_description,
+            "execution_time": float(result.get("time", 0)) if result.get("time") else 0,
+            "memory_used": int(result.get("memory", 0)) if result.get("memory") else 0,
+            "language": request.language,
+            "message": get_user_friendly_message(status_id, status_description),
+            "cached": cached
         }
-
-        async with aiohttp.ClientSession() as session:
-            # Submit to Judge0 with wait=true for synchronous response
-            async with session.post(
-                f"{judge0_api_url}submissions?wait=true",
-                json=submission_payload,
-                headers={"Content-Type": "application/json"}
-            ) as response:
-                
-                if response.status not in [200, 201]:
-                    error_text = await response.text()
-                    raise HTTPException(
-                        status_code=response.status, 
-                        detail=f"Judge0 execution error: {error_text}"
-                    )
-                
-                result = await response.json()
-                
-                # Extract status information
-                status_info = result.get("status", {})
-                status_id = status_info.get("id") if isinstance(status_info, dict) else None
-                status_description = status_info.get("description") if isinstance(status_info, dict) else "Unknown"
-                
-                # Prepare response
-                execution_result = {
-                    "success": True,
-                    "stdout": result.get("stdout", ""),
-                    "stderr": result.get("stderr", ""),
-                    "compile_output": result.get("compile_output", ""),
-                    "exit_code": result.get("exit_code", 0),
-                    "status_id": status_id,
-                    "status": status_description,
-                    "execution_time": float(result.get("time", 0)) if result.get("time") else 0,
-                    "memory_used": int(result.get("memory", 0)) if result.get("memory") else 0,
-                    "language": request.language,
-                    "message": get_user_friendly_message(status_id, status_description)
-                }
-                
-                return execution_result
-                
+        
+        return execution_result
+            
+    except RunRejected as e:
+        return run_rejected_response(e)
     except HTTPException:
         raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out waiting for Judge0")
     except Exception as e:
         raise HTTPException(
             status_code=500, 
             detail=f"Internal server error during code execution: {str(e)}"
         )
 
+@router.post("/exams/{exam_id}/questions/{question_id}/run-samples")
+async def run_samples(
+    exam_id: uuid.UUID,
+    question_id: uuid.UUID,
+    request: RunCodeRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Run user code against every sample test case of the question in one
+    request (batched on Judge0) with a verdict per test. Nothing is saved;
+    admission-controlled like run-code. Stops as the question's early-exit
+    options say; the rest are reported as skipped. Students may only run
+    questions assigned to them while the exam is open.
+    """
+    if not request.source_code.strip():
+        raise HTTPException(status_code=400, detail="Source code cannot be empty")
+    if not request.language:
+        raise HTTPException(status_code=400, detail="Language must be specified")
+
+    access_error = await grading_store.run_in_session(
+        grading_store.exam_question_access_error,
+        exam_id,
+        question_id,
+        current_user.id,
+        current_user.role in (UserRole.ADMIN, UserRole.TEACHER)
+    )
+    if access_error:
+        raise HTTPException(status_code=access_error[0], detail=access_error[1])
+
+    cached = await test_case_cache.get(question_id, prepare=sample_runner.prepare_test_case)
+    samples = [(tc, formatted) for tc, formatted in zip(cached.test_cases, cached.formatted) if tc.get("is_sample")]
+    if not samples:
+        raise HTTPException(status_code=404, detail="This question has no sample test cases")
+
+    cpu_time_limit = time_limits.resolve_cpu_time_limit(
+        cached.options.get("time_limit_seconds"),
+        cached.options.get("reference_runtimes"),
+        get_language_id(request.language)
+    )
+    try:
+        async with run_admission.run(str(current_user.id)):
+            result = await sample_runner.submit_solution(
+                request.source_code,
+                request.language,
+                [formatted for _, formatted in samples],
+                multi_test_harness=cached.options.get("multi_test_harness", False),
+                cpu_time_limit=cpu_time_limit,
+                # Same early-exit options as grading (Question.extra_data["early_exit"])
+                early_exit=EarlyExitPolicy.from_options(cached.options.get("early_exit"))
+            )
+    except RunRejected as e:
+        return run_rejected_response(e)
+
+    if result.get("error"):
+        raise HTTPException(status_code=502, detail=f"Judge0 execution error: {result['error']}")
+
+    results = []
+    for (tc, formatted), test_result in zip(samples, result.get("test_results", [])):
+        results.append({
+            "test_case_id": tc["id"],
+            "input": tc["input_data"],
+            "expected_output": formatted["expected"],
+            "actual_output": test_result.get("actual", ""),
+            "passed": test_result.get("passed", False),
+            "skipped": test_result.get("skipped", False),
+            "status_id": test_result.get("status_id"),
+            "status": test_result.get("status", "Unknown"),
+            "stderr": test_result.get("stderr", ""),
+            "compile_output": test_result.get("compile_output", ""),
+            "execution_time": float(test_result["time"]) if test_result.get("time") else 0,
+            "memory_used": int(test_result["memory"]) if test_result.get("memory") else 0
+        })
+
+    return {
+        "success": True,
+        "status": regrade.STATUS_CODES.get(result.get("status_code"), "internal_error"),
+        "passed": result.get("total_correct", 0),
+        "total": len(samples),
+        "compile_output": result.get("compile_error", ""),
+        "results": results,
+        "cached": bool(result.get("cached"))
+    }
+
+def run_rejected_response(e: RunRejected) -> JSONResponse:
+    """Immediate 429/503 for a run turned away by admission control"""
+    body = e.to_dict()
+    return JSONResponse(status_code=e.status_code, content=body, headers={"Retry-After": str(body["retry_after"])})
+
 def get_user_friendly_message(status_id: int, status_description: str) -> str:
     """Convert Judge0 status to user-friendly message"""
     status_messages = {
@@ -280,64 +432,192 @@ def get_user_friendly_message(status_id: int, status_description: str) -> str:
     
     return status_messages.get(status_id, f"Status: {status_description}")
 
+@router.post("/questions/{question_id}/calibrate-time-limit")
+async def calibrate_time_limit(
+    question_id: uuid.UUID,
+    request: CalibrateTimeLimitRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role(UserRole.ADMIN, UserRole.TEACHER))
+):
+    """
+    Run a reference solution against the question's test cases and store an
+    adaptive time limit for its language: slowest test x safety factor,
+    never above the question's own limit
+    """
+    question = db.query(Question).filter(Question.id == question_id).first()
+    if not question:
+        raise HTTPException(status_code=404, detail="Question not found")
+
+    leetcode_api = submission_processor.leetcode_api
+    cached = await test_case_cache.get(question_id, prepare=leetcode_api.prepare_test_case)
+    if not cached.formatted:
+        raise HTTPException(status_code=400, detail="Question has no test cases")
+
+    language_id = leetcode_api.get_language_id(request.language)
+    # Measure under the ceiling, not the current (possibly calibrated) limit
+    result = await leetcode_api.submit_solution(
+        request.source_code,
+        request.language,
+        cached.formatted,
+        test_cases_fingerprint=cached.content_fingerprint,
+        cpu_time_limit=time_limits.GRADING_MAX_CPU_TIME_LIMIT
+    )
+    if result.get("error"):
+        raise HTTPException(status_code=502, detail=f"Judge0 error: {result['error']}")
+
+    try:
+        calibration = time_limits.build_calibration(
+            result.get("test_results", []),
+            language_id,
+            safety_factor=request.safety_factor or time_limits.TIME_LIMIT_SAFETY_FACTOR
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    extra_data = dict(question.extra_data or {})
+    reference_runtimes = dict(extra_data.get(time_limits.REFERENCE_RUNTIMES_KEY) or {})
+    reference_runtimes[str(language_id)] = calibration
+    extra_data[time_limits.REFERENCE_RUNTIMES_KEY] = reference_runtimes
+    # Reassign so SQLAlchemy sees the JSONB change
+    question.extra_data = extra_data
+    db.commit()
+    test_case_cache.invalidate(question_id)
+
+    return {
+        "question_id": str(question_id),
+        "calibration": calibration,
+        "cpu_time_limit": time_limits.resolve_cpu_time_limit(
+            question.time_limit_seconds, reference_runtimes, language_id
+        )
+    }
+
 @router.post("/exams/{exam_id}/process-submissions")
 async def process_submissions(
-    exam_id: str,
-    background_tasks: BackgroundTasks
+    exam_id: uuid.UUID,
+    attempts: Optional[str] = None,
+    db: Session = Depends(get_db)
 ):
-    """Start processing submissions for an exam"""
+    """
+    Queue an exam's submissions for grading. attempts (latest, best or all)
+    overrides the exam's settings["grading_attempts"]; attempts it leaves
+    out are recorded as skipped instead of being run.
+    """
     try:
-        # Fetch submissions for the exam
-        async with aiohttp.ClientSession() as session:
-            host_ip = os.getenv("VITE_HOST_IP")
-            async with session.get(
-                f"http://{host_ip}:8000/exams/{exam_id}/submissions?skip=0&limit=1000"
-            ) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail="Failed to fetch submissions"
-                    )
-                submissions = await response.json()
-        
-        if not submissions:
+        if attempts and attempts.lower() not in attempt_selection.ATTEMPT_POLICIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"attempts must be one of {', '.join(attempt_selection.ATTEMPT_POLICIES)}"
+            )
+        if not grading_store.exam_has_submissions(db, exam_id):
             raise HTTPException(
                 status_code=404, 
                 detail="No submissions found for this exam"
             )
         
-        # Generate job ID
-        job_id = str(uuid.uuid4())
-        
-        # Start background processing
-        background_tasks.add_task(
-            submission_processor.process_submissions_batch,
-            exam_id,
-            submissions,
-            job_id
-        )
+        # Persist the job and one task per submission, read from the database
+        # in keyset pages (no cap, flat memory); grading workers (in this
+        # process or standalone) claim tasks as soon as each page is committed
+        job = await grading_store.run_in_session(grading_queue.create_exam_job, exam_id, attempts)
+        skipped = grading_queue.job_skipped(job)
         
         return {
-            "job_id": job_id,
-            "message": f"Started processing {len(submissions)} submissions",
-            "total_submissions": len(submissions)
+            "job_id": str(job.id),
+            "message": f"Started processing {job.total} submissions ({skipped} superseded attempts skipped)",
+            "total_submissions": job.total,
+            "skipped_submissions": skipped,
+            "attempt_policy": job.extra_data.get("attempt_policy")
         }
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # Unknown attempt policy in the exam's settings
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/exams/{exam_id}/regrade")
+async def regrade_submissions(
+    exam_id: uuid.UUID,
+    question_id: Optional[uuid.UUID] = None,
+    current_user: User = Depends(require_role(UserRole.ADMIN, UserRole.TEACHER))
+):
+    """
+    Re-grade after test cases were edited: only submissions graded against
+    other test cases than their question has now are queued, and each one
+    re-runs just the changed test cases and updates its stored result.
+    Optionally limited to one question.
+    """
+    fingerprints = await grading_store.run_in_session(regrade.load_exam_fingerprints, exam_id, question_id)
+    if not fingerprints:
+        raise HTTPException(status_code=404, detail="No submissions for this exam (or question)")
+
+    job = await grading_store.run_in_session(grading_queue.create_regrade_job, exam_id, fingerprints)
+    return {
+        "job_id": str(job.id),
+        "message": f"Re-grading {job.total} submissions with changed test cases",
+        "total_submissions": job.total
+    }
+
+@router.post("/exams/{exam_id}/rescore")
+async def rescore_submissions(
+    exam_id: uuid.UUID,
+    question_id: Optional[uuid.UUID] = None,
+    current_user: User = Depends(require_role(UserRole.ADMIN, UserRole.TEACHER))
+):
+    """
+    Recompute scores after test case weights changed, from the stored
+    per-test outcomes and without running anything. Scoring stays
+    proportional (passed tests / total tests x total weight), so weights
+    scale a question's total rather than giving per-test credit. Results
+    graded against since-edited test cases are counted as needs_regrade and
+    left as they are. Optionally limited to one question.
+    """
+    summary = await grading_store.run_in_session(rescoring.rescore_exam_results, exam_id, question_id)
+    if not summary["questions"]:
+        raise HTTPException(status_code=404, detail="No submissions for this exam (or question)")
+    return {
+        "message": f"Rescored {summary['rescored']} of {summary['results']} results",
+        **summary
+    }
+
 @router.get("/processing-jobs/{job_id}/status")
-async def get_processing_status(job_id: str):
+def get_processing_status(job_id: uuid.UUID, db: Session = Depends(get_db)):
     """Get processing job status"""
-    status = submission_processor.get_job_status(job_id)
+    job = grading_queue.get_job(db, job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    if not status:
+    return grading_queue.job_to_status(job)
+
+@router.get("/processing-jobs/{job_id}/events")
+async def stream_processing_events(
+    job_id: uuid.UUID,
+    request: Request,
+    after: Optional[int] = None,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Server-Sent Events stream of job progress. Reconnecting clients resume
+    from the Last-Event-ID header (sent by EventSource) or ?after=<seq>.
+    """
+    # No get_db here: its session would stay checked out for the whole stream
+    if not await grading_store.run_in_session(grading_queue.get_job, job_id):
         raise HTTPException(status_code=404, detail="Job not found")
     
-    return status
+    return StreamingResponse(
+        grading_events.stream_job_events(
+            job_id,
+            grading_events.parse_resume_seq(last_event_id, after),
+            is_disconnected=request.is_disconnected
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.delete("/processing-jobs/{job_id}")
-async def cleanup_processing_job(job_id: str):
+def cleanup_processing_job(job_id: uuid.UUID, db: Session = Depends(get_db)):
     """Clean up completed processing job"""
-    submission_processor.cleanup_job(job_id)
+    grading_queue.delete_job(db, job_id)
     return {"message": "Job cleaned up successfully"}
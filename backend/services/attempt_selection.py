@@ -0,0 +1,188 @@
+"""
+Attempt Selection
+Which of a student's attempts at a question gets graded: the latest, the
+best, or all of them. The choice is made in SQL with DISTINCT ON
+(student_id, question_id) before anything is queued; superseded attempts
+are never sent to Judge0 and are marked as skipped on the submission.
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Text, bindparam, cast, func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+
+from .. import models
+from .grading_store import GRADING_ENQUEUE_CHUNK_SIZE, iter_exam_submission_ids
+
+ATTEMPTS_LATEST = "latest"
+# Highest stored score. Scores are only compared once every attempt has one:
+# until then the ungraded attempts are graded and none is skipped.
+ATTEMPTS_BEST = "best"
+ATTEMPTS_ALL = "all"
+ATTEMPT_POLICIES = (ATTEMPTS_LATEST, ATTEMPTS_BEST, ATTEMPTS_ALL)
+
+# Default for exams without settings["grading_attempts"]
+GRADING_ATTEMPT_POLICY = os.getenv("GRADING_ATTEMPT_POLICY", ATTEMPTS_LATEST).lower()
+EXAM_SETTINGS_KEY = "grading_attempts"
+
+# Submission.extra_data key recording why an attempt was not graded
+SKIP_KEY = "grading_skip"
+
+# (selected submission ids, [(superseded id, id of the attempt graded instead)])
+AttemptPage = Tuple[List[UUID], List[Tuple[UUID, UUID]]]
+
+
+def resolve_attempt_policy(exam_settings: Optional[Dict[str, Any]], override: Optional[str] = None) -> str:
+    """Request override, else the exam's setting, else the configured default. Raises ValueError."""
+    policy = (override or (exam_settings or {}).get(EXAM_SETTINGS_KEY) or GRADING_ATTEMPT_POLICY).lower()
+    if policy not in ATTEMPT_POLICIES:
+        raise ValueError(f"Unknown attempt policy {policy!r} (expected one of {', '.join(ATTEMPT_POLICIES)})")
+    return policy
+
+
+def load_exam_attempt_policy(db: Session, exam_id: UUID, override: Optional[str] = None) -> str:
+    settings = db.execute(select(models.Exam.settings).where(models.Exam.id == exam_id)).scalar()
+    return resolve_attempt_policy(settings, override)
+
+
+def _is_graded():
+    """Whether the attempt has a stored result (correlated, per attempt)"""
+    return (
+        select(models.SubmissionResult.id)
+        .where(models.SubmissionResult.submission_id == models.Submission.id)
+        .exists()
+    )
+
+
+def _attempt_rank(policy: str) -> list:
+    submission = models.Submission
+    rank = [submission.attempt_number.desc(), submission.submitted_at.desc(), submission.id.desc()]
+    if policy == ATTEMPTS_BEST:
+        # Correlated per attempt (uses idx_submission_results_submission_id)
+        best_score = (
+            select(func.max(models.SubmissionResult.score))
+            .where(models.SubmissionResult.submission_id == submission.id)
+            .scalar_subquery()
+        )
+        rank.insert(0, best_score.desc().nulls_last())
+    return rank
+
+
+def iter_attempt_pages(
+    db: Session,
+    exam_id: UUID,
+    policy: str,
+    chunk_size: int = GRADING_ENQUEUE_CHUNK_SIZE
+) -> Iterator[AttemptPage]:
+    """
+    The exam's attempts to grade, chunk_size (student, question) groups at a
+    time, each page with the attempts it supersedes. Keyset-paginated on
+    (student_id, question_id) so memory stays flat; safe to commit between pages.
+    Under `best`, a group with ungraded attempts yields all of those and
+    supersedes nothing.
+    """
+    if policy == ATTEMPTS_ALL:
+        for submission_ids in iter_exam_submission_ids(db, exam_id, chunk_size):
+            yield submission_ids, []
+        return
+
+    submission = models.Submission
+    group = (submission.student_id, submission.question_id)
+    columns = [submission.id, submission.student_id, submission.question_id]
+    if policy == ATTEMPTS_BEST:
+        columns.append(_is_graded().label("graded"))
+    after = None
+    while True:
+        query = (
+            select(*columns)
+            .where(submission.exam_id == exam_id)
+            .distinct(*group)
+            .order_by(*group, *_attempt_rank(policy))
+            .limit(chunk_size)
+        )
+        if after is not None:
+            query = query.where(tuple_(*group) > tuple_(*after))
+        rows = db.execute(query).all()
+        if not rows:
+            return
+
+        selected = {(row.student_id, row.question_id): row.id for row in rows}
+        last = (rows[-1].student_id, rows[-1].question_id)
+        # Everything else in the same groups
+        others = (
+            select(*columns)
+            .where(
+                submission.exam_id == exam_id,
+                tuple_(*group) <= tuple_(*last),
+                submission.id.notin_(list(selected.values())),
+            )
+        )
+        if after is not None:
+            others = others.where(tuple_(*group) > tuple_(*after))
+        other_rows = db.execute(others).all()
+
+        # best: the highest score can't be known while an attempt is ungraded
+        ungraded: Dict[Tuple[UUID, UUID], List[UUID]] = {}
+        if policy == ATTEMPTS_BEST:
+            for row in [*rows, *other_rows]:
+                if not row.graded:
+                    ungraded.setdefault((row.student_id, row.question_id), []).append(row.id)
+        superseded = [
+            (row.id, selected[(row.student_id, row.question_id)])
+            for row in other_rows
+            if (row.student_id, row.question_id) not in ungraded
+        ]
+
+        yield [
+            submission_id
+            for key, effective_id in selected.items()
+            for submission_id in ungraded.get(key, [effective_id])
+        ], superseded
+        if len(rows) < chunk_size:
+            return
+        after = last
+
+
+def record_skipped_attempts(
+    db: Session,
+    superseded: List[Tuple[UUID, UUID]],
+    policy: str,
+    job_id: UUID
+):
+    """Mark superseded attempts in Submission.extra_data. Does not commit."""
+    if not superseded:
+        return
+    table = models.Submission.__table__
+    skipped_at = datetime.utcnow().isoformat()
+    db.execute(
+        table.update()
+        .where(table.c.id == bindparam("submission_id"))
+        .values(extra_data=func.coalesce(table.c.extra_data, cast(literal("{}"), JSONB)).op("||")(
+            bindparam("skip", type_=JSONB)
+        )),
+        [
+            {"submission_id": submission_id, "skip": {SKIP_KEY: {
+                "reason": "superseded",
+                "policy": policy,
+                "superseded_by": str(effective_id),
+                "job_id": str(job_id),
+                "skipped_at": skipped_at,
+            }}}
+            for submission_id, effective_id in superseded
+        ],
+    )
+
+
+def clear_skipped_marks(db: Session, submission_ids: List[UUID]):
+    """Drop an earlier skip mark from attempts that are graded now. Does not commit."""
+    if not submission_ids:
+        return
+    table = models.Submission.__table__
+    db.execute(
+        table.update()
+        .where(table.c.id.in_(submission_ids), table.c.extra_data.has_key(SKIP_KEY))
+        .values(extra_data=table.c.extra_data.op("-")(literal(SKIP_KEY, Text)))
+    )
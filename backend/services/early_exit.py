@@ -0,0 +1,107 @@
+"""
+Early Exit
+Per-question policies for stopping a submission's test run early (after K
+consecutive time-outs, on a compile error, or at the first failure). Tests
+that are cut off are reported as skipped, never silently dropped.
+"""
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# Defaults for questions without an extra_data["early_exit"] override
+GRADING_EARLY_EXIT_CONSECUTIVE_TLE = int(os.getenv("GRADING_EARLY_EXIT_CONSECUTIVE_TLE", "0"))  # 0 = off
+GRADING_EARLY_EXIT_ON_COMPILE_ERROR = os.getenv("GRADING_EARLY_EXIT_ON_COMPILE_ERROR", "true").lower() == "true"
+
+# Judge0 status ids
+STATUS_TIME_LIMIT_EXCEEDED = 5
+STATUS_COMPILATION_ERROR = 6
+
+SKIPPED_STATUS = "Skipped"
+
+
+class EarlyExitPolicy:
+    def __init__(
+        self,
+        max_consecutive_tle: int = GRADING_EARLY_EXIT_CONSECUTIVE_TLE,
+        stop_on_compile_error: bool = GRADING_EARLY_EXIT_ON_COMPILE_ERROR,
+        stop_on_first_failure: bool = False,
+    ):
+        self.max_consecutive_tle = max(0, int(max_consecutive_tle or 0))
+        self.stop_on_compile_error = stop_on_compile_error
+        self.stop_on_first_failure = stop_on_first_failure
+
+    @classmethod
+    def from_options(cls, options: Optional[Dict[str, Any]]) -> "EarlyExitPolicy":
+        """Policy from Question.extra_data["early_exit"], defaults for missing keys"""
+        options = options or {}
+        return cls(
+            max_consecutive_tle=options.get("max_consecutive_tle", GRADING_EARLY_EXIT_CONSECUTIVE_TLE),
+            stop_on_compile_error=bool(options.get("stop_on_compile_error", GRADING_EARLY_EXIT_ON_COMPILE_ERROR)),
+            stop_on_first_failure=bool(options.get("stop_on_first_failure", False)),
+        )
+
+    @property
+    def incremental(self) -> bool:
+        """
+        Whether runners should feed tests in steps and check in between.
+        A compile error fails every test anyway, so it alone is not worth
+        giving up batching for.
+        """
+        return self.stop_on_first_failure or self.max_consecutive_tle > 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_consecutive_tle": self.max_consecutive_tle,
+            "stop_on_compile_error": self.stop_on_compile_error,
+            "stop_on_first_failure": self.stop_on_first_failure,
+        }
+
+    def stop_point(self, results: List[Optional[Dict[str, Any]]]) -> Optional[Tuple[int, str]]:
+        """
+        (index of the test that triggered the stop, reason) for the first
+        stop in the finished prefix of `results`, or None
+        """
+        consecutive_tle = 0
+        for index, result in enumerate(results):
+            if result is None:
+                return None
+            status_id = result.get("status_id")
+            if self.stop_on_compile_error and status_id == STATUS_COMPILATION_ERROR:
+                return index, "compile_error"
+            if self.stop_on_first_failure and not result.get("passed"):
+                return index, "first_failure"
+            consecutive_tle = consecutive_tle + 1 if status_id == STATUS_TIME_LIMIT_EXCEEDED else 0
+            if self.max_consecutive_tle and consecutive_tle >= self.max_consecutive_tle:
+                return index, "consecutive_tle"
+        return None
+
+    def apply(self, results: List[Optional[Dict[str, Any]]], total: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Cut the results at the stop point: every later test is marked
+        skipped, even if it happened to run, so the verdict doesn't depend
+        on how tests were batched. Pads to `total` tests.
+        """
+        results = list(results) + [None] * max(0, (total or 0) - len(results))
+        stop = self.stop_point(results)
+        reason = stop[1] if stop else "not_run"
+        cut = stop[0] + 1 if stop else len(results)
+        applied = []
+        for index, result in enumerate(results):
+            if index >= cut or result is None:
+                applied.append(skipped_result(index, reason))
+            else:
+                applied.append(result)
+        return applied
+
+
+def skipped_result(index: int, reason: str) -> Dict[str, Any]:
+    """Per-test result for a test that was not run because of an early exit"""
+    return {
+        "test_case": index + 1,
+        "passed": False,
+        "skipped": True,
+        "skip_reason": reason,
+        "status_id": None,
+        "status": SKIPPED_STATUS,
+        "time": "0",
+        "memory": "0",
+    }
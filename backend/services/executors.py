@@ -0,0 +1,159 @@
+"""
+Executors
+Where code runs. Judge0Executor sends it to Judge0; the local pre-forked
+Python sandbox runs it on this host. Both return Judge0-shaped submission
+results, so callers don't care which one ran the code.
+GRADING_EXECUTOR / RUN_CODE_EXECUTOR pick the backend; languages the local
+sandbox can't run always go to Judge0.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .early_exit import EarlyExitPolicy
+from .judge0_callbacks import submit_and_wait
+from .judge0_client import judge0_client
+from .judge0_dispatch import LANE_INTERACTIVE, judge0_dispatcher
+
+logger = logging.getLogger(__name__)
+
+JUDGE0 = "judge0"
+LOCAL = "local"
+
+# "judge0" or "local"
+GRADING_EXECUTOR = os.getenv("GRADING_EXECUTOR", JUDGE0).lower()
+RUN_CODE_EXECUTOR = os.getenv("RUN_CODE_EXECUTOR", JUDGE0).lower()
+
+# Longest a single run (run-code, execute) waits for its verdict
+EXECUTOR_TIMEOUT = float(os.getenv("RUN_CODE_TIMEOUT", "60"))
+
+
+class Executor:
+    """Runs source code against stdin and returns a Judge0-shaped result"""
+
+    name = "base"
+
+    def supports(self, language_id: int) -> bool:
+        raise NotImplementedError
+
+    async def execute(
+        self,
+        source_code: str,
+        language_id: int,
+        stdin: str = "",
+        expected_output: Optional[str] = None,
+        limits: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        One run. With expected_output the status is Accepted / Wrong Answer
+        like a Judge0 submission that carries expected_output.
+        """
+        raise NotImplementedError
+
+    async def run_tests(
+        self,
+        source_code: str,
+        language_id: int,
+        tests: List[Tuple[str, str]],
+        limits: Optional[Dict[str, Any]] = None,
+        early_exit: Optional[EarlyExitPolicy] = None,
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        One execute() per (stdin, expected) test, concurrently unless the
+        early-exit policy has to look at each result first. Unrun tests are None.
+        """
+        if early_exit is not None and early_exit.incremental:
+            results: List[Optional[Dict[str, Any]]] = []
+            for stdin, expected in tests:
+                results.append(await self.execute(source_code, language_id, stdin, expected, limits))
+                if early_exit.stop_point([self._verdict(r) for r in results]):
+                    break
+            return results + [None] * (len(tests) - len(results))
+
+        return list(await asyncio.gather(*(
+            self.execute(source_code, language_id, stdin, expected, limits) for stdin, expected in tests
+        )))
+
+    @staticmethod
+    def _verdict(result: Dict[str, Any]) -> Dict[str, Any]:
+        status_id = (result.get("status") or {}).get("id")
+        return {"status_id": status_id, "passed": status_id == 3}
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class Judge0Executor(Executor):
+    """Single runs through the shared Judge0 client (grading keeps its batched/packed paths)"""
+
+    name = JUDGE0
+
+    def __init__(self, api_url: Optional[str] = None, lane: str = LANE_INTERACTIVE):
+        self.api_url = api_url or judge0_client.api_url
+        # Dispatch lane (see judge0_dispatch); single runs are someone waiting on them
+        self.lane = lane
+
+    def supports(self, language_id: int) -> bool:
+        return True
+
+    async def execute(
+        self,
+        source_code: str,
+        language_id: int,
+        stdin: str = "",
+        expected_output: Optional[str] = None,
+        limits: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        payload = {
+            "source_code": source_code,
+            "language_id": language_id,
+            "stdin": stdin or "",
+            **(limits or {}),
+        }
+        if expected_output is not None:
+            payload["expected_output"] = expected_output
+        session = await judge0_client.get_session()
+        async with judge0_dispatcher.slot(self.lane):
+            # wait=true, or with callbacks submit and await Judge0's callback
+            return await submit_and_wait(session, self.api_url, payload, timeout=EXECUTOR_TIMEOUT)
+
+
+# Global Judge0 executor for JUDGE0_API_URL
+judge0_executor = Judge0Executor()
+
+
+def _local_sandbox() -> Executor:
+    # Imported here: local_sandbox subclasses Executor
+    from .local_sandbox import local_python_sandbox
+    return local_python_sandbox
+
+
+def get_executor(backend: str, language_id: int) -> Executor:
+    """The configured backend if it can run this language, else Judge0"""
+    if backend == LOCAL and _local_sandbox().supports(language_id):
+        return _local_sandbox()
+    if backend not in (JUDGE0, LOCAL):
+        logger.warning(f"Unknown executor backend {backend!r}; using Judge0")
+    return judge0_executor
+
+
+async def warm_up_executors():
+    """Pre-fork the local sandbox pool if a configured backend uses it"""
+    if LOCAL in (GRADING_EXECUTOR, RUN_CODE_EXECUTOR):
+        await _local_sandbox().warm_up()
+
+
+async def close_executors():
+    await _local_sandbox().close()
+
+
+def executor_stats() -> Dict[str, Any]:
+    return {
+        "grading": GRADING_EXECUTOR,
+        "run_code": RUN_CODE_EXECUTOR,
+        LOCAL: _local_sandbox().stats(),
+    }
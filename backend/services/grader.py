@@ -0,0 +1,92 @@
+"""
+Grader
+Standalone grading worker: `python -m backend.services.grader`. Claims tasks
+from the shared grading queue so graders can be scaled next to Judge0
+without scaling the API tier.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import Optional
+
+from ..database import engine, init_schema, load_models
+from ..wait_for_db import wait_for_db
+from .grading_scheduler import AdaptiveConcurrencyLimiter
+from .executors import close_executors, warm_up_executors
+from .judge0_client import judge0_client
+from .submission_processor import submission_processor
+
+logger = logging.getLogger(__name__)
+
+# Every mapper must be resolvable before the first query (User -> AssessmentSubmission)
+load_models()
+
+# Seconds to let in-flight submissions finish after SIGTERM before giving
+# their tasks back to the queue
+GRADING_DRAIN_TIMEOUT = float(os.getenv("GRADING_DRAIN_TIMEOUT", "60"))
+
+
+async def serve(
+    concurrency: Optional[int] = None,
+    worker_id: Optional[str] = None,
+    drain_timeout: float = GRADING_DRAIN_TIMEOUT,
+):
+    """Run one queue worker until SIGTERM/SIGINT, then drain it"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    overrides = {"ceiling": concurrency} if concurrency else {}
+    limiter = AdaptiveConcurrencyLimiter.from_env(**overrides)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await warm_up_executors()
+    logger.info(f"Grader {worker_id} running with concurrency {limiter.floor}-{limiter.ceiling}")
+    worker = asyncio.create_task(
+        submission_processor.run_queue_worker(stop_event, worker_id=worker_id, limiter=limiter)
+    )
+    stopping = asyncio.create_task(stop_event.wait())
+    await asyncio.wait({worker, stopping}, return_when=asyncio.FIRST_COMPLETED)
+
+    if not worker.done():
+        logger.info(f"Grader {worker_id} draining {limiter.in_flight} in-flight submissions")
+        try:
+            await asyncio.wait_for(asyncio.shield(worker), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Drain timed out after {drain_timeout}s; returning unfinished tasks to the queue")
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+    stopping.cancel()
+    await judge0_client.close()
+    await close_executors()
+
+    if not worker.cancelled() and worker.exception():
+        raise worker.exception()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade queued exam submissions against Judge0")
+    parser.add_argument(
+        "--concurrency", type=int, default=None,
+        help="Max submissions in flight (default: GRADING_MAX_CONCURRENCY)"
+    )
+    parser.add_argument("--worker-id", default=None, help="Defaults to host:pid")
+    parser.add_argument(
+        "--drain-timeout", type=float, default=GRADING_DRAIN_TIMEOUT,
+        help="Seconds to finish in-flight work after SIGTERM"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    wait_for_db(engine, timeout=60)
+    init_schema()
+
+    asyncio.run(serve(args.concurrency, args.worker_id, args.drain_timeout))
+
+
+if __name__ == "__main__":
+    main()
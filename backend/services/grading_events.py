@@ -0,0 +1,89 @@
+"""
+Grading Events
+Server-Sent Events stream of a grading job's progress, read from the
+grading_job_events table so it works whichever process does the grading
+"""
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from uuid import UUID
+
+from . import grading_queue
+from .grading_store import run_in_session
+
+# How often an open stream checks for new events
+GRADING_EVENTS_POLL_INTERVAL = float(os.getenv("GRADING_EVENTS_POLL_INTERVAL", "1"))
+# Comment line sent on an idle stream so proxies keep the connection open
+GRADING_EVENTS_KEEPALIVE_SECONDS = 15.0
+# Reconnect delay suggested to EventSource clients
+GRADING_EVENTS_RETRY_MS = 2000
+
+
+def format_sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_resume_seq(last_event_id: Optional[str], after: Optional[int] = None) -> int:
+    """Sequence number to resume after: ?after= wins over the Last-Event-ID header"""
+    if after is not None:
+        return max(after, 0)
+    try:
+        return max(int(last_event_id), 0) if last_event_id else 0
+    except ValueError:
+        return 0
+
+
+async def stream_job_events(
+    job_id: UUID,
+    after_seq: int = 0,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> AsyncIterator[str]:
+    """
+    Yields a `status` snapshot, then every job event with seq > after_seq
+    (`submission` per graded submission, `job` when the job finishes), then
+    `end` once the job is finished and nothing is left to send. Events carry
+    their seq as the SSE id so a reconnecting EventSource resumes in place.
+    """
+    loop = asyncio.get_running_loop()
+    last_seq = after_seq
+    last_sent = loop.time()
+    yield f"retry: {GRADING_EVENTS_RETRY_MS}\n\n"
+
+    snapshot_sent = False
+    while True:
+        if is_disconnected and await is_disconnected():
+            return
+
+        status, events = await run_in_session(grading_queue.load_job_events, job_id, last_seq)
+        if status is None:
+            # Job was deleted while we were streaming
+            yield format_sse("end", {"job_id": str(job_id), "status": "deleted"})
+            return
+
+        if not snapshot_sent:
+            # No id: a snapshot must not move the client's resume point
+            yield format_sse("status", status)
+            snapshot_sent = True
+            last_sent = loop.time()
+
+        for event in events:
+            yield format_sse(event["type"], event["data"], event["seq"])
+            last_seq = event["seq"]
+        if events:
+            last_sent = loop.time()
+            continue
+
+        if status["status"] != "processing" and last_seq >= status["last_event_id"]:
+            yield format_sse("end", status)
+            return
+
+        if loop.time() - last_sent >= GRADING_EVENTS_KEEPALIVE_SECONDS:
+            yield ": keep-alive\n\n"
+            last_sent = loop.time()
+        await asyncio.sleep(GRADING_EVENTS_POLL_INTERVAL)
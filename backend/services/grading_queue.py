@@ -0,0 +1,542 @@
+"""
+Grading Queue
+Postgres-backed grading jobs and per-submission tasks. Any worker process
+can claim pending tasks with FOR UPDATE SKIP LOCKED, and job progress lives
+in the database so every API worker sees the same status.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from .attempt_selection import (
+    clear_skipped_marks, iter_attempt_pages, load_exam_attempt_policy, record_skipped_attempts
+)
+from .grading_store import GRADING_ENQUEUE_CHUNK_SIZE, run_in_session, submission_to_dict
+from .regrade import JOB_MODE_REGRADE, iter_stale_submission_ids
+
+logger = logging.getLogger(__name__)
+
+# Workers refresh heartbeat_at on their running tasks this often
+GRADING_TASK_HEARTBEAT_SECONDS = float(os.getenv("GRADING_TASK_HEARTBEAT_SECONDS", "15"))
+# A running task without a heartbeat for this long is assumed lost (worker died)
+GRADING_TASK_STALE_SECONDS = int(os.getenv("GRADING_TASK_STALE_SECONDS", "90"))
+# Give up on a submission after this many claims
+GRADING_TASK_MAX_ATTEMPTS = int(os.getenv("GRADING_TASK_MAX_ATTEMPTS", "3"))
+# Cap on error messages kept per job
+GRADING_JOB_MAX_ERRORS = 100
+# GradingJob.extra_data flag: tasks are still being added, so the job can't complete yet
+JOB_ENQUEUING_KEY = "enqueuing"
+
+# (task_id, error or None)
+TaskOutcome = Tuple[str, Optional[str]]
+
+
+def create_exam_job(
+    db: Session,
+    exam_id: UUID,
+    attempt_policy: Optional[str] = None,
+    chunk_size: int = GRADING_ENQUEUE_CHUNK_SIZE
+) -> models.GradingJob:
+    """
+    Create a job for an exam's submissions. Only the attempts the exam's
+    attempt policy selects get a task (see attempt_selection); superseded
+    ones are marked skipped in the same transaction.
+    Raises ValueError for an unknown attempt policy.
+    """
+    attempt_policy = load_exam_attempt_policy(db, exam_id, attempt_policy)
+    return _create_streamed_job(
+        db, exam_id, {"attempt_policy": attempt_policy, "skipped": 0},
+        iter_attempt_pages(db, exam_id, attempt_policy, chunk_size)
+    )
+
+
+def create_regrade_job(
+    db: Session,
+    exam_id: UUID,
+    fingerprints: Dict[UUID, str],
+    chunk_size: int = GRADING_ENQUEUE_CHUNK_SIZE
+) -> models.GradingJob:
+    """
+    Create a re-grade job for the exam's graded submissions whose latest
+    result doesn't match their question's current test case fingerprint
+    (question id -> fingerprint, see regrade.load_exam_fingerprints)
+    """
+    return _create_streamed_job(
+        db, exam_id, {"mode": JOB_MODE_REGRADE},
+        ((submission_ids, []) for submission_ids in iter_stale_submission_ids(db, exam_id, fingerprints, chunk_size))
+    )
+
+
+def _create_streamed_job(
+    db: Session,
+    exam_id: UUID,
+    extra_data: Dict[str, Any],
+    pages: Iterator[Tuple[List[UUID], List[Tuple[UUID, UUID]]]]
+) -> models.GradingJob:
+    """
+    Create a job and stream its tasks in from `pages` of (submission ids,
+    superseded attempts). Each page is committed on its own, so workers
+    start on the first one while later ones are still being queued and
+    memory stays flat however big the exam is. The job is flagged as
+    enqueuing until the last page is in, so it can't complete early.
+    """
+    job = models.GradingJob(
+        exam_id=exam_id,
+        status=models.GradingJobStatus.PROCESSING,
+        total=0,
+        errors=[],
+        extra_data={JOB_ENQUEUING_KEY: True, **extra_data},
+    )
+    db.add(job)
+    db.commit()
+    job_id = job.id
+
+    try:
+        for submission_ids, superseded in pages:
+            # Workers update the same row as they finish tasks; lock it before
+            # the INSERT's foreign-key check takes a weaker lock on it
+            job = _lock_job(db, job_id)
+            db.execute(
+                insert(models.GradingTask),
+                [{"job_id": job_id, "submission_id": sid} for sid in submission_ids],
+            )
+            job.total += len(submission_ids)
+            clear_skipped_marks(db, submission_ids)
+            if superseded:
+                record_skipped_attempts(db, superseded, job.extra_data.get("attempt_policy"), job_id)
+                job.extra_data = {**(job.extra_data or {}), "skipped": job_skipped(job) + len(superseded)}
+                add_job_event(db, job, "skipped", {
+                    "reason": "superseded",
+                    "submission_ids": [str(sid) for sid, _ in superseded],
+                    **job_progress(job),
+                })
+            db.commit()
+    except Exception as e:
+        db.rollback()
+        job = _lock_job(db, job_id)
+        job.extra_data = _without_enqueuing(job.extra_data)
+        job.status = models.GradingJobStatus.FAILED
+        job.finished_at = datetime.utcnow()
+        job.errors = (job.errors or []) + [f"Queueing stopped after {job.total} submissions: {e}"]
+        add_job_event(db, job, "job", job_to_status(job))
+        db.commit()
+        raise
+
+    job = _lock_job(db, job_id)
+    job.extra_data = _without_enqueuing(job.extra_data)
+    db.flush()
+    # Every task may already be done
+    _finalize_jobs(db, [job])
+    db.commit()
+    return job
+
+
+def _lock_job(db: Session, job_id: UUID) -> models.GradingJob:
+    return (
+        db.query(models.GradingJob)
+        .filter(models.GradingJob.id == job_id)
+        .with_for_update()
+        .populate_existing()
+        .one()
+    )
+
+
+def _without_enqueuing(extra_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key: value for key, value in (extra_data or {}).items() if key != JOB_ENQUEUING_KEY}
+
+
+def claim_tasks(db: Session, worker_id: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Atomically claim up to `limit` pending tasks for this worker.
+    Rows locked by other workers are skipped, so claims never overlap.
+    """
+    rows = db.execute(
+        select(models.GradingTask.id, models.GradingTask.job_id, models.GradingTask.submission_id)
+        .where(models.GradingTask.status == models.GradingTaskStatus.PENDING)
+        .order_by(models.GradingTask.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        db.commit()
+        return []
+
+    db.execute(
+        update(models.GradingTask)
+        .where(models.GradingTask.id.in_([row.id for row in rows]))
+        .values(
+            status=models.GradingTaskStatus.RUNNING,
+            claimed_by=worker_id,
+            claimed_at=func.now(),
+            heartbeat_at=func.now(),
+            attempts=models.GradingTask.attempts + 1,
+        )
+    )
+    submissions = {
+        s.id: s
+        for s in db.query(models.Submission)
+        .filter(models.Submission.id.in_([row.submission_id for row in rows]))
+        .all()
+    }
+    # Not joined above: FOR UPDATE would lock the job rows too
+    modes = dict(db.execute(
+        select(models.GradingJob.id, models.GradingJob.extra_data["mode"].astext)
+        .where(models.GradingJob.id.in_({row.job_id for row in rows}))
+    ).all())
+    db.commit()
+
+    claimed = []
+    for row in rows:
+        submission = submissions.get(row.submission_id)
+        claimed.append({
+            "task_id": str(row.id),
+            "job_id": str(row.job_id),
+            # None for grading, regrade.JOB_MODE_REGRADE for re-grades
+            "mode": modes.get(row.job_id),
+            "submission": submission_to_dict(submission) if submission else None,
+        })
+    return claimed
+
+
+def finish_tasks(db: Session, worker_id: str, outcomes: List[TaskOutcome]):
+    """
+    Mark claimed tasks completed/failed and roll the counts into their jobs.
+    Does not commit; meant to share a transaction with the result INSERT.
+    Tasks that were re-queued and claimed by another worker in the meantime
+    are left alone so a job never counts a submission twice.
+    """
+    outcomes = [o for o in outcomes if o is not None]
+    if not outcomes:
+        return
+    errors_by_task = {UUID(task_id): error for task_id, error in outcomes}
+
+    finished = db.execute(
+        select(models.GradingTask.id, models.GradingTask.job_id, models.GradingTask.submission_id)
+        .where(
+            models.GradingTask.id.in_(list(errors_by_task)),
+            models.GradingTask.status == models.GradingTaskStatus.RUNNING,
+            models.GradingTask.claimed_by == worker_id,
+        )
+        .with_for_update()
+    ).all()
+    if not finished:
+        return
+
+    _apply_outcomes(db, [
+        (row.id, row.job_id, row.submission_id, errors_by_task[row.id]) for row in finished
+    ])
+
+
+def _apply_outcomes(db: Session, outcomes: List[Tuple[UUID, UUID, UUID, Optional[str]]]):
+    """outcomes: (task_id, job_id, submission_id, error or None)"""
+    completed_ids = [task_id for task_id, _, _, error in outcomes if error is None]
+    if completed_ids:
+        db.execute(
+            update(models.GradingTask)
+            .where(models.GradingTask.id.in_(completed_ids))
+            .values(status=models.GradingTaskStatus.COMPLETED, error=None, finished_at=func.now())
+        )
+    for task_id, _, _, error in outcomes:
+        if error is not None:
+            db.execute(
+                update(models.GradingTask)
+                .where(models.GradingTask.id == task_id)
+                .values(status=models.GradingTaskStatus.FAILED, error=error, finished_at=func.now())
+            )
+
+    jobs = (
+        db.query(models.GradingJob)
+        .filter(models.GradingJob.id.in_({job_id for _, job_id, _, _ in outcomes}))
+        .order_by(models.GradingJob.id)  # consistent lock order across workers
+        .with_for_update()
+        .all()
+    )
+    jobs_by_id = {job.id: job for job in jobs}
+    for task_id, job_id, submission_id, error in outcomes:
+        job = jobs_by_id.get(job_id)
+        if job is None:
+            continue
+        if error is None:
+            job.completed += 1
+        else:
+            job.failed += 1
+            if len(job.errors or []) < GRADING_JOB_MAX_ERRORS:
+                job.errors = (job.errors or []) + [error]
+        # One event per submission, carrying the running totals at that point
+        add_job_event(db, job, "submission", {
+            "task_id": str(task_id),
+            "submission_id": str(submission_id),
+            "outcome": "failed" if error else "completed",
+            "error": error,
+            **job_progress(job),
+        })
+    db.flush()
+
+    _finalize_jobs(db, jobs)
+
+
+def _finalize_jobs(db: Session, jobs: List[models.GradingJob]):
+    """Mark jobs with no pending or running tasks left as completed"""
+    open_jobs = {
+        row.job_id
+        for row in db.execute(
+            select(models.GradingTask.job_id)
+            .where(
+                models.GradingTask.job_id.in_([job.id for job in jobs]),
+                models.GradingTask.status.in_([
+                    models.GradingTaskStatus.PENDING,
+                    models.GradingTaskStatus.RUNNING,
+                ]),
+            )
+            .distinct()
+        ).all()
+    }
+    for job in jobs:
+        if job.id in open_jobs or job.status != models.GradingJobStatus.PROCESSING:
+            continue
+        if (job.extra_data or {}).get(JOB_ENQUEUING_KEY):
+            continue
+        job.status = models.GradingJobStatus.COMPLETED
+        job.finished_at = datetime.utcnow()
+        add_job_event(db, job, "job", job_to_status(job))
+    db.flush()
+
+
+def add_job_event(db: Session, job: models.GradingJob, event_type: str, data: Dict[str, Any]):
+    """
+    Append a progress event to a job. The caller must hold the job's row
+    lock so sequence numbers are gapless and never reused.
+    """
+    job.event_seq = (job.event_seq or 0) + 1
+    db.add(models.GradingJobEvent(job_id=job.id, seq=job.event_seq, event_type=event_type, data=data))
+
+
+def job_skipped(job: models.GradingJob) -> int:
+    """Attempts left out by the job's attempt policy (not part of total)"""
+    return int((job.extra_data or {}).get("skipped") or 0)
+
+
+def job_progress(job: models.GradingJob) -> Dict[str, Any]:
+    """Running totals plus a naive ETA from the average pace so far"""
+    done = job.completed + job.failed
+    remaining = max(job.total - done, 0)
+    eta_seconds = None
+    if done and job.started_at:
+        elapsed = max((datetime.utcnow() - job.started_at).total_seconds(), 0.0)
+        eta_seconds = round(elapsed / done * remaining, 1)
+    return {
+        "completed": job.completed,
+        "failed": job.failed,
+        "total": job.total,
+        "skipped": job_skipped(job),
+        "eta_seconds": eta_seconds,
+    }
+
+
+def load_job_events(
+    db: Session,
+    job_id: UUID,
+    after_seq: int = 0,
+    limit: int = 500,
+) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Current job status and its events with seq > after_seq, oldest first.
+    The job is read before the events, so once it shows a final status
+    every event up to its event_seq is visible.
+    """
+    job = get_job(db, job_id)
+    if not job:
+        return None, []
+    status = job_to_status(job)
+    events = (
+        db.query(models.GradingJobEvent)
+        .filter(
+            models.GradingJobEvent.job_id == job_id,
+            models.GradingJobEvent.seq > after_seq,
+        )
+        .order_by(models.GradingJobEvent.seq)
+        .limit(limit)
+        .all()
+    )
+    return status, [{"seq": e.seq, "type": e.event_type, "data": e.data} for e in events]
+
+
+def requeue_stale_tasks(
+    db: Session,
+    stale_seconds: int = GRADING_TASK_STALE_SECONDS,
+    max_attempts: int = GRADING_TASK_MAX_ATTEMPTS,
+) -> int:
+    """
+    Put tasks whose worker stopped sending heartbeats back in the queue so
+    unfinished jobs resume automatically; tasks that already used every
+    attempt fail.
+    """
+    # Database clock on both sides: heartbeats are written with now() too
+    cutoff = func.now() - timedelta(seconds=stale_seconds)
+    stale = db.execute(
+        select(
+            models.GradingTask.id,
+            models.GradingTask.job_id,
+            models.GradingTask.submission_id,
+            models.GradingTask.attempts,
+        )
+        .where(
+            models.GradingTask.status == models.GradingTaskStatus.RUNNING,
+            func.coalesce(models.GradingTask.heartbeat_at, models.GradingTask.claimed_at) < cutoff,
+        )
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not stale:
+        db.commit()
+        return 0
+
+    retry_ids = [row.id for row in stale if row.attempts < max_attempts]
+    if retry_ids:
+        db.execute(
+            update(models.GradingTask)
+            .where(models.GradingTask.id.in_(retry_ids))
+            .values(
+                status=models.GradingTaskStatus.PENDING,
+                claimed_by=None,
+                claimed_at=None,
+                heartbeat_at=None,
+            )
+        )
+    exhausted = [
+        (row.id, row.job_id, row.submission_id, f"Gave up after {row.attempts} attempts")
+        for row in stale if row.attempts >= max_attempts
+    ]
+    if exhausted:
+        _apply_outcomes(db, exhausted)
+    db.commit()
+
+    logger.info(f"Re-queued {len(retry_ids)} stale grading tasks, failed {len(exhausted)}")
+    return len(stale)
+
+
+def heartbeat_tasks(db: Session, worker_id: str) -> int:
+    """Mark every task this worker is running as still alive"""
+    updated = db.execute(
+        update(models.GradingTask)
+        .where(
+            models.GradingTask.status == models.GradingTaskStatus.RUNNING,
+            models.GradingTask.claimed_by == worker_id,
+        )
+        .values(heartbeat_at=func.now())
+    ).rowcount
+    db.commit()
+    return updated
+
+
+def release_tasks(db: Session, worker_id: str, task_ids: Optional[List[str]] = None) -> int:
+    """
+    Hand this worker's running tasks back to the queue (e.g. on shutdown),
+    either the given ones or, with task_ids=None, all of them. The claim
+    does not count as an attempt.
+    """
+    conditions = [
+        models.GradingTask.status == models.GradingTaskStatus.RUNNING,
+        models.GradingTask.claimed_by == worker_id,
+    ]
+    if task_ids is not None:
+        if not task_ids:
+            return 0
+        conditions.append(models.GradingTask.id.in_([UUID(t) for t in task_ids]))
+    released = db.execute(
+        update(models.GradingTask)
+        .where(*conditions)
+        .values(
+            status=models.GradingTaskStatus.PENDING,
+            claimed_by=None,
+            claimed_at=None,
+            heartbeat_at=None,
+            attempts=models.GradingTask.attempts - 1,
+        )
+    ).rowcount
+    db.commit()
+    return released
+
+
+def get_job(db: Session, job_id: UUID) -> Optional[models.GradingJob]:
+    return db.query(models.GradingJob).filter(models.GradingJob.id == job_id).first()
+
+
+def job_to_status(job: models.GradingJob) -> Dict[str, Any]:
+    """Same shape the in-memory processing_jobs entries used to have"""
+    status = {
+        "job_id": str(job.id),
+        "exam_id": str(job.exam_id),
+        "status": job.status.value,
+        "total": job.total,
+        "completed": job.completed,
+        "failed": job.failed,
+        "start_time": job.started_at.isoformat() if job.started_at else None,
+        "skipped": job_skipped(job),
+        "attempt_policy": (job.extra_data or {}).get("attempt_policy"),
+        "mode": (job.extra_data or {}).get("mode") or "grade",
+        "errors": job.errors or [],
+        # Still adding tasks; total grows until this is False
+        "enqueuing": bool((job.extra_data or {}).get(JOB_ENQUEUING_KEY)),
+        "eta_seconds": job_progress(job)["eta_seconds"],
+        # Resume point for GET /processing-jobs/{job_id}/events
+        "last_event_id": job.event_seq or 0,
+    }
+    if job.finished_at:
+        status["end_time"] = job.finished_at.isoformat()
+    return status
+
+
+def delete_job(db: Session, job_id: UUID) -> bool:
+    job = get_job(db, job_id)
+    if not job:
+        return False
+    db.delete(job)
+    db.commit()
+    return True
+
+
+async def claim(worker_id: str, limit: int) -> List[Dict[str, Any]]:
+    return await run_in_session(claim_tasks, worker_id, limit)
+
+
+async def requeue_stale() -> int:
+    return await run_in_session(requeue_stale_tasks)
+
+
+async def heartbeat(worker_id: str) -> int:
+    return await run_in_session(heartbeat_tasks, worker_id)
+
+
+async def release(worker_id: str, task_ids: Optional[List[str]] = None) -> int:
+    return await run_in_session(release_tasks, worker_id, task_ids)
+
+
+async def fail_tasks(worker_id: str, outcomes: List[TaskOutcome]):
+    """Finish tasks that produced no result row (e.g. submission deleted)"""
+    def _fail(db: Session):
+        finish_tasks(db, worker_id, outcomes)
+        db.commit()
+    await run_in_session(_fail)
+
+
+class TaskResultWriter:
+    """
+    Hands process_single_submission's result to the shared buffered writer,
+    tagged with its task so the task is finished in the same transaction
+    that stores the result.
+    """
+
+    def __init__(self, writer, task_id: str):
+        self.writer = writer
+        self.task_id = task_id
+
+    async def add(self, result: Dict[str, Any]):
+        # Failed submissions are saved with their exception in extra_data
+        error = (result.get("extra_data") or {}).get("error")
+        await self.writer.add(result, tag=(self.task_id, str(error) if error else None))
@@ -0,0 +1,245 @@
+"""
+Grading Scheduler
+Adaptive (AIMD) concurrency control for running submissions against Judge0
+"""
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Sliding-window limiter whose in-flight limit follows AIMD:
+    the limit grows by ~1 for every `limit` healthy completions and is cut
+    by `decrease_factor` when Judge0 looks congested (latency well above
+    the best observed, too many errors, or a deep Judge0 queue).
+    """
+
+    def __init__(
+        self,
+        floor: int = 2,
+        ceiling: int = 32,
+        initial: Optional[int] = None,
+        latency_tolerance: float = 2.0,
+        max_error_rate: float = 0.1,
+        max_queue_depth: Optional[int] = 80,
+        decrease_factor: float = 0.5,
+        window: int = 20,
+    ):
+        if floor < 1 or ceiling < floor:
+            raise ValueError("Concurrency floor must be >= 1 and <= ceiling")
+        self.floor = floor
+        self.ceiling = ceiling
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.max_queue_depth = max_queue_depth
+        self.decrease_factor = decrease_factor
+
+        self._limit = float(min(max(initial or floor, floor), ceiling))
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+
+        self._outcomes = deque(maxlen=window)  # True = error
+        self._latency_ewma: Optional[float] = None
+        self._latency_baseline: Optional[float] = None
+        self._queue_depth: Optional[int] = None
+        # Completions to wait after a decrease before reacting again
+        self._cooldown = 0
+
+    @classmethod
+    def from_env(cls, **overrides) -> "AdaptiveConcurrencyLimiter":
+        """Limiter configured from GRADING_* settings; keyword arguments win"""
+        max_queue_depth = int(os.getenv("GRADING_MAX_QUEUE_DEPTH", "80"))
+        params = dict(
+            floor=int(os.getenv("GRADING_MIN_CONCURRENCY", "2")),
+            ceiling=int(os.getenv("GRADING_MAX_CONCURRENCY", "32")),
+            initial=int(os.getenv("GRADING_INITIAL_CONCURRENCY", "4")),
+            latency_tolerance=float(os.getenv("GRADING_LATENCY_TOLERANCE", "2.0")),
+            max_error_rate=float(os.getenv("GRADING_MAX_ERROR_RATE", "0.1")),
+            max_queue_depth=max_queue_depth if max_queue_depth > 0 else None,
+        )
+        params.update(overrides)
+        params["floor"] = min(params["floor"], params["ceiling"])
+        return cls(**params)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def stats(self) -> dict:
+        """Snapshot for job status reporting"""
+        errors = sum(1 for e in self._outcomes if e)
+        return {
+            "concurrency_limit": self.limit,
+            "in_flight": self._in_flight,
+            "latency_ewma": round(self._latency_ewma, 3) if self._latency_ewma is not None else None,
+            "error_rate": round(errors / len(self._outcomes), 3) if self._outcomes else 0.0,
+            "judge0_queue_depth": self._queue_depth,
+        }
+
+    async def acquire(self):
+        """Wait for a free slot under the current limit"""
+        async with self._cond:
+            while self._in_flight >= self.limit:
+                await self._cond.wait()
+            self._in_flight += 1
+
+    async def abandon(self):
+        """Give back a slot that was acquired but never used"""
+        async with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    async def release(self, latency: float, error: bool):
+        """Record a completion and adjust the limit"""
+        async with self._cond:
+            self._in_flight -= 1
+            self._record(latency, error)
+            self._cond.notify_all()
+
+    async def observe_queue_depth(self, depth: Optional[int]):
+        """Feed the latest Judge0 queue depth into the next adjustment"""
+        async with self._cond:
+            self._queue_depth = depth
+            if self._is_queue_congested():
+                self._decrease("judge0 queue depth")
+                self._cond.notify_all()
+
+    def _record(self, latency: float, error: bool):
+        self._outcomes.append(error)
+        if not error:
+            alpha = 0.2
+            self._latency_ewma = latency if self._latency_ewma is None else (
+                alpha * latency + (1 - alpha) * self._latency_ewma
+            )
+            # Baseline is the best recent latency; it drifts up slowly so a
+            # job that moves on to heavier questions is not throttled forever
+            if self._latency_baseline is None:
+                self._latency_baseline = self._latency_ewma
+            else:
+                self._latency_baseline = min(self._latency_ewma, self._latency_baseline * 1.02)
+
+        if self._cooldown > 0:
+            self._cooldown -= 1
+            return
+
+        reason = self._congestion_reason()
+        if reason:
+            self._decrease(reason)
+        elif self._limit < self.ceiling:
+            # Additive increase: +1 per `limit` healthy completions
+            self._limit = min(self.ceiling, self._limit + 1.0 / self._limit)
+
+    def _congestion_reason(self) -> Optional[str]:
+        if len(self._outcomes) >= 5:
+            error_rate = sum(1 for e in self._outcomes if e) / len(self._outcomes)
+            if error_rate > self.max_error_rate:
+                return "error rate"
+        if (
+            self._latency_ewma is not None
+            and self._latency_baseline
+            and self._latency_ewma > self._latency_baseline * self.latency_tolerance
+        ):
+            return "latency"
+        if self._is_queue_congested():
+            return "judge0 queue depth"
+        return None
+
+    def _is_queue_congested(self) -> bool:
+        return (
+            self.max_queue_depth is not None
+            and self._queue_depth is not None
+            and self._queue_depth > self.max_queue_depth
+        )
+
+    def _decrease(self, reason: str):
+        if self._cooldown > 0:
+            return
+        new_limit = max(float(self.floor), self._limit * self.decrease_factor)
+        if int(new_limit) != self.limit:
+            logger.info(f"Grading concurrency {self.limit} -> {int(new_limit)} ({reason})")
+        self._limit = new_limit
+        # Let the in-flight work drain before judging the new limit
+        self._cooldown = max(self.limit, 1)
+        self._outcomes.clear()
+
+
+async def run_adaptive(
+    items: Union[Iterable[Any], AsyncIterable[Any]],
+    handler: Callable[[Any], Awaitable[Any]],
+    limiter: AdaptiveConcurrencyLimiter,
+    on_done: Optional[Callable[[Any, Any, Optional[BaseException]], Any]] = None,
+    is_error: Optional[Callable[[Any], bool]] = None,
+    queue_depth_probe: Optional[Callable[[], Awaitable[Optional[int]]]] = None,
+    probe_interval: float = 5.0,
+):
+    """
+    Run `handler` over `items` with at most `limiter.limit` in flight.
+    A new item starts as soon as any running one finishes; there are no
+    fixed batches. A slot is taken before the next item is pulled, so an
+    async iterable (e.g. a queue feeder) is only asked for work that can
+    start right away. `on_done(item, result, exc)` is called per completion
+    and may be a coroutine function.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    if hasattr(items, "__aiter__"):
+        iterator = items.__aiter__()
+        next_item = iterator.__anext__
+    else:
+        sync_iterator = iter(items)
+
+        async def next_item():
+            try:
+                return next(sync_iterator)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    async def run_one(item):
+        started = loop.time()
+        result, exc = None, None
+        try:
+            result = await handler(item)
+        except Exception as e:
+            exc = e
+        finally:
+            failed = exc is not None or bool(is_error and is_error(result))
+            await limiter.release(loop.time() - started, failed)
+        if on_done:
+            outcome = on_done(item, result, exc)
+            if asyncio.iscoroutine(outcome):
+                await outcome
+
+    async def probe_loop():
+        while True:
+            await limiter.observe_queue_depth(await queue_depth_probe())
+            await asyncio.sleep(probe_interval)
+
+    probe_task = asyncio.create_task(probe_loop()) if queue_depth_probe else None
+    try:
+        while True:
+            await limiter.acquire()
+            try:
+                item = await next_item()
+            except StopAsyncIteration:
+                await limiter.abandon()
+                break
+            except BaseException:
+                await limiter.abandon()
+                raise
+            task = asyncio.create_task(run_one(item))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        if probe_task:
+            probe_task.cancel()
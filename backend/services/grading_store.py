@@ -0,0 +1,293 @@
+"""
+Grading Store
+In-process data access for the grader: reads test cases and submissions and
+writes SubmissionResult rows through SQLAlchemy instead of our own HTTP API
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import exists, insert, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from .. import crud, models, schemas
+from ..database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Number of buffered results written per INSERT
+GRADING_RESULT_FLUSH_SIZE = int(os.getenv("GRADING_RESULT_FLUSH_SIZE", "25"))
+# Seconds a graded result may wait for others to share its INSERT; its
+# progress event is written with it (negative: only on flush_size/flush())
+GRADING_RESULT_FLUSH_INTERVAL = float(os.getenv("GRADING_RESULT_FLUSH_INTERVAL", "0"))
+# Submissions read (and queued) per keyset page when grading an exam
+GRADING_ENQUEUE_CHUNK_SIZE = int(os.getenv("GRADING_ENQUEUE_CHUNK_SIZE", "500"))
+
+
+def test_case_to_dict(tc: models.QuestionTestCase) -> Dict[str, Any]:
+    """JSON-safe test case dict, same shape as GET /questions/{id}/test-cases/"""
+    return {
+        "id": str(tc.id),
+        "question_id": str(tc.question_id),
+        "input_data": tc.input_data,
+        "expected_output": tc.expected_output,
+        "is_sample": tc.is_sample,
+        "is_hidden": tc.is_hidden,
+        "weight": tc.weight,
+        "extra_data": tc.extra_data or {},
+        "created_at": tc.created_at.isoformat() if tc.created_at else None,
+        "updated_at": tc.updated_at.isoformat() if tc.updated_at else None,
+    }
+
+
+def submission_to_dict(submission: models.Submission) -> Dict[str, Any]:
+    """The submission fields the grader needs, JSON-safe"""
+    return {
+        "id": str(submission.id),
+        "exam_id": str(submission.exam_id),
+        "question_id": str(submission.question_id),
+        "student_id": str(submission.student_id),
+        "source_code": submission.source_code,
+        "language": submission.language,
+        "attempt_number": submission.attempt_number,
+        "submitted_at": submission.submitted_at.isoformat() if submission.submitted_at else None,
+    }
+
+
+def load_test_cases(db: Session, question_id: UUID) -> List[Dict[str, Any]]:
+    test_cases = crud.get_test_cases_for_question(db, question_id=question_id)
+    return [test_case_to_dict(tc) for tc in test_cases]
+
+
+def load_question_grading_options(db: Session, question_id: UUID) -> Dict[str, Any]:
+    """Per-question grading switches kept in Question.extra_data"""
+    row = db.query(models.Question.extra_data, models.Question.time_limit_seconds).filter(
+        models.Question.id == question_id
+    ).first()
+    extra_data = (row.extra_data if row else None) or {}
+    return {
+        # Run every test case in one sandbox (see packed_execution)
+        "multi_test_harness": bool(extra_data.get("multi_test_harness", False)),
+        # Per-test CPU limit inputs (see time_limits)
+        "time_limit_seconds": row.time_limit_seconds if row else None,
+        "reference_runtimes": extra_data.get("reference_runtimes") or {},
+        # When to stop running tests (see early_exit.EarlyExitPolicy.from_options)
+        "early_exit": extra_data.get("early_exit") or {},
+    }
+
+
+# Exam statuses in which students can no longer run code
+CLOSED_EXAM_STATUSES = (models.ExamStatus.DRAFT, models.ExamStatus.COMPLETED, models.ExamStatus.CANCELLED)
+
+
+def exam_question_access_error(
+    db: Session, exam_id: UUID, question_id: UUID, user_id: UUID, is_staff: bool
+) -> Optional[Tuple[int, str]]:
+    """
+    None if the user may run code against the question in this exam, else
+    (HTTP status, detail). Staff may for any question in the exam; a student
+    only for a question assigned to them, while the exam is open.
+    """
+    exam = db.query(models.Exam.status, models.Exam.start_time, models.Exam.end_time).filter(
+        models.Exam.id == exam_id
+    ).first()
+    if exam is None:
+        return 404, "Exam not found"
+
+    if is_staff:
+        in_exam = db.execute(select(
+            exists().where(models.ExamQuestion.exam_id == exam_id, models.ExamQuestion.question_id == question_id)
+            | exists().where(
+                models.StudentExamQuestion.exam_id == exam_id, models.StudentExamQuestion.question_id == question_id
+            )
+        )).scalar()
+        return None if in_exam else (404, "Question is not part of this exam")
+
+    assigned = db.execute(select(exists().where(
+        models.StudentExamQuestion.exam_id == exam_id,
+        models.StudentExamQuestion.student_id == user_id,
+        models.StudentExamQuestion.question_id == question_id,
+    ))).scalar()
+    if not assigned:
+        return 404, "Question is not part of your exam"
+    now = datetime.utcnow()
+    if exam.status in CLOSED_EXAM_STATUSES or not (exam.start_time <= now <= exam.end_time):
+        return 403, "The exam is not open"
+    return None
+
+
+def exam_has_submissions(db: Session, exam_id: UUID) -> bool:
+    return db.execute(
+        select(exists().where(models.Submission.exam_id == exam_id))
+    ).scalar()
+
+
+def load_exam_submission_question_ids(
+    db: Session, exam_id: UUID, question_id: Optional[UUID] = None
+) -> List[UUID]:
+    """
+    Questions the exam has submissions for (or just question_id, if it has
+    any). Unlike ExamQuestion this includes questions assigned per student
+    (StudentExamQuestion).
+    """
+    query = select(models.Submission.question_id).where(models.Submission.exam_id == exam_id).distinct()
+    if question_id is not None:
+        query = query.where(models.Submission.question_id == question_id)
+    return list(db.execute(query).scalars().all())
+
+
+def iter_exam_submission_ids(
+    db: Session,
+    exam_id: UUID,
+    chunk_size: int = GRADING_ENQUEUE_CHUNK_SIZE
+) -> Iterator[List[UUID]]:
+    """
+    An exam's submission ids in (submitted_at, id) order, chunk_size at a
+    time. Keyset pagination: each page starts after the last row of the
+    previous one, so every page costs the same and nothing accumulates.
+    Safe to commit between pages.
+    """
+    order = (models.Submission.submitted_at, models.Submission.id)
+    after = None
+    while True:
+        query = (
+            select(models.Submission.id, models.Submission.submitted_at)
+            .where(models.Submission.exam_id == exam_id)
+            .order_by(*order)
+            .limit(chunk_size)
+        )
+        if after is not None:
+            query = query.where(tuple_(*order) > tuple_(*after))
+        rows = db.execute(query).all()
+        if not rows:
+            return
+        yield [row.id for row in rows]
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1].submitted_at, rows[-1].id)
+
+
+def insert_submission_results(db: Session, results: List[Dict[str, Any]], commit: bool = True) -> int:
+    """Validate and bulk-insert SubmissionResult rows in one statement"""
+    if not results:
+        return 0
+    rows = [schemas.SubmissionResultCreate(**result).dict() for result in results]
+    db.execute(insert(models.SubmissionResult), rows)
+    if commit:
+        db.commit()
+    return len(rows)
+
+
+def update_submission_results(db: Session, results: List[Dict[str, Any]], commit: bool = True) -> int:
+    """Validate and bulk-update existing SubmissionResult rows, matched by their "id" (re-grades)"""
+    if not results:
+        return 0
+    rows = [
+        {
+            "id": UUID(str(result["id"])),
+            **schemas.SubmissionResultUpdate(**{k: v for k, v in result.items() if k != "id"}).dict(exclude_unset=True),
+            "evaluated_at": datetime.utcnow(),
+        }
+        for result in results
+    ]
+    db.execute(update(models.SubmissionResult), rows)
+    if commit:
+        db.commit()
+    return len(rows)
+
+
+def _run_in_session(fn, *args, **kwargs):
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_in_session(fn, *args, **kwargs):
+    """Run `fn(db, *args, **kwargs)` with a fresh session in a worker thread"""
+    return await asyncio.to_thread(_run_in_session, fn, *args, **kwargs)
+
+
+async def save_submission_results(results: List[Dict[str, Any]]) -> int:
+    return await run_in_session(insert_submission_results, results)
+
+
+class SubmissionResultWriter:
+    """
+    Buffers graded results and writes them in bulk, once `flush_size` rows
+    are buffered at the latest. A result is written within `flush_interval` seconds of
+    being added, together with whatever else is buffered by then; results
+    added while a write is in flight go in the next one, so under load the
+    INSERTs stay large and when idle each result is written (and its job
+    event emitted) as soon as it is graded. Results carrying an "id" update
+    that stored row instead (re-grades). Call flush() once grading is done
+    to write the remainder.
+
+    `after_insert(db, tags)` runs in the same transaction as the INSERT with
+    the tags passed to add(), so callers can record what was persisted
+    atomically with the rows themselves.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = GRADING_RESULT_FLUSH_SIZE,
+        after_insert: Optional[Callable[[Session, List[Any]], None]] = None,
+        flush_interval: float = GRADING_RESULT_FLUSH_INTERVAL,
+    ):
+        self.flush_size = max(1, flush_size)
+        self.after_insert = after_insert
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict[str, Any]] = []
+        self._tags: List[Any] = []
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.written = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    async def add(self, result: Dict[str, Any], tag: Any = None):
+        self._buffer.append(result)
+        self._tags.append(tag)
+        if len(self._buffer) >= self.flush_size:
+            await self.flush()
+        elif self.flush_interval >= 0 and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        await asyncio.sleep(self.flush_interval)
+        # Results added from here on schedule the next write
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            # Already logged; the rows' tasks are re-queued once they go stale
+            pass
+
+    async def flush(self):
+        async with self._lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            tags, self._tags = self._tags, []
+            try:
+                self.written += await run_in_session(self._write, rows, tags)
+            except Exception as e:
+                logger.error(f"Failed to save {len(rows)} submission results: {e}")
+                raise Exception(f"Failed to save {len(rows)} submission results: {e}") from e
+
+    def _write(self, db: Session, rows: List[Dict[str, Any]], tags: List[Any]) -> int:
+        written = insert_submission_results(db, [r for r in rows if not r.get("id")], commit=False)
+        written += update_submission_results(db, [r for r in rows if r.get("id")], commit=False)
+        if self.after_insert:
+            self.after_insert(db, tags)
+        db.commit()
+        return written
@@ -0,0 +1,214 @@
+"""
+Judge0 Callbacks
+Lets executions finish via Judge0's callback_url (ENABLE_CALLBACKS in
+judge0.conf) instead of holding a wait=true connection or polling tokens.
+Judge0 PUTs the finished submission to /internal/judge0/callback, which
+resolves the future the submitting coroutine is waiting on.
+"""
+import asyncio
+import base64
+import hmac
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+import aiohttp
+
+from .judge0_client import judge0_client
+
+logger = logging.getLogger(__name__)
+
+# Base URL at which Judge0 can reach this API (e.g. http://backend:8000).
+# Empty disables callbacks. Leave it unset for standalone graders: they do
+# not serve the receiver endpoint and keep polling.
+JUDGE0_CALLBACK_URL = os.getenv("JUDGE0_CALLBACK_URL", "").rstrip("/")
+# Shared secret Judge0 echoes back in the callback URL; random per process if unset
+JUDGE0_CALLBACK_SECRET = os.getenv("JUDGE0_CALLBACK_SECRET") or secrets.token_urlsafe(24)
+# Safety-net poll while waiting for callbacks (lost callback, or delivered to another process)
+JUDGE0_CALLBACK_POLL_INTERVAL = float(os.getenv("JUDGE0_CALLBACK_POLL_INTERVAL", "5"))
+
+CALLBACK_PATH = "/internal/judge0/callback"
+
+# Judge0 statuses that are not final yet
+PENDING_STATUSES = (1, 2)
+
+# Judge0 sends callback bodies base64 encoded
+BASE64_FIELDS = ("stdout", "stderr", "compile_output", "message")
+
+
+class Judge0RequestError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"{status} - {detail}")
+        self.status = status
+        self.detail = detail
+
+
+def decode_callback_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    decoded = dict(payload)
+    for field in BASE64_FIELDS:
+        value = decoded.get(field)
+        if not value:
+            continue
+        try:
+            decoded[field] = base64.b64decode(value).decode("utf-8", errors="replace")
+        except (ValueError, TypeError):
+            pass  # already plain text
+    return decoded
+
+
+class Judge0CallbackRegistry:
+    """Futures keyed by Judge0 token, resolved by the callback endpoint"""
+
+    def __init__(self, base_url: str = JUDGE0_CALLBACK_URL, secret: str = JUDGE0_CALLBACK_SECRET,
+                 max_unclaimed: int = 1000, unclaimed_ttl: float = 120.0):
+        self.base_url = base_url
+        self.secret = secret
+        self._waiters: Dict[str, asyncio.Future] = {}
+        # Callbacks can beat the POST response that tells us the token
+        self._unclaimed: "OrderedDict[str, tuple]" = OrderedDict()
+        self.max_unclaimed = max_unclaimed
+        self.unclaimed_ttl = unclaimed_ttl
+        self.delivered = 0
+        self.unmatched = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    @property
+    def callback_url(self) -> str:
+        return f"{self.base_url}{CALLBACK_PATH}?secret={self.secret}"
+
+    def check_secret(self, secret: Optional[str]) -> bool:
+        return bool(secret) and hmac.compare_digest(secret, self.secret)
+
+    def expect(self, tokens: Iterable[str]) -> Dict[str, asyncio.Future]:
+        """Register interest in tokens; call forget() with the result when done"""
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for token in tokens:
+            future = loop.create_future()
+            early = self._unclaimed.pop(token, None)
+            if early is not None:
+                future.set_result(early[0])
+            else:
+                self._waiters[token] = future
+            futures[token] = future
+        return futures
+
+    def forget(self, futures: Dict[str, asyncio.Future]):
+        for token, future in futures.items():
+            if self._waiters.get(token) is future:
+                del self._waiters[token]
+
+    def resolve(self, payload: Dict[str, Any]) -> bool:
+        """Hand a callback body to its waiter. Returns False if nobody here is waiting."""
+        token = payload.get("token")
+        if not token:
+            return False
+        submission = decode_callback_payload(payload)
+        future = self._waiters.pop(token, None)
+        if future is not None:
+            if not future.done():
+                future.set_result(submission)
+            self.delivered += 1
+            return True
+
+        now = time.monotonic()
+        self._unclaimed[token] = (submission, now)
+        while self._unclaimed:
+            oldest_token, (_, received_at) = next(iter(self._unclaimed.items()))
+            if len(self._unclaimed) <= self.max_unclaimed and now - received_at < self.unclaimed_ttl:
+                break
+            self._unclaimed.pop(oldest_token)
+        self.unmatched += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "waiting": len(self._waiters),
+            "delivered": self.delivered,
+            "unmatched": self.unmatched,
+        }
+
+
+# Global registry shared by the grader and the run-code endpoints
+judge0_callbacks = Judge0CallbackRegistry()
+
+
+async def wait_for_submission(
+    session: aiohttp.ClientSession,
+    api_url: str,
+    token: str,
+    timeout: float,
+    poll_interval: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    Final Judge0 result for one token: from its callback when callbacks are
+    on, with GET /submissions/{token} as the fallback. Raises
+    asyncio.TimeoutError after `timeout` seconds.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    futures = judge0_callbacks.expect([token]) if judge0_callbacks.enabled else {}
+    if futures:
+        poll_interval = max(poll_interval, JUDGE0_CALLBACK_POLL_INTERVAL)
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            if futures:
+                done, _ = await asyncio.wait(futures.values(), timeout=min(poll_interval, remaining))
+                if done:
+                    return next(iter(done)).result()
+            else:
+                await asyncio.sleep(min(poll_interval, remaining))
+
+            async with session.get(
+                f"{api_url.rstrip('/')}/submissions/{token}",
+                params={"base64_encoded": "false"},
+                timeout=judge0_client.timeout("poll")
+            ) as response:
+                if response.status != 200:
+                    logger.warning(f"Judge0 poll for {token} failed: {response.status}")
+                    continue
+                result = await response.json()
+            if (result.get("status") or {}).get("id") not in PENDING_STATUSES:
+                return result
+    finally:
+        judge0_callbacks.forget(futures)
+
+
+async def submit_and_wait(
+    session: aiohttp.ClientSession,
+    api_url: str,
+    payload: Dict[str, Any],
+    timeout: float,
+) -> Dict[str, Any]:
+    """
+    Run one submission to completion. With callbacks the POST returns at
+    once and no connection is held while the code runs; otherwise this is
+    the plain wait=true request. Raises Judge0RequestError on a rejected POST.
+    """
+    wait = "false" if judge0_callbacks.enabled else "true"
+    if judge0_callbacks.enabled:
+        payload = {**payload, "callback_url": judge0_callbacks.callback_url}
+
+    async with session.post(
+        f"{api_url.rstrip('/')}/submissions?wait={wait}",
+        json=payload,
+        headers={"Content-Type": "application/json"},
+        timeout=judge0_client.timeout("submit") if judge0_callbacks.enabled else aiohttp.ClientTimeout(total=timeout)
+    ) as response:
+        if response.status not in [200, 201]:
+            raise Judge0RequestError(response.status, await response.text())
+        result = await response.json()
+
+    if not judge0_callbacks.enabled:
+        return result
+    return await wait_for_submission(session, api_url, result["token"], timeout)
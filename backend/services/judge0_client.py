@@ -0,0 +1,122 @@
+"""
+Judge0 Client
+One app-lifetime aiohttp session (and connection pool) shared by run-code,
+execute and grading, with per-operation timeouts and pool metrics
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+JUDGE0_API_URL = os.getenv("JUDGE0_API_URL", "http://server:2358/")
+
+# Connection pool
+JUDGE0_POOL_SIZE = int(os.getenv("JUDGE0_POOL_SIZE", "100"))
+JUDGE0_POOL_SIZE_PER_HOST = int(os.getenv("JUDGE0_POOL_SIZE_PER_HOST", "0"))  # 0 = same as pool size
+JUDGE0_KEEPALIVE_SECONDS = float(os.getenv("JUDGE0_KEEPALIVE_SECONDS", "30"))
+JUDGE0_DNS_CACHE_SECONDS = int(os.getenv("JUDGE0_DNS_CACHE_SECONDS", "300"))
+
+# Per-operation timeouts (seconds)
+JUDGE0_CONNECT_TIMEOUT = float(os.getenv("JUDGE0_CONNECT_TIMEOUT", "5"))
+JUDGE0_TIMEOUTS = {
+    "submit": float(os.getenv("JUDGE0_SUBMIT_TIMEOUT", "30")),  # create submission(s)
+    "wait": float(os.getenv("JUDGE0_WAIT_TIMEOUT", "30")),      # wait=true, blocks while the code runs
+    "poll": float(os.getenv("JUDGE0_POLL_REQUEST_TIMEOUT", "15")),  # fetch submission status
+    "workers": float(os.getenv("JUDGE0_WORKERS_TIMEOUT", "5")),  # queue depth probe
+}
+
+
+class Judge0Client:
+    """Lazily created shared session; close() once at shutdown"""
+
+    def __init__(self, api_url: str = JUDGE0_API_URL):
+        self.api_url = api_url
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._lock = asyncio.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.pool_waits = 0  # requests that queued for a free connection
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=JUDGE0_POOL_SIZE,
+            limit_per_host=JUDGE0_POOL_SIZE_PER_HOST,
+            keepalive_timeout=JUDGE0_KEEPALIVE_SECONDS,
+            ttl_dns_cache=JUDGE0_DNS_CACHE_SECONDS,
+            use_dns_cache=True,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=self.timeout("submit"),
+            trace_configs=[self._trace_config()],
+        )
+
+    def timeout(self, operation: str) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=JUDGE0_TIMEOUTS[operation], connect=JUDGE0_CONNECT_TIMEOUT)
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self.requests += 1
+            self.in_flight += 1
+
+        async def on_request_end(session, ctx, params):
+            self.in_flight -= 1
+
+        async def on_request_exception(session, ctx, params):
+            self.in_flight -= 1
+            self.errors += 1
+
+        async def on_connection_create_end(session, ctx, params):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, ctx, params):
+            self.connections_reused += 1
+
+        async def on_connection_queued_start(session, ctx, params):
+            self.pool_waits += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_connection_queued_start.append(on_connection_queued_start)
+        return trace
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def stats(self) -> Dict[str, Any]:
+        connections = self.connections_created + self.connections_reused
+        return {
+            "pool_size": JUDGE0_POOL_SIZE,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "errors": self.errors,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_rate": round(self.connections_reused / connections, 3) if connections else 0.0,
+            "pool_waits": self.pool_waits,
+        }
+
+
+# Global client shared by every Judge0 caller in this process
+judge0_client = Judge0Client()
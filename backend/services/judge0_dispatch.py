@@ -0,0 +1,156 @@
+"""
+Judge0 Dispatch
+Priority lanes in front of Judge0: interactive runs (run-code, execute) and
+bulk grading share a budget of Judge0 executions in flight. Part of it is
+reserved for interactive runs, which are also admitted before any waiting
+bulk work, so a student's run never queues behind an exam being graded;
+grading fills whatever is left. Slots are held per Judge0 request (one
+run, one packed submission or one batch chunk) for as long as it is in
+Judge0, so a submission with many tests takes at most a batch's worth at a
+time and concurrent gradings share the lane. Per-lane queue depth and wait
+times are kept for the stats endpoint.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+
+# Judge0 executions this process keeps in flight (roughly Judge0's worker
+# slots); 0 = no limit, lanes only record stats
+JUDGE0_DISPATCH_CAPACITY = int(os.getenv("JUDGE0_DISPATCH_CAPACITY", "32"))
+# Slots bulk grading never takes
+JUDGE0_INTERACTIVE_RESERVED = int(os.getenv("JUDGE0_INTERACTIVE_RESERVED", "4"))
+# Queue wait each lane should stay under (reported as over_target)
+JUDGE0_INTERACTIVE_TARGET_MS = float(os.getenv("JUDGE0_INTERACTIVE_TARGET_MS", "200"))
+JUDGE0_BULK_TARGET_MS = float(os.getenv("JUDGE0_BULK_TARGET_MS", "30000"))
+
+
+class Lane:
+    """Counters for one lane; all changes happen under the dispatcher's condition"""
+
+    def __init__(self, name: str, limit: Optional[int], target_ms: float, window: int = 200):
+        self.name = name
+        self.limit = limit  # max slots this lane may hold, None = whole capacity
+        self.target_ms = target_ms
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.over_target = 0
+        self.max_wait_ms = 0.0
+        self._waits = deque(maxlen=window)  # recent queue waits (ms)
+
+    def record_wait(self, wait_ms: float):
+        self.admitted += 1
+        self._waits.append(wait_ms)
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        if wait_ms > self.target_ms:
+            self.over_target += 1
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "limit": self.limit,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "admitted": self.admitted,
+            "target_wait_ms": self.target_ms,
+            "wait_ms_p50": round(waits[len(waits) // 2], 1) if waits else None,
+            "wait_ms_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 1) if waits else None,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+            "over_target": self.over_target,
+        }
+
+
+class Judge0Dispatcher:
+    """
+    Weighted slots per Judge0 execution. Interactive requests take any free
+    slot; bulk ones only while no interactive request waits and the bulk
+    lane stays outside the reserved share.
+    """
+
+    def __init__(
+        self,
+        capacity: int = JUDGE0_DISPATCH_CAPACITY,
+        interactive_reserved: int = JUDGE0_INTERACTIVE_RESERVED,
+        interactive_target_ms: float = JUDGE0_INTERACTIVE_TARGET_MS,
+        bulk_target_ms: float = JUDGE0_BULK_TARGET_MS,
+    ):
+        self.capacity = max(0, capacity)
+        reserved = min(max(0, interactive_reserved), self.capacity - 1) if self.capacity else 0
+        self.lanes = {
+            LANE_INTERACTIVE: Lane(LANE_INTERACTIVE, self.capacity or None, interactive_target_ms),
+            LANE_BULK: Lane(LANE_BULK, (self.capacity - reserved) or None, bulk_target_ms),
+        }
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+
+    def _lane(self, name: str) -> Lane:
+        if name not in self.lanes:
+            raise ValueError(f"Unknown Judge0 lane {name!r}")
+        return self.lanes[name]
+
+    def weight_for(self, lane: str, executions: int) -> int:
+        """Slots for a request running `executions` Judge0 submissions at once"""
+        limit = self._lane(lane).limit
+        # A batch larger than the lane still runs, alone
+        return max(1, min(executions, limit)) if limit else max(1, executions)
+
+    def _can_admit(self, lane: Lane, weight: int) -> bool:
+        if not self.capacity:
+            return True
+        if self._in_flight + weight > self.capacity:
+            return False
+        if lane.name == LANE_BULK:
+            return self.lanes[LANE_INTERACTIVE].waiting == 0 and lane.in_flight + weight <= lane.limit
+        return True
+
+    async def acquire(self, lane: str, weight: int = 1):
+        queue = self._lane(lane)
+        started = time.perf_counter()
+        async with self._cond:
+            queue.waiting += 1
+            try:
+                await self._cond.wait_for(lambda: self._can_admit(queue, weight))
+            finally:
+                queue.waiting -= 1
+                # Bulk requests may have been held back by this one
+                self._cond.notify_all()
+            self._in_flight += weight
+            queue.in_flight += weight
+            queue.record_wait((time.perf_counter() - started) * 1000)
+
+    async def release(self, lane: str, weight: int = 1):
+        queue = self._lane(lane)
+        async with self._cond:
+            self._in_flight -= weight
+            queue.in_flight -= weight
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, lane: str, executions: int = 1):
+        """Hold slots for `executions` concurrent Judge0 runs in `lane`"""
+        weight = self.weight_for(lane, executions)
+        await self.acquire(lane, weight)
+        try:
+            yield
+        finally:
+            await self.release(lane, weight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity or None,
+            "in_flight": self._in_flight,
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()},
+        }
+
+
+# Global dispatcher for this process's Judge0 traffic
+judge0_dispatcher = Judge0Dispatcher()
@@ -0,0 +1,531 @@
+"""
+Local Sandbox
+Runs Python submissions on this host from a warm pool of pre-forked
+interpreters: each worker has already started up and imported the usual
+stdlib modules, and waits for exactly one job. Results have the same shape
+as a Judge0 submission.
+
+Each job runs in fresh user, PID, mount and network namespaces: the code
+sees a read-only root with only the Python installation and system
+libraries bind-mounted (pivot_root, old root detached), has no network, no
+capabilities and the usual rlimits. Exit status and resource usage are
+collected by the trusted parent processes, never reported by the code
+itself. If any of that can't be set up (e.g. no unprivileged user
+namespaces under the container's seccomp profile) the sandbox refuses to
+run anything and callers fall back to Judge0.
+
+Meant for low-latency Python labs, CI and benchmarking; keep exam grading
+on Judge0 unless the host is itself disposable.
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from .executors import Executor
+from .packed_execution import outputs_match
+
+logger = logging.getLogger(__name__)
+
+LOCAL_SANDBOX_POOL_SIZE = int(os.getenv("LOCAL_SANDBOX_POOL_SIZE", "4"))
+LOCAL_SANDBOX_MAX_CONCURRENCY = int(os.getenv("LOCAL_SANDBOX_MAX_CONCURRENCY", str(os.cpu_count() or 2)))
+LOCAL_SANDBOX_PYTHON = os.getenv("LOCAL_SANDBOX_PYTHON", sys.executable)
+# Unprivileged uid/gid to run code as when the API runs as root (nobody)
+LOCAL_SANDBOX_UID = int(os.getenv("LOCAL_SANDBOX_UID", "65534"))
+LOCAL_SANDBOX_GID = int(os.getenv("LOCAL_SANDBOX_GID", "65534"))
+# Largest stdout/stderr read back, in bytes
+LOCAL_SANDBOX_MAX_OUTPUT = 1024 * 1024
+
+# Same meaning and units as the Judge0 fields (seconds, KB)
+LOCAL_SANDBOX_DEFAULT_LIMITS = {
+    "cpu_time_limit": 5,
+    "wall_time_limit": 10,
+    "memory_limit": 128000,
+    "max_processes_and_or_threads": 60,
+    "max_file_size": 1024,
+}
+
+PYTHON_LANGUAGE_ID = 71
+
+# Host paths the sandboxed code must not be able to read (checked before first use)
+SANDBOX_PROBE_PATHS = [
+    os.path.abspath(os.getenv("PRIVATE_KEY_PATH", "secrets/private.pem")),
+    os.path.abspath(".env"),
+    os.getcwd(),
+]
+
+# Runs in the pre-forked interpreter (the supervisor). Reads one JSON job
+# line, then forks the namespace init, which sets up the sandbox and forks
+# the process that runs the code. Only the supervisor holds the pipe back
+# to the API; the code's process has nothing but its stdin/stdout/stderr files.
+WORKER_SOURCE = r'''
+import ctypes, json, math, os, platform, resource, sys, sysconfig, time, traceback
+import bisect, collections, functools, heapq, itertools, re, string  # warm imports
+
+CLONE_NEWNS, CLONE_NEWUSER, CLONE_NEWPID, CLONE_NEWNET = 0x00020000, 0x10000000, 0x20000000, 0x40000000
+MS_RDONLY, MS_NOSUID, MS_NODEV, MS_NOEXEC, MS_REMOUNT, MS_BIND, MS_REC, MS_PRIVATE = 1, 2, 4, 8, 32, 4096, 16384, 1 << 18
+MS_NOATIME, MS_NODIRATIME, MS_RELATIME = 1024, 2048, 1 << 21
+MNT_DETACH = 2
+PR_SET_PDEATHSIG, PR_SET_DUMPABLE, PR_SET_NO_NEW_PRIVS = 1, 4, 38
+SYSCALLS = {"x86_64": {"pivot_root": 155, "capset": 126}, "aarch64": {"pivot_root": 41, "capset": 91}}
+# statvfs flag -> mount flag, to keep locked flags when remounting read-only
+ST_TO_MS = ((2, MS_NOSUID), (4, MS_NODEV), (8, MS_NOEXEC), (1024, MS_NOATIME), (2048, MS_NODIRATIME), (4096, MS_RELATIME))
+
+libc = ctypes.CDLL(None, use_errno=True)
+# Real root drops to the sandbox uid; anyone else gets an identity-mapped user namespace
+AS_ROOT = os.geteuid() == 0
+report_fd = os.dup(1)
+os.set_inheritable(report_fd, False)
+libc.prctl(PR_SET_DUMPABLE, 0, 0, 0, 0)
+job = json.loads(sys.stdin.readline())
+
+
+def check(result, what):
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def write_file(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def remount_read_only(target):
+    locked = sum(ms for st, ms in ST_TO_MS if os.statvfs(target).f_flag & st)
+    check(libc.mount(None, target.encode(), None, MS_REMOUNT | MS_BIND | MS_RDONLY | locked, None), f"remount {target}")
+
+
+def bind_read_only(source, target):
+    os.makedirs(target, exist_ok=True)
+    check(libc.mount(source.encode(), target.encode(), None, MS_BIND | MS_REC, None), f"bind {source}")
+    remount_read_only(target)
+
+
+def read_only_paths():
+    paths = {"/usr", "/lib", "/lib64", "/bin"}
+    paths.update((sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix))
+    paths.update(sysconfig.get_paths()[key] for key in ("stdlib", "platstdlib", "purelib", "platlib"))
+    paths = sorted(os.path.realpath(p) for p in paths if os.path.isdir(p))
+    # Skip paths already inside another bound path
+    return [p for i, p in enumerate(paths) if not any(p.startswith(q.rstrip("/") + "/") for q in paths[:i])]
+
+
+def enter_root(new_root):
+    """Private mounts, a read-only root with only the runtime in it, old root detached"""
+    check(libc.mount(None, b"/", None, MS_REC | MS_PRIVATE, None), "make mounts private")
+    os.mkdir(new_root, 0o755)
+    check(libc.mount(new_root.encode(), new_root.encode(), None, MS_BIND | MS_REC, None), "bind new root")
+    for path in read_only_paths():
+        bind_read_only(path, new_root + path)
+    os.chdir(new_root)
+    check(libc.syscall(SYSCALLS[platform.machine()]["pivot_root"], b".", b"."), "pivot_root")
+    check(libc.umount2(b".", MNT_DETACH), "detach old root")
+    os.chdir("/")
+    remount_read_only("/")
+
+
+def drop_privileges():
+    if AS_ROOT:
+        # Real root: become the sandbox user (clears every capability)
+        os.setgroups([])
+        os.setgid(job["gid"])
+        os.setuid(job["uid"])
+    else:
+        # Identity-mapped user namespace: clear the capabilities it granted
+        header = (ctypes.c_uint32 * 2)(0x20080522, 0)
+        data = (ctypes.c_uint32 * 6)()
+        check(libc.syscall(SYSCALLS[platform.machine()]["capset"], header, data), "drop capabilities")
+    check(libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "no_new_privs")
+
+
+def vm_size():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def run_code(source, base_vm, ready_w):
+    """The only process that runs submitted code"""
+    drop_privileges()
+    cpu = job["cpu"]
+    resource.setrlimit(resource.RLIMIT_CPU, (math.ceil(cpu), math.ceil(cpu) + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (base_vm + job["memory"], base_vm + job["memory"]))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (job["fsize"], job["fsize"]))
+    resource.setrlimit(resource.RLIMIT_NPROC, (job["nproc"], job["nproc"]))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    os.write(ready_w, b"1")
+    os.close(ready_w)
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", closefd=False)
+    exit_code = 0
+    try:
+        exec(compile(source, "main.py", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        pass
+    os._exit(exit_code & 0xFF)
+
+
+def namespace_init(status_w):
+    """PID 1 of the sandbox: set it up, run the code in a child, report how it ended"""
+    try:
+        os.close(report_fd)
+        libc.prctl(PR_SET_PDEATHSIG, 9, 0, 0, 0)
+        libc.prctl(PR_SET_DUMPABLE, 0, 0, 0, 0)
+        os.chdir(job["dir"])
+        for fd, name, flags in ((0, "stdin.txt", os.O_RDONLY),
+                                (1, "stdout.txt", os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+                                (2, "stderr.txt", os.O_WRONLY | os.O_CREAT | os.O_TRUNC)):
+            opened = os.open(name, flags, 0o600)
+            os.dup2(opened, fd)
+            os.close(opened)
+        base_vm = vm_size()
+        check(libc.unshare(CLONE_NEWNS | CLONE_NEWNET), "unshare mount/network namespaces")
+        enter_root(os.path.join(job["dir"], "root"))
+        source = job["source"]
+    except BaseException as e:
+        os.write(status_w, json.dumps({"error": f"sandbox setup failed: {e}"}).encode())
+        os._exit(1)
+
+    # The code's process says it is ready only after dropping privileges and
+    # setting limits; it can't write here afterwards
+    ready_r, ready_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(status_w)
+            os.close(ready_r)
+            run_code(source, base_vm, ready_w)
+        finally:
+            os._exit(1)
+    os.close(ready_w)
+    ready = os.read(ready_r, 1)
+    _, status, usage = os.wait4(pid, 0)
+    if not ready:
+        os.write(status_w, json.dumps({"error": "sandbox setup failed: could not drop privileges"}).encode())
+        os._exit(1)
+    os.write(status_w, json.dumps({
+        "exit_status": os.waitstatus_to_exitcode(status),
+        "time": usage.ru_utime + usage.ru_stime,
+        "memory": usage.ru_maxrss,
+    }).encode())
+    os._exit(0)
+
+
+def supervise():
+    uid, gid = os.geteuid(), os.getegid()
+    if AS_ROOT:
+        check(libc.unshare(CLONE_NEWPID), "unshare PID namespace")
+    else:
+        check(libc.unshare(CLONE_NEWUSER | CLONE_NEWPID), "unshare user/PID namespaces")
+        write_file("/proc/self/setgroups", "deny")
+        write_file("/proc/self/uid_map", f"{uid} {uid} 1")
+        write_file("/proc/self/gid_map", f"{gid} {gid} 1")
+    status_r, status_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(status_r)
+        namespace_init(status_w)
+    os.close(status_w)
+    chunks = []
+    while True:
+        chunk = os.read(status_r, 65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.waitpid(pid, 0)
+    try:
+        return json.loads(b"".join(chunks) or b"{}") or {"error": "sandbox exited without a result"}
+    except ValueError:
+        return {"error": "sandbox returned an unreadable result"}
+
+
+try:
+    outcome = supervise()
+except BaseException as e:
+    outcome = {"error": f"sandbox setup failed: {e}"}
+os.write(report_fd, json.dumps(outcome).encode())
+os._exit(0)
+'''
+
+# Judge0 status ids and descriptions for the outcomes we can tell apart
+STATUS_DESCRIPTIONS = {
+    3: "Accepted",
+    4: "Wrong Answer",
+    5: "Time Limit Exceeded",
+    7: "Runtime Error (SIGSEGV)",
+    8: "Runtime Error (SIGXFSZ)",
+    9: "Runtime Error (SIGFPE)",
+    10: "Runtime Error (SIGABRT)",
+    11: "Runtime Error (NZEC)",
+    12: "Runtime Error (Other)",
+    13: "Internal Error",
+}
+SIGNAL_STATUSES = {
+    signal.SIGSEGV: 7,
+    signal.SIGXFSZ: 8,
+    signal.SIGFPE: 9,
+    signal.SIGABRT: 10,
+}
+
+
+class SandboxUnavailable(RuntimeError):
+    """The sandbox could not be isolated on this host; nothing was run"""
+
+
+def _isolation_probe(paths: List[str]) -> str:
+    """Source that prints "isolated" only if none of paths is readable and there is no network"""
+    return (
+        "import os, socket\n"
+        "exposed = []\n"
+        f"for path in {paths!r}:\n"
+        "    try:\n"
+        "        os.listdir(path) if os.path.isdir(path) else open(path, 'rb').close()\n"
+        "        exposed.append(path)\n"
+        "    except OSError:\n"
+        "        pass\n"
+        "try:\n"
+        "    socket.create_connection(('1.1.1.1', 53), timeout=1).close()\n"
+        "    exposed.append('network')\n"
+        "except OSError:\n"
+        "    pass\n"
+        "print('exposed: ' + ', '.join(exposed) if exposed else 'isolated')\n"
+    )
+
+
+class LocalPythonSandbox(Executor):
+    """Python on this host, from pre-forked workers"""
+
+    name = "local"
+
+    def __init__(
+        self,
+        pool_size: int = LOCAL_SANDBOX_POOL_SIZE,
+        max_concurrency: int = LOCAL_SANDBOX_MAX_CONCURRENCY,
+        python: str = LOCAL_SANDBOX_PYTHON,
+    ):
+        self.pool_size = max(0, pool_size)
+        self.python = python
+        self._slots = asyncio.Semaphore(max(1, max_concurrency))
+        self._idle: "asyncio.Queue[asyncio.subprocess.Process]" = asyncio.Queue()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.runs = 0
+        self.spawned = 0
+        self.cold_starts = 0  # runs that found no warm worker
+        # None until the isolation probe ran; False = refused, callers use Judge0
+        self.isolated: Optional[bool] = None
+        self.isolation_error: Optional[str] = None
+        self._verify_lock = asyncio.Lock()
+
+    def supports(self, language_id: int) -> bool:
+        return language_id == PYTHON_LANGUAGE_ID and self.isolated is not False
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        self.spawned += 1
+        return await asyncio.create_subprocess_exec(
+            self.python, "-I", "-c", WORKER_SOURCE,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            # Nothing from the API's environment (database URL, secrets)
+            env={"PATH": "/usr/local/bin:/usr/bin:/bin", "LANG": "C.UTF-8"},
+            start_new_session=True,
+        )
+
+    async def _refill(self):
+        try:
+            while not self._closed and self._idle.qsize() < self.pool_size:
+                await self._idle.put(await self._spawn())
+        except Exception as e:
+            logger.warning(f"Could not pre-fork sandbox worker: {e}")
+
+    def _schedule_refill(self):
+        if not self._closed and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def warm_up(self):
+        """Fill the pool and check the isolation now instead of on first use"""
+        self._schedule_refill()
+        await self._refill_task
+        await self.verify_isolation()
+
+    async def verify_isolation(self) -> bool:
+        """
+        Run a probe in the sandbox once: it must start, have no network and
+        be unable to read SANDBOX_PROBE_PATHS. Otherwise the sandbox stays
+        refused for the life of the process.
+        """
+        async with self._verify_lock:
+            if self.isolated is None:
+                result = await self._run(_isolation_probe(SANDBOX_PROBE_PATHS), "", None, {})
+                output = (result.get("stdout") or "").strip()
+                self.isolated = result["status"]["id"] == 3 and output == "isolated"
+                if not self.isolated:
+                    self.isolation_error = result.get("error") or output or result["status"]["description"]
+                    logger.error(
+                        f"Local sandbox refused, using Judge0 instead: {self.isolation_error}"
+                    )
+        return self.isolated
+
+    async def _acquire(self) -> asyncio.subprocess.Process:
+        while not self._idle.empty():
+            process = self._idle.get_nowait()
+            if process.returncode is None:
+                self._schedule_refill()
+                return process
+        self.cold_starts += 1
+        self._schedule_refill()
+        return await self._spawn()
+
+    async def execute(
+        self,
+        source_code: str,
+        language_id: int,
+        stdin: str = "",
+        expected_output: Optional[str] = None,
+        limits: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Run once; Judge0-shaped result (status, stdout, stderr, time, memory)"""
+        if language_id != PYTHON_LANGUAGE_ID:
+            raise ValueError(f"Local sandbox cannot run language {language_id}")
+        if not await self.verify_isolation():
+            raise SandboxUnavailable(self.isolation_error)
+        return await self._run(source_code, stdin, expected_output, limits)
+
+    async def _run(
+        self,
+        source_code: str,
+        stdin: str,
+        expected_output: Optional[str],
+        limits: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        limits = {**LOCAL_SANDBOX_DEFAULT_LIMITS, **(limits or {})}
+        cpu_time_limit = float(limits["cpu_time_limit"])
+        wall_time_limit = float(limits.get("wall_time_limit") or cpu_time_limit * 2)
+
+        async with self._slots:
+            self.runs += 1
+            work_dir = tempfile.mkdtemp(prefix="sandbox-")
+            try:
+                with open(os.path.join(work_dir, "stdin.txt"), "w") as f:
+                    f.write(stdin or "")
+                job = {
+                    "dir": work_dir,
+                    "source": source_code,
+                    "cpu": cpu_time_limit,
+                    "memory": int(limits["memory_limit"]) * 1024,
+                    "fsize": int(limits["max_file_size"]) * 1024,
+                    "nproc": int(limits["max_processes_and_or_threads"]),
+                    "uid": LOCAL_SANDBOX_UID,
+                    "gid": LOCAL_SANDBOX_GID,
+                }
+                process = await self._acquire()
+                timed_out = False
+                try:
+                    report_raw, _ = await asyncio.wait_for(
+                        process.communicate(json.dumps(job).encode() + b"\n"), timeout=wall_time_limit
+                    )
+                except asyncio.TimeoutError:
+                    timed_out = True
+                    report_raw = b""
+                    # The worker leads its own session; its sandbox dies with it (PDEATHSIG, PID namespace)
+                    with contextlib.suppress(ProcessLookupError):
+                        os.killpg(process.pid, signal.SIGKILL)
+                    await process.wait()
+
+                stdout = self._read_output(work_dir, "stdout.txt")
+                stderr = self._read_output(work_dir, "stderr.txt")
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        try:
+            report = json.loads(report_raw.decode() or "{}")
+        except ValueError:
+            report = {"error": "sandbox returned an unreadable result"}
+        if not timed_out and (report.get("error") or "exit_status" not in report):
+            error = report.get("error") or "sandbox exited without a result"
+            return {
+                "token": "",
+                "stdout": "",
+                "stderr": "",
+                "compile_output": None,
+                "exit_code": None,
+                "status": {"id": 13, "description": STATUS_DESCRIPTIONS[13]},
+                "time": "0",
+                "memory": 0,
+                "error": error,
+            }
+
+        # Measured by the sandbox's init with wait4, not reported by the code
+        exit_status = report.get("exit_status")
+        cpu_time = float(report.get("time", cpu_time_limit if timed_out else 0))
+        killed_for_time = timed_out or exit_status in (-signal.SIGXCPU, -signal.SIGKILL) and cpu_time >= cpu_time_limit
+
+        if killed_for_time or cpu_time > cpu_time_limit:
+            status_id = 5
+        elif exit_status is not None and exit_status < 0:
+            status_id = SIGNAL_STATUSES.get(-exit_status, 12)
+        elif exit_status != 0:
+            status_id = 11
+        elif expected_output is None or outputs_match(stdout, expected_output):
+            status_id = 3
+        else:
+            status_id = 4
+
+        return {
+            "token": "",
+            "stdout": stdout,
+            "stderr": stderr,
+            "compile_output": None,
+            "exit_code": exit_status,
+            "status": {"id": status_id, "description": STATUS_DESCRIPTIONS[status_id]},
+            "time": f"{cpu_time:.3f}",
+            "memory": report.get("memory", 0),
+        }
+
+    def _read_output(self, work_dir: str, name: str) -> str:
+        try:
+            with open(os.path.join(work_dir, name), "rb") as f:
+                return f.read(LOCAL_SANDBOX_MAX_OUTPUT).decode("utf-8", errors="replace")
+        except OSError:
+            return ""
+
+    async def close(self):
+        self._closed = True
+        if self._refill_task:
+            self._refill_task.cancel()
+            await asyncio.gather(self._refill_task, return_exceptions=True)
+        while not self._idle.empty():
+            process = self._idle.get_nowait()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "warm_workers": self._idle.qsize(),
+            "pool_size": self.pool_size,
+            "runs": self.runs,
+            "spawned": self.spawned,
+            "cold_starts": self.cold_starts,
+        }
+
+
+# Global pool shared by run-code and grading in this process
+local_python_sandbox = LocalPythonSandbox()
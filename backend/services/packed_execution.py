@@ -0,0 +1,250 @@
+"""
+Packed Execution
+Runs all of a submission's test cases in one Judge0 sandbox. A submission and
+its test inputs go to Judge0 as one multi-file program: compiled languages
+are built once by the `compile` script and the binary is run against every
+test; questions that opt in to the multi-test harness start a fresh
+interpreter per test in the same sandbox. Each test has its own process and
+time budget, judged on CPU time like a per-test Judge0 submission. The run
+script frames each test's output, with the exit status it saw, behind a marker that comes in on the run script's stdin (Judge0
+keeps that file outside the box, and the script closes it before any test
+runs), so a program can't forge another test's frame.
+"""
+import base64
+import io
+import os
+import re
+import secrets
+import zipfile
+from typing import Any, Dict, List, Optional
+
+from .time_limits import WALL_TIME_LIMIT_FACTOR
+
+# Judge0's "Multi-file program" language
+JUDGE0_MULTI_FILE_LANGUAGE_ID = 89
+
+JUDGE0_COMPILE_ONCE_ENABLED = os.getenv("JUDGE0_COMPILE_ONCE_ENABLED", "true").lower() == "true"
+# Wall-clock budget for the whole packed run (at most MAX_WALL_TIME_LIMIT in judge0.conf).
+# Tests that don't finish inside it are re-run one submission per test.
+JUDGE0_PACKED_WALL_TIME_LIMIT = float(os.getenv("JUDGE0_PACKED_WALL_TIME_LIMIT", "20"))
+# CPU seconds each test may use inside the packed program; it is killed after
+# WALL_TIME_LIMIT_FACTOR times that in wall-clock time, as per-test submissions are
+JUDGE0_PACKED_TEST_TIME_LIMIT = float(os.getenv("JUDGE0_PACKED_TEST_TIME_LIMIT", "5"))
+JUDGE0_HARNESS_ENABLED = os.getenv("JUDGE0_HARNESS_ENABLED", "true").lower() == "true"
+# Per-test stderr kept in the framed output
+PACKED_STDERR_BYTES = 4096
+
+# Toolchains inside the Judge0 sandbox; defaults are the judge0/judge0 1.13 image
+JUDGE0_GCC_BIN = os.getenv("JUDGE0_GCC_BIN", "/usr/local/gcc-9.2.0/bin")
+JUDGE0_GCC_LIB = os.getenv("JUDGE0_GCC_LIB", "/usr/local/gcc-9.2.0/lib64")
+JUDGE0_JAVA_BIN = os.getenv("JUDGE0_JAVA_BIN", "/usr/local/openjdk13/bin")
+JUDGE0_PYTHON_BIN = os.getenv("JUDGE0_PYTHON_BIN", "/usr/local/python-3.8.1/bin/python3")
+JUDGE0_NODE_BIN = os.getenv("JUDGE0_NODE_BIN", "/usr/local/node-12.14.0/bin/node")
+
+class PackedLanguage:
+    def __init__(
+        self,
+        source_file: str,
+        compile_command: Optional[str],
+        run_command: str
+    ):
+        self.source_file = source_file
+        self.compile_command = compile_command
+        self.run_command = run_command
+
+
+COMPILED_LANGUAGES: Dict[int, PackedLanguage] = {
+    50: PackedLanguage(  # C
+        "main.c",
+        f"{JUDGE0_GCC_BIN}/gcc -O2 -std=gnu11 -o main main.c -lm",
+        f"env LD_LIBRARY_PATH={JUDGE0_GCC_LIB} ./main",
+    ),
+    54: PackedLanguage(  # C++
+        "main.cpp",
+        f"{JUDGE0_GCC_BIN}/g++ -O2 -std=gnu++17 -o main main.cpp",
+        f"env LD_LIBRARY_PATH={JUDGE0_GCC_LIB} ./main",
+    ),
+    62: PackedLanguage(  # Java: like Judge0's own Java, the class must be Main
+        "Main.java",
+        f"{JUDGE0_JAVA_BIN}/javac Main.java",
+        f"{JUDGE0_JAVA_BIN}/java Main",
+    ),
+}
+
+# Multi-test harness, for questions with small inputs where sandbox startup
+# dominates (Question.extra_data["multi_test_harness"])
+HARNESS_LANGUAGES: Dict[int, PackedLanguage] = {
+    # One interpreter per test: nothing a test leaves behind reaches the next
+    71: PackedLanguage("main.py", None, f"{JUDGE0_PYTHON_BIN} main.py"),  # Python 3
+    63: PackedLanguage("main.js", None, f"{JUDGE0_NODE_BIN} main.js"),  # JavaScript
+}
+
+def supports_compile_once(language_id: int) -> bool:
+    return JUDGE0_COMPILE_ONCE_ENABLED and language_id in COMPILED_LANGUAGES
+
+
+def packed_language_for(language_id: int, use_harness: bool = False) -> Optional[PackedLanguage]:
+    """How to pack this submission into one sandbox run, or None to run per test"""
+    if supports_compile_once(language_id):
+        return COMPILED_LANGUAGES[language_id]
+    if use_harness and JUDGE0_HARNESS_ENABLED:
+        return HARNESS_LANGUAGES.get(language_id)
+    return None
+
+
+def new_boundary() -> str:
+    """
+    Random frame marker. It is sent as the packed submission's stdin, never
+    in the archive, so programs under test can't read it.
+    """
+    return f"@@AEGIS-{secrets.token_hex(8)}@@"
+
+
+def packed_wall_time_limit(test_time_limit: float) -> float:
+    """Wall-clock seconds after which a test of a packed run is killed"""
+    return test_time_limit * WALL_TIME_LIMIT_FACTOR
+
+
+def build_run_script(
+    language: PackedLanguage, test_time_limit: float, max_consecutive_timeouts: int = 0
+) -> str:
+    """
+    Runs every test with its output in files, then prints one frame per test:
+    the exit status, CPU time and wall-clock time as seen by this script,
+    and the test's stdout and stderr base64-encoded so they can't contain a
+    frame line. CPU time is the test's user + system time from the shell's
+    `times` (its whole process tree, JIT and GC threads included), which is
+    what Judge0 limits for a per-test submission; interpreter or JVM startup
+    counts only for the CPU it burns, not for time spent waiting. A test
+    timed out when either clock reached its limit, whatever it exited with.
+    Stops after max_consecutive_timeouts time-outs in a row (0 = never).
+    """
+    limit_ms = int(test_time_limit * 1000)
+    wall_limit = packed_wall_time_limit(test_time_limit)
+    wall_limit_ms = int(wall_limit * 1000)
+    return f"""#!/bin/bash
+export LC_ALL=C
+IFS= read -r B
+exec 0</dev/null
+# CPU milliseconds of finished child processes, into $cpu. `times` has to run
+# in this shell (a subshell starts from zero) and nothing else may run here.
+children_cpu() {{
+  times > times.txt
+  local line field
+  {{ read -r line; read -r line; }} < times.txt
+  cpu=0
+  for field in $line; do
+    [[ $field =~ ^([0-9]+)m([0-9]+)\\.([0-9]{{3}})s$ ]] || continue
+    cpu=$(( cpu + 10#${{BASH_REMATCH[1]}} * 60000 + 10#${{BASH_REMATCH[2]}} * 1000 + 10#${{BASH_REMATCH[3]}} ))
+  done
+}}
+timeouts=0
+for f in tests/*.in; do
+  n=${{f##*/}}
+  n=${{n%.in}}
+  start=$(date +%s%N)
+  children_cpu
+  cpu_start=$cpu
+  # --foreground: timeout kills and reaps the test itself, so its CPU time is counted
+  timeout -s KILL --foreground {wall_limit:g} {language.run_command} < "$f" > stdout.txt 2> stderr.txt
+  code=$?
+  children_cpu
+  end=$(date +%s%N)
+  ms=$(( cpu - cpu_start ))
+  wall=$(( (end - start) / 1000000 ))
+  printf '%s TEST %s %s %s %s\n' "$B" "$n" "$code" "$ms" "$wall"
+  base64 -w0 stdout.txt
+  printf '\n'
+  head -c {PACKED_STDERR_BYTES} stderr.txt | base64 -w0
+  printf '\n%s END %s\n' "$B" "$n"
+  if [ "$ms" -ge {limit_ms} ] || [ "$wall" -ge {wall_limit_ms} ]; then timeouts=$((timeouts + 1)); else timeouts=0; fi
+  if [ {max_consecutive_timeouts} -gt 0 ] && [ "$timeouts" -ge {max_consecutive_timeouts} ]; then break; fi
+done
+"""
+
+
+def build_additional_files(
+    language: PackedLanguage,
+    source_code: str,
+    stdin_list: List[str],
+    test_time_limit: float = JUDGE0_PACKED_TEST_TIME_LIMIT,
+    max_consecutive_timeouts: int = 0,
+) -> str:
+    """Base64 zip for Judge0's additional_files: source, compile/run scripts, tests"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(language.source_file, source_code)
+        if language.compile_command:
+            archive.writestr("compile", f"#!/bin/bash\n{language.compile_command}\n")
+        archive.writestr("run", build_run_script(language, test_time_limit, max_consecutive_timeouts))
+        for index, stdin_data in enumerate(stdin_list):
+            archive.writestr(f"tests/{index:05d}.in", stdin_data)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def _decode(data: str) -> str:
+    return base64.b64decode(data, validate=True).decode("utf-8", errors="replace")
+
+
+def parse_packed_output(stdout: Optional[str], boundary: str) -> Dict[int, Dict[str, Any]]:
+    """
+    Split framed output into
+    {test index: {"stdout", "stderr", "exit_code", "time_ms", "wall_ms"}},
+    time_ms being CPU time.
+    Tests without exactly one well-formed frame (run cut short, or output
+    that got into the run script's own stdout) are left out, to be re-run
+    on their own.
+    """
+    if not stdout:
+        return {}
+    marker = re.escape(boundary)
+    frame = re.compile(
+        rf"^{marker} TEST (\d+) (-?\d+) (\d+) (\d+)\n([A-Za-z0-9+/=]*)\n([A-Za-z0-9+/=]*)\n{marker} END \1$",
+        re.MULTILINE,
+    )
+    parsed = {}
+    repeated = set()
+    for match in frame.finditer(stdout):
+        index, code, cpu_ms, wall_ms, out, err = match.groups()
+        index = int(index)
+        if index in parsed:
+            repeated.add(index)
+            continue
+        try:
+            parsed[index] = {
+                "stdout": _decode(out),
+                "stderr": _decode(err),
+                "exit_code": int(code),
+                "time_ms": int(cpu_ms),
+                "wall_ms": int(wall_ms),
+            }
+        except ValueError:
+            repeated.add(index)
+    for index in repeated:
+        parsed.pop(index, None)
+    return parsed
+
+
+def outputs_match(actual: str, expected: str) -> bool:
+    """Same leniency as Judge0's own check: surrounding whitespace is ignored"""
+    return (actual or "").replace("\r\n", "\n").strip() == (expected or "").replace("\r\n", "\n").strip()
+
+
+def judge_packed_test(run: Dict[str, Any], expected: str, test_time_limit: float) -> Dict[str, Any]:
+    """
+    Judge0-style status for one test of a packed run. Time-outs come from the
+    run script's CPU and wall-clock measurements, not the exit code: a
+    program can exit 124 itself, but can't make the script's clocks run slow.
+    """
+    if (
+        run["time_ms"] >= int(test_time_limit * 1000)
+        or run["wall_ms"] >= int(packed_wall_time_limit(test_time_limit) * 1000)
+    ):
+        status_id, status = 5, "Time Limit Exceeded"
+    elif run["exit_code"] != 0:
+        status_id, status = 11, "Runtime Error (NZEC)"
+    elif outputs_match(run["stdout"], expected):
+        status_id, status = 3, "Accepted"
+    else:
+        status_id, status = 4, "Wrong Answer"
+    return {"status_id": status_id, "status": status, "time": f"{run['time_ms'] / 1000:.3f}"}
@@ -0,0 +1,70 @@
+"""
+Preflight
+Cheap local checks run before code is sent to an executor, so obviously
+broken submissions are rejected as compilation errors without using a
+sandbox. Checks are registered per Judge0 language id and get the name of
+the executor that will run the code (its toolchain decides what is valid);
+languages without one go straight to the executor.
+"""
+import ast
+import logging
+import os
+import traceback
+from typing import Callable, Dict, Optional, Tuple
+
+from .executors import JUDGE0
+
+logger = logging.getLogger(__name__)
+
+PREFLIGHT_ENABLED = os.getenv("PREFLIGHT_ENABLED", "true").lower() == "true"
+# Grammar the Judge0 interpreter accepts (Python 3.8.1 in judge0/judge0 1.13),
+# so newer syntax is rejected here too instead of failing on every test.
+# Code for the local sandbox is checked against this interpreter's grammar.
+PREFLIGHT_PYTHON_VERSION = tuple(
+    int(part) for part in os.getenv("PREFLIGHT_PYTHON_VERSION", "3.8").split(".")[:2]
+)
+
+# language id -> check(source, executor) returning an error message, or None if it looks fine
+PreflightCheck = Callable[[str, str], Optional[str]]
+PREFLIGHT_CHECKS: Dict[int, PreflightCheck] = {}
+
+
+def register_preflight(*language_ids: int):
+    """Decorator registering a check for one or more Judge0 language ids"""
+    def decorator(check: PreflightCheck) -> PreflightCheck:
+        for language_id in language_ids:
+            PREFLIGHT_CHECKS[language_id] = check
+        return check
+    return decorator
+
+
+@register_preflight(71)  # Python 3
+def check_python_syntax(source_code: str, executor: str) -> Optional[str]:
+    """Parse and compile without running anything; the message mimics the interpreter's"""
+    feature_version = PREFLIGHT_PYTHON_VERSION if executor == JUDGE0 else None
+    try:
+        tree = ast.parse(source_code, filename="main.py", feature_version=feature_version)
+        # Catches what the parser alone allows, e.g. `return` outside a function
+        compile(tree, "main.py", "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        # ValueError: source contains null bytes
+        return "".join(traceback.format_exception_only(type(e), e)).rstrip()
+    return None
+
+
+def run_preflight(source_code: str, language_id: int, executor: str = JUDGE0) -> Tuple[bool, Optional[str]]:
+    """
+    (ok, error message) for code about to run on `executor` (see
+    executors.get_executor). A check that itself crashes lets the code through.
+    """
+    if not PREFLIGHT_ENABLED:
+        return True, None
+    check = PREFLIGHT_CHECKS.get(language_id)
+    if check is None:
+        return True, None
+    try:
+        error = check(source_code, executor)
+    except Exception as e:
+        logger.warning(f"Preflight check for language {language_id} failed: {e}")
+        return True, None
+    return error is None, error
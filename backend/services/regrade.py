@@ -0,0 +1,193 @@
+"""
+Regrade
+Incremental re-grading after test cases change. Every SubmissionResult
+records the fingerprint of the test cases it was graded against (whole set
+and per test); a re-grade re-runs only the tests whose input or expected
+output changed, merges them into the stored test_results and recomputes
+the score in place.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .grading_store import GRADING_ENQUEUE_CHUNK_SIZE, load_exam_submission_question_ids, load_test_cases
+from .result_cache import fingerprint_test_cases
+
+logger = logging.getLogger(__name__)
+
+# GradingJob.extra_data["mode"] for re-grade jobs; their tasks go to regrade_submission
+JOB_MODE_REGRADE = "regrade"
+# SubmissionResult.extra_data key holding the fingerprint of the whole test set
+FINGERPRINT_KEY = "test_case_fingerprint"
+
+# LeetCode-style status codes (see LeetCodeAPI.build_leetcode_response)
+STATUS_CODE_ACCEPTED = 10
+STATUS_CODE_WRONG_ANSWER = 11
+STATUS_CODES = {
+    10: "accepted",
+    11: "wrong_answer",
+    20: "compilation_error",
+    99: "internal_error",
+}
+
+
+def test_case_fingerprint(test_case: Dict[str, Any]) -> str:
+    """Fingerprint of one test case's input and expected output (weights don't need a re-run)"""
+    return fingerprint_test_cases([(test_case.get("input_data"), test_case.get("expected_output"))])
+
+
+def test_set_fingerprint(test_cases: List[Dict[str, Any]]) -> str:
+    return fingerprint_test_cases((tc.get("input_data"), tc.get("expected_output")) for tc in test_cases)
+
+
+def detail_fingerprint(detail: Dict[str, Any]) -> str:
+    # Results stored before fingerprints were recorded still carry input/expected
+    return detail.get("fingerprint") or fingerprint_test_cases([(detail.get("input"), detail.get("expected"))])
+
+
+def plan_regrade(stored_result: Dict[str, Any], test_cases: List[Dict[str, Any]]) -> Optional[List[int]]:
+    """
+    Indexes (into test_cases) of the tests to re-run, or None when only a
+    full re-grade gives a correct result: nothing usable stored, or the
+    stored run stopped early / failed to compile, so the untouched tests
+    never produced a verdict of their own.
+    """
+    test_results = stored_result.get("test_results") or {}
+    details = test_results.get("details")
+    if not isinstance(details, list) or test_results.get("error"):
+        return None
+    if test_results.get("status_code") not in (STATUS_CODE_ACCEPTED, STATUS_CODE_WRONG_ANSWER):
+        return None
+    if any(detail.get("skipped") for detail in details):
+        return None
+
+    stored = {detail.get("test_case_id"): detail_fingerprint(detail) for detail in details}
+    return [
+        index for index, tc in enumerate(test_cases)
+        if stored.get(tc["id"]) != test_case_fingerprint(tc)
+    ]
+
+
+def merge_details(
+    stored_result: Dict[str, Any],
+    test_cases: List[Dict[str, Any]],
+    rerun: List[int],
+    new_details: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """Details in current test case order: re-run tests from new_details, the rest as stored"""
+    stored = {detail.get("test_case_id"): detail for detail in stored_result["test_results"]["details"]}
+    fresh = dict(zip(rerun, new_details))
+    merged = []
+    for index, tc in enumerate(test_cases):
+        if index in fresh:
+            merged.append(fresh[index])
+        else:
+            # Weight may have changed without needing a run
+            merged.append({**stored[tc["id"]], "weight": tc.get("weight", 1), "fingerprint": test_case_fingerprint(tc)})
+    return merged
+
+
+def score_details(details: List[Dict[str, Any]], test_cases: List[Dict[str, Any]], status_code: int) -> Dict[str, Any]:
+    """Same proportional scoring as SubmissionProcessor.calculate_score"""
+    total_weight = sum(tc.get("weight", 1) for tc in test_cases)
+    passed = sum(1 for detail in details if detail.get("passed"))
+    if status_code in (STATUS_CODE_ACCEPTED, STATUS_CODE_WRONG_ANSWER):
+        status_code = STATUS_CODE_ACCEPTED if details and passed == len(details) else STATUS_CODE_WRONG_ANSWER
+    return {
+        "score": (passed / len(details)) * total_weight if details else 0,
+        "max_score": total_weight,
+        "status_code": status_code,
+        "test_results": {
+            "total_tests": len(details),
+            "passed_tests": passed,
+            "skipped_tests": sum(1 for detail in details if detail.get("skipped")),
+            "status_code": status_code,
+            "details": details,
+        },
+    }
+
+
+def result_to_dict(result: models.SubmissionResult) -> Dict[str, Any]:
+    return {
+        "id": str(result.id),
+        "submission_id": str(result.submission_id),
+        "status": result.status.value,
+        "score": result.score,
+        "max_score": result.max_score,
+        "test_results": result.test_results or {},
+        "extra_data": result.extra_data or {},
+    }
+
+
+def load_latest_result(db: Session, submission_id: UUID) -> Optional[Dict[str, Any]]:
+    result = (
+        db.query(models.SubmissionResult)
+        .filter(models.SubmissionResult.submission_id == submission_id)
+        .order_by(models.SubmissionResult.evaluated_at.desc(), models.SubmissionResult.created_at.desc())
+        .first()
+    )
+    return result_to_dict(result) if result else None
+
+
+def load_exam_fingerprints(db: Session, exam_id: UUID, question_id: Optional[UUID] = None) -> Dict[UUID, str]:
+    """Current test set fingerprint of each question the exam has submissions for (or just question_id)"""
+    return {
+        qid: test_set_fingerprint(load_test_cases(db, qid))
+        for qid in load_exam_submission_question_ids(db, exam_id, question_id)
+    }
+
+
+def iter_stale_submission_ids(
+    db: Session,
+    exam_id: UUID,
+    fingerprints: Dict[UUID, str],
+    chunk_size: int = GRADING_ENQUEUE_CHUNK_SIZE
+) -> Iterator[List[UUID]]:
+    """
+    Graded submissions whose latest result was graded against other test
+    cases than the question has now, keyset-paginated by submission id per
+    question. Never-graded submissions are left to process-submissions.
+    """
+    result = models.SubmissionResult
+    submission = models.Submission
+    for question_id, fingerprint in fingerprints.items():
+        after = None
+        while True:
+            latest = (
+                select(result.submission_id, result.extra_data[FINGERPRINT_KEY].astext.label("fingerprint"))
+                .join(submission, submission.id == result.submission_id)
+                .where(submission.exam_id == exam_id, submission.question_id == question_id)
+                .distinct(result.submission_id)
+                .order_by(result.submission_id, result.evaluated_at.desc(), result.created_at.desc())
+            )
+            if after is not None:
+                latest = latest.where(result.submission_id > after)
+            latest = latest.subquery()
+            submission_ids = db.execute(
+                select(latest.c.submission_id)
+                .where(latest.c.fingerprint.is_distinct_from(fingerprint))
+                .order_by(latest.c.submission_id)
+                .limit(chunk_size)
+            ).scalars().all()
+            if not submission_ids:
+                break
+            yield list(submission_ids)
+            if len(submission_ids) < chunk_size:
+                break
+            after = submission_ids[-1]
+
+
+def regraded_extra_data(stored_result: Dict[str, Any], test_cases: List[Dict[str, Any]], rerun: List[int]) -> Dict[str, Any]:
+    # A failed earlier re-grade must not mark this one as failed too
+    kept = {k: v for k, v in (stored_result.get("extra_data") or {}).items() if k not in ("error", "regrade_error")}
+    return {
+        **kept,
+        FINGERPRINT_KEY: test_set_fingerprint(test_cases),
+        "regraded_at": datetime.utcnow().isoformat(),
+        "regraded_test_case_ids": [test_cases[index]["id"] for index in rerun],
+    }
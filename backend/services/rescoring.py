@@ -0,0 +1,128 @@
+"""
+Rescoring
+Recompute score/max_score of stored results after test case weights change,
+from the per-test passed flags already in test_results.details. Nothing is
+sent to Judge0; results whose tests' input or expected output changed since
+they were graded are left for a re-grade (see regrade).
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from .grading_store import GRADING_ENQUEUE_CHUNK_SIZE, load_exam_submission_question_ids, load_test_cases
+from .regrade import detail_fingerprint, score_details, test_case_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def rescore_result(test_results: Dict[str, Any], test_cases: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    score, max_score and test_results for the current weights, or None when
+    the stored details don't cover exactly the current test cases as graded
+    (tests added, removed or edited since: only a re-grade fixes those).
+    """
+    details = (test_results or {}).get("details")
+    if not isinstance(details, list) or not details or len(details) != len(test_cases):
+        return None
+    stored = {detail.get("test_case_id"): detail for detail in details}
+    if any(
+        tc["id"] not in stored or detail_fingerprint(stored[tc["id"]]) != test_case_fingerprint(tc)
+        for tc in test_cases
+    ):
+        return None
+
+    rescored = [{**stored[tc["id"]], "weight": tc.get("weight", 1)} for tc in test_cases]
+    score_data = score_details(rescored, test_cases, test_results.get("status_code", 99))
+    return {
+        "score": int(score_data["score"]),
+        "max_score": int(score_data["max_score"]),
+        # Keep anything else stored alongside the details (e.g. error)
+        "test_results": {**test_results, **score_data["test_results"]},
+    }
+
+
+def load_exam_test_cases(db: Session, exam_id: UUID, question_id: Optional[UUID] = None) -> Dict[UUID, List[Dict[str, Any]]]:
+    """Current test cases of each question the exam has submissions for (or just question_id)"""
+    return {
+        qid: load_test_cases(db, qid)
+        for qid in load_exam_submission_question_ids(db, exam_id, question_id)
+    }
+
+
+def rescore_exam_results(
+    db: Session,
+    exam_id: UUID,
+    question_id: Optional[UUID] = None,
+    chunk_size: int = GRADING_ENQUEUE_CHUNK_SIZE
+) -> Dict[str, Any]:
+    """
+    Rescore every stored result of the exam's submissions (or one question's)
+    in keyset pages of chunk_size, one bulk UPDATE and commit per page. Only
+    rows whose score, max_score or weights change are written; evaluated_at
+    is left alone so the latest result per submission stays the latest.
+    """
+    started = time.perf_counter()
+    test_cases = load_exam_test_cases(db, exam_id, question_id)
+    summary = {
+        "questions": len(test_cases),
+        "results": 0,
+        "rescored": 0,
+        "unchanged": 0,
+        "needs_regrade": 0,
+    }
+    result = models.SubmissionResult
+    submission = models.Submission
+    rescored_at = datetime.utcnow().isoformat()
+
+    for qid, question_test_cases in test_cases.items():
+        after = None
+        while True:
+            query = (
+                select(result.id, result.score, result.max_score, result.test_results, result.extra_data)
+                .join(submission, submission.id == result.submission_id)
+                .where(submission.exam_id == exam_id, submission.question_id == qid)
+                .order_by(result.id)
+                .limit(chunk_size)
+            )
+            if after is not None:
+                query = query.where(result.id > after)
+            rows = db.execute(query).all()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                rescored = rescore_result(row.test_results, question_test_cases)
+                if rescored is None:
+                    summary["needs_regrade"] += 1
+                elif (
+                    rescored["score"] == row.score
+                    and rescored["max_score"] == row.max_score
+                    and rescored["test_results"] == row.test_results
+                ):
+                    summary["unchanged"] += 1
+                else:
+                    updates.append({
+                        "id": row.id,
+                        **rescored,
+                        "extra_data": {**(row.extra_data or {}), "rescored_at": rescored_at},
+                    })
+            if updates:
+                db.execute(update(result), updates)
+                db.commit()
+            summary["results"] += len(rows)
+            summary["rescored"] += len(updates)
+
+            if len(rows) < chunk_size:
+                break
+            after = rows[-1].id
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Rescored exam {exam_id}: {summary}")
+    return summary
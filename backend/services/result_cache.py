@@ -0,0 +1,204 @@
+"""
+Execution Result Cache
+Content-addressed store of Judge0 grading results so identical code run
+against identical test cases and limits is only executed once, and a
+short-lived one for run-code / execute that also lets identical
+concurrent runs share one execution
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+RESULT_CACHE_SIZE = int(os.getenv("JUDGE0_RESULT_CACHE_SIZE", "2048"))
+RUN_CODE_CACHE_SIZE = int(os.getenv("RUN_CODE_CACHE_SIZE", "1024"))
+RUN_CODE_CACHE_TTL = float(os.getenv("RUN_CODE_CACHE_TTL", "30"))
+
+# Judge0 statuses that say nothing about the code (Internal Error, Exec Format Error)
+UNCACHEABLE_RUN_STATUSES = (13, 14)
+
+
+def normalize_source(source_code: str) -> str:
+    """
+    Ignore CRLF vs LF and a final newline between resubmissions; anything
+    else (trailing spaces, blank lines) can change what a program does
+    """
+    source = (source_code or "").replace("\r\n", "\n")
+    return source[:-1] if source.endswith("\n") else source
+
+
+def fingerprint_test_cases(prepared: Iterable[Tuple[str, str]]) -> str:
+    """Hash of the (stdin, expected output) pairs actually sent to Judge0"""
+    digest = hashlib.sha256()
+    for stdin_data, expected_output in prepared:
+        digest.update(json.dumps([stdin_data, expected_output]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def make_result_key(
+    source_code: str,
+    language_id: int,
+    test_cases_fingerprint: str,
+    limits: Dict[str, Any],
+) -> str:
+    payload = json.dumps(
+        [normalize_source(source_code), language_id, test_cases_fingerprint, limits],
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExecutionResultCache:
+    """Size-bounded LRU of LeetCode-style responses with hit/miss counters"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry)
+
+    def put(self, key: str, response: Dict[str, Any]):
+        if not self.enabled:
+            return
+        self._entries[key] = copy.deepcopy(response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def make_run_key(source_code: str, language_id: int, stdin: str, limits: Dict[str, Any], executor: str) -> str:
+    """Key of a single run (run-code / execute): the code, its stdin and sandbox limits"""
+    return make_result_key(source_code, language_id, fingerprint_test_cases([(stdin or "", None)]), {
+        **limits, "executor": executor
+    })
+
+
+class RunResultCache:
+    """
+    TTL + size-bounded LRU of single-run results. Identical runs that arrive
+    while one is executing wait for it instead of starting their own; its
+    error, if any, is theirs too. Errors and infrastructure failures are
+    never cached.
+    """
+
+    def __init__(self, max_entries: int = RUN_CODE_CACHE_SIZE, ttl: float = RUN_CODE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict[str, Any]):
+        if not self.enabled:
+            return
+        status_id = (result.get("status") or {}).get("id") if isinstance(result.get("status"), dict) else None
+        if status_id in UNCACHEABLE_RUN_STATUSES:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_run(self, key: str, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Cached result, the result of an identical run in flight, or run() once"""
+        if not self.enabled:
+            return await run()
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        task = self._in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            # Own task: the run outlives any one caller that gives up on it
+            task = asyncio.ensure_future(self._run(key, run))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._in_flight[key] = task
+        else:
+            self.coalesced += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _run(self, key: str, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        try:
+            result = await run()
+            self.put(key, result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
+
+
+# Global run-code / execute cache for this process
+run_result_cache = RunResultCache()
@@ -0,0 +1,231 @@
+"""
+Run Admission
+Admission control for run-code: a token bucket and at most one run in
+flight per student, a cap on runs executing at once, and a small bounded
+FIFO queue for the rest. Anything beyond that is turned away at once with
+a reason, a Retry-After and (for a student's own pending run) its queue
+position, so a few students clicking Run can't saturate Judge0.
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per student: sustained runs per minute and the burst allowed on top
+RUN_CODE_RATE_PER_MINUTE = float(os.getenv("RUN_CODE_RATE_PER_MINUTE", "12"))
+RUN_CODE_BURST = int(os.getenv("RUN_CODE_BURST", "3"))
+# Runs executing at once in this process; later ones wait in the queue
+RUN_CODE_MAX_CONCURRENT = int(os.getenv("RUN_CODE_MAX_CONCURRENT", "16"))
+RUN_CODE_MAX_QUEUE = int(os.getenv("RUN_CODE_MAX_QUEUE", "32"))
+# Longest a queued run waits for its turn before it is turned away
+RUN_CODE_QUEUE_TIMEOUT = float(os.getenv("RUN_CODE_QUEUE_TIMEOUT", "20"))
+
+REJECT_IN_PROGRESS = "run_in_progress"
+REJECT_RATE_LIMITED = "rate_limited"
+REJECT_QUEUE_FULL = "queue_full"
+REJECT_QUEUE_TIMEOUT = "queue_timeout"
+
+# Idle, full buckets are dropped once this many students are tracked
+MAX_TRACKED_STUDENTS = 10000
+
+
+class RunRejected(Exception):
+    """A run turned away by admission control; the router maps it to 429/503"""
+
+    def __init__(self, reason: str, message: str, retry_after: float, queue_position: Optional[int] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.retry_after = retry_after
+        self.queue_position = queue_position
+
+    @property
+    def status_code(self) -> int:
+        # Per-student limits are the caller's doing; a full queue is ours
+        return 429 if self.reason in (REJECT_IN_PROGRESS, REJECT_RATE_LIMITED) else 503
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "detail": self.message,
+            "reason": self.reason,
+            "retry_after": math.ceil(self.retry_after),
+            "queue_position": self.queue_position,
+        }
+
+
+class _Ticket:
+    def __init__(self, student_id: str):
+        self.student_id = student_id
+        self.future: Optional[asyncio.Future] = None  # set while queued
+        self.started = False
+        self.admitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+
+
+class _Student:
+    def __init__(self, tokens: float):
+        self.tokens = tokens
+        self.refilled_at = time.monotonic()
+        self.active: Optional[_Ticket] = None
+
+
+class RunAdmission:
+    """Event-loop confined: admit/release never await, so no lock is needed"""
+
+    def __init__(
+        self,
+        rate_per_minute: float = RUN_CODE_RATE_PER_MINUTE,
+        burst: int = RUN_CODE_BURST,
+        max_concurrent: int = RUN_CODE_MAX_CONCURRENT,
+        max_queue: int = RUN_CODE_MAX_QUEUE,
+        queue_timeout: float = RUN_CODE_QUEUE_TIMEOUT,
+    ):
+        self.rate = max(rate_per_minute, 0.01) / 60.0  # tokens per second
+        self.burst = max(1, burst)
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._students: Dict[str, _Student] = {}
+        self._queue: deque = deque()
+        self._running = 0
+        self._run_seconds: Optional[float] = None  # EWMA of run durations
+        self.rejected = {REJECT_IN_PROGRESS: 0, REJECT_RATE_LIMITED: 0, REJECT_QUEUE_FULL: 0, REJECT_QUEUE_TIMEOUT: 0}
+        self.admitted = 0
+        self.queued = 0
+
+    def _student(self, student_id: str) -> _Student:
+        state = self._students.get(student_id)
+        if state is None:
+            if len(self._students) >= MAX_TRACKED_STUDENTS:
+                self._prune()
+            state = self._students[student_id] = _Student(self.burst)
+        now = time.monotonic()
+        state.tokens = min(self.burst, state.tokens + (now - state.refilled_at) * self.rate)
+        state.refilled_at = now
+        return state
+
+    def _prune(self):
+        now = time.monotonic()
+        for student_id, state in list(self._students.items()):
+            if state.active is None and state.tokens + (now - state.refilled_at) * self.rate >= self.burst:
+                del self._students[student_id]
+
+    def _position(self, ticket: _Ticket) -> int:
+        """1-based place in the queue, 0 once running"""
+        return 0 if ticket.started else self._queue.index(ticket) + 1
+
+    def _estimated_wait(self, position: int) -> float:
+        """Seconds until a run queued at `position` (0 = running) is done"""
+        run_seconds = self._run_seconds or 1.0
+        return run_seconds * (1 + position / self.max_concurrent)
+
+    def _reject(self, reason: str, message: str, retry_after: float, queue_position: Optional[int] = None):
+        self.rejected[reason] += 1
+        raise RunRejected(reason, message, max(retry_after, 1.0), queue_position)
+
+    def admit(self, student_id: str) -> _Ticket:
+        """Take a run slot or a queue place for the student. Raises RunRejected."""
+        state = self._student(student_id)
+        if state.active is not None:
+            position = self._position(state.active)
+            self._reject(
+                REJECT_IN_PROGRESS,
+                f"Your previous run is still {'queued (position ' + str(position) + ')' if position else 'running'}",
+                self._estimated_wait(position),
+                position,
+            )
+        if state.tokens < 1:
+            self._reject(
+                REJECT_RATE_LIMITED,
+                "Too many runs; please wait before running again",
+                (1 - state.tokens) / self.rate,
+            )
+
+        ticket = _Ticket(student_id)
+        if self._running < self.max_concurrent and not self._queue:
+            self._start(ticket)
+        elif len(self._queue) < self.max_queue:
+            ticket.future = asyncio.get_running_loop().create_future()
+            self._queue.append(ticket)
+            self.queued += 1
+        else:
+            self._reject(
+                REJECT_QUEUE_FULL,
+                "The code runner is busy; please try again shortly",
+                self._estimated_wait(len(self._queue)),
+                len(self._queue) + 1,
+            )
+
+        state.tokens -= 1
+        state.active = ticket
+        self.admitted += 1
+        return ticket
+
+    def _start(self, ticket: _Ticket):
+        self._running += 1
+        ticket.started = True
+        ticket.started_at = time.monotonic()
+
+    async def wait_turn(self, ticket: _Ticket):
+        """Wait for a queued ticket to be started. Raises RunRejected on timeout."""
+        if ticket.started:
+            return
+        try:
+            await asyncio.wait_for(ticket.future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(
+                REJECT_QUEUE_TIMEOUT,
+                "The code runner is busy; please try again shortly",
+                self._estimated_wait(len(self._queue)),
+            )
+
+    def release(self, ticket: _Ticket):
+        state = self._students.get(ticket.student_id)
+        if state is not None and state.active is ticket:
+            state.active = None
+        if ticket.started:
+            self._running -= 1
+            duration = time.monotonic() - ticket.started_at
+            self._run_seconds = duration if self._run_seconds is None else 0.8 * self._run_seconds + 0.2 * duration
+        elif ticket in self._queue:
+            self._queue.remove(ticket)
+        # Hand freed slots to the queue in order, skipping abandoned waiters
+        while self._running < self.max_concurrent and self._queue:
+            waiting = self._queue.popleft()
+            if waiting.future.done():
+                continue
+            self._start(waiting)
+            waiting.future.set_result(True)
+
+    @asynccontextmanager
+    async def run(self, student_id: str):
+        """Admission for one run: raises RunRejected, else holds the slot for the block"""
+        ticket = self.admit(student_id)
+        try:
+            await self.wait_turn(ticket)
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "students_tracked": len(self._students),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "run_seconds_ewma": round(self._run_seconds, 3) if self._run_seconds is not None else None,
+        }
+
+
+# Global admission control for this process's run-code requests
+run_admission = RunAdmission()
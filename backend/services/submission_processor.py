@@ -1,33 +1,102 @@
 import asyncio
 import aiohttp
 import json
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from uuid import UUID
-from datetime import datetime
-from fastapi import HTTPException
 import logging
 import os
-import base64
+import socket
+from collections import deque
+
+from .grading_scheduler import AdaptiveConcurrencyLimiter, run_adaptive
+from . import grading_queue, grading_store, regrade
+from .grading_queue import TaskResultWriter
+from .grading_store import SubmissionResultWriter
+from .test_case_cache import test_case_cache
+from .result_cache import ExecutionResultCache, fingerprint_test_cases, make_result_key
+from .judge0_callbacks import JUDGE0_CALLBACK_POLL_INTERVAL, judge0_callbacks
+from .judge0_client import Judge0Client, judge0_client
+from .judge0_dispatch import LANE_BULK, judge0_dispatcher
+from .time_limits import resolve_cpu_time_limit, sandbox_time_limits
+from .early_exit import EarlyExitPolicy
+from .preflight import run_preflight
+from .executors import GRADING_EXECUTOR, JUDGE0, Executor, get_executor
+from .packed_execution import (
+    JUDGE0_COMPILE_ONCE_ENABLED, JUDGE0_HARNESS_ENABLED, JUDGE0_MULTI_FILE_LANGUAGE_ID,
+    JUDGE0_PACKED_TEST_TIME_LIMIT, JUDGE0_PACKED_WALL_TIME_LIMIT,
+    PackedLanguage, build_additional_files, judge_packed_test, new_boundary, packed_language_for,
+    parse_packed_output
+)
 
 
 logger = logging.getLogger(__name__)
 
+# Judge0 batch settings (MAX_SUBMISSION_BATCH_SIZE in judge0.conf defaults to 20)
+JUDGE0_BATCH_ENABLED = os.getenv("JUDGE0_BATCH_ENABLED", "true").lower() == "true"
+JUDGE0_BATCH_SIZE = int(os.getenv("JUDGE0_BATCH_SIZE", "20"))
+JUDGE0_BATCH_POLL_INTERVAL = float(os.getenv("JUDGE0_BATCH_POLL_INTERVAL", "0.5"))
+JUDGE0_BATCH_POLL_MAX_INTERVAL = float(os.getenv("JUDGE0_BATCH_POLL_MAX_INTERVAL", "2"))
+JUDGE0_BATCH_POLL_TIMEOUT = float(os.getenv("JUDGE0_BATCH_POLL_TIMEOUT", "120"))
+
+# How long an idle grading worker waits before polling the queue again
+GRADING_QUEUE_POLL_INTERVAL = float(os.getenv("GRADING_QUEUE_POLL_INTERVAL", "1"))
+# How often a worker looks for tasks abandoned by a dead worker
+GRADING_QUEUE_REQUEUE_INTERVAL = float(os.getenv("GRADING_QUEUE_REQUEUE_INTERVAL", "60"))
+
+# Only request the fields we actually read back
+JUDGE0_RESULT_FIELDS = "token,stdout,stderr,compile_output,status,time,memory"
+
+# Judge0 status ids that mean the submission has not finished yet
+JUDGE0_PENDING_STATUSES = (1, 2)  # In Queue, Processing
+
+# Sandbox limits sent with every grading submission; cpu/wall time are
+# replaced per question (see time_limits)
+JUDGE0_SUBMISSION_LIMITS = {
+    "cpu_time_limit": 5,
+    "memory_limit": 128000,
+    "max_processes_and_or_threads": 60,
+    "enable_per_process_and_thread_time_limit": True,
+    "enable_per_process_and_thread_memory_limit": True,
+    "max_file_size": 1024
+}
+
+
+class PackedExecutionUnavailable(Exception):
+    """Raised when Judge0 refuses a multi-file (compile-once / harness) submission"""
+
+
+class Judge0BatchUnavailable(Exception):
+    """Raised when Judge0 rejects a batch request (e.g. batching disabled)"""
+
 
 class LeetCodeAPI:
-    def __init__(self, api_url: str):
+    def __init__(
+        self,
+        api_url: str,
+        use_batch: bool = JUDGE0_BATCH_ENABLED,
+        use_callbacks: Optional[bool] = None,
+        client: Optional[Judge0Client] = None,
+        executor_backend: str = GRADING_EXECUTOR,
+        lane: str = LANE_BULK
+    ):
         self.api_url = api_url
-        self.session = None  # Reusable session
+        # Judge0 dispatch lane (see judge0_dispatch): grading fills what interactive runs leave
+        self.lane = lane
+        # Judge0 runs go through the batched/packed paths below; other
+        # backends (e.g. the local Python sandbox) through run_test_cases_with_executor
+        self.executor_backend = executor_backend
+        # Shared pooled client; its session lives as long as the app
+        self.client = client or judge0_client
+        self.use_batch = use_batch
+        self.use_compile_once = JUDGE0_COMPILE_ONCE_ENABLED
+        self.use_harness = JUDGE0_HARNESS_ENABLED
+        # Callbacks need the receiver endpoint, i.e. JUDGE0_CALLBACK_URL set
+        self.use_callbacks = judge0_callbacks.enabled if use_callbacks is None else use_callbacks
+        self.result_cache = ExecutionResultCache()
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create a persistent session"""
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
-
-    async def close_session(self):
-        """Close the session when done"""
-        if self.session and not self.session.closed:
-            await self.session.close()
+        """The shared Judge0 session (not closed per batch; see Judge0Client.close)"""
+        return await self.client.get_session()
 
     def normalize_output(self, output: str) -> str:
         """Normalize output by removing trailing whitespace including newlines"""
@@ -35,184 +104,258 @@ class LeetCodeAPI:
             return ""
         # Remove trailing whitespace (spaces, tabs, newlines, carriage returns)
         return str(output).rstrip()
+
+    def format_stdin(self, input_data: Any) -> str:
+        """
+        Converts structured input into Judge0-safe stdin
+        """
+        if input_data is None:
+            return ""
             
-    async def submit_solution(self, source_code: str, language: str, test_cases: List[Dict]) -> Dict:
-        """Submit solution to Judge0 and get LeetCode-style response"""
+        if isinstance(input_data, dict):
+            # Handle dict inputs - convert to lines
+            lines = []
+            for key, value in input_data.items():
+                if isinstance(value, list):
+                    lines.append(" ".join(map(str, value)))
+                else:
+                    lines.append(str(value))
+            return "\n".join(lines)
+
+        if isinstance(input_data, list):
+            # Handle list inputs - space-separated
+            return " ".join(map(str, input_data))
+
+        # Handle string/primitive inputs
+        return str(input_data).strip()
+
+    def prepare_test_case(self, test_case: Dict) -> Dict[str, Any]:
+        """Judge0-ready form of a stored test case (input_data / expected_output)"""
+        return {
+            "input": test_case["input_data"],
+            "output": test_case["expected_output"],
+            "stdin": self.format_stdin(test_case["input_data"]),
+            "expected": self.normalize_output(test_case["expected_output"])
+        }
+
+    def _stdin_and_expected(self, test_case: Dict) -> Tuple[str, str]:
+        """Use precomputed stdin / expected output when the caller cached them"""
+        if "stdin" in test_case and "expected" in test_case:
+            return test_case["stdin"], test_case["expected"]
+        return self.format_stdin(test_case["input"]), self.normalize_output(test_case["output"])
+
+    def submission_limits(self, cpu_time_limit: Optional[float] = None) -> Dict[str, Any]:
+        """Sandbox limits for grading, with a per-question CPU limit if given"""
+        if cpu_time_limit is None:
+            return JUDGE0_SUBMISSION_LIMITS
+        return {**JUDGE0_SUBMISSION_LIMITS, **sandbox_time_limits(cpu_time_limit)}
+
+    def build_submission_payload(
+        self,
+        source_code: str,
+        language_id: int,
+        stdin_data: str,
+        expected_output: str,
+        limits: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Build the Judge0 submission body for a single test case"""
+        payload = {
+            "source_code": source_code,
+            "language_id": language_id,
+            "stdin": stdin_data,
+            "expected_output": expected_output,  # Let Judge0 compare
+            **(limits or JUDGE0_SUBMISSION_LIMITS)
+        }
+        if self.use_callbacks:
+            payload["callback_url"] = judge0_callbacks.callback_url
+        return payload
+
+    def build_test_result(self, index: int, result: Dict, expected_output: str) -> Dict[str, Any]:
+        """Turn a finished Judge0 submission into our per-test result dict"""
+        # ✅ FIX: Properly handle null outputs
+        actual_output = self.normalize_output(result.get("stdout") or "")
+        stderr = result.get("stderr") or ""
+        compile_output = result.get("compile_output") or ""
+        
+        # Get status correctly from nested object
+        status_obj = result.get("status", {})
+        status_id = status_obj.get("id") if isinstance(status_obj, dict) else None
+        status_desc = status_obj.get("description") if isinstance(status_obj, dict) else "Unknown"
+        
+        # Judge0 status: 3 = Accepted, 4 = Wrong Answer
+        test_passed = (status_id == 3)
+        
+        # Debug logging 
+        print(f"Test Case {index+1} Result:")
+        print(f"  Status ID: {status_id} ({status_desc})")
+        print(f"  stdout: {repr(result.get('stdout'))}")
+        print(f"  stderr: {repr(stderr)}")
+        print(f"  actual: {repr(actual_output)}")
+        print(f"  expected: {repr(expected_output)}")
+        print(f"  Passed: {test_passed}")
+        print("-" * 50)
+        
+        return {
+            "test_case": index + 1,
+            "passed": test_passed,
+            "expected": expected_output,
+            "actual": actual_output,
+            "status_id": status_id,
+            "status": status_desc,
+            "time": result.get("time") or "0",
+            "memory": result.get("memory") or "0",
+            "stderr": stderr,
+            "compile_output": compile_output,
+            "token": result.get("token") or ""
+        }
+
+    def build_error_result(self, index: int, error: str, status_id: int, status: str) -> Dict[str, Any]:
+        """Per-test result for a test case that never produced a Judge0 verdict"""
+        return {
+            "test_case": index + 1,
+            "passed": False,
+            "error": error,
+            "status_id": status_id,
+            "status": status
+        }
+
+    def build_compile_error_results(self, count: int, compile_output: str, token: str = "") -> List[Dict[str, Any]]:
+        """Every test fails with the one compile error; its output is kept on the first"""
+        return [
+            {
+                **self.build_error_result(i, "Compilation Error", 6, "Compilation Error"),
+                "compile_output": compile_output if i == 0 else "",
+                "token": token
+            }
+            for i in range(count)
+        ]
+
+    def build_leetcode_response(self, results: List[Dict], total_testcases: int) -> Dict:
+        """Summarize per-test results into a LeetCode-style response"""
+        passed_tests = sum(1 for r in results if r.get("passed"))
+        skipped_tests = sum(1 for r in results if r.get("skipped"))
+
+        # Get first result for overall status
+        first_result = results[0] if results else {}
+        
+        # Determine overall status code
+        if any(r.get("status_id") == 13 for r in results):
+            status_code = 99  # Internal Error
+        elif any(r.get("status_id") == 6 for r in results):
+            status_code = 20  # Compile Error
+        elif passed_tests == total_testcases:
+            status_code = 10  # Accepted
+        else:
+            status_code = 11  # Wrong Answer
+        
+        # Create LeetCode-style response
+        leetcode_response = {
+            "status_code": status_code,
+            "status_runtime": first_result.get("time") or "0",
+            "memory": first_result.get("memory") or "0",
+            "total_correct": passed_tests,
+            "total_testcases": total_testcases,
+            "total_skipped": skipped_tests,
+            "token": first_result.get("token", ""),
+            "test_results": results
+        }
+        
+        # Add error-specific fields
+        if status_code == 11:  # Wrong Answer
+            failed_test = next((r for r in results if not r["passed"]), {})
+            leetcode_response.update({
+                "last_testcase": failed_test.get("test_case", 1),
+                "expected_output": failed_test.get("expected", ""),
+                "code_output": [r.get("actual", "") for r in results]
+            })
+        elif status_code == 20:  # Compile Error
+            compile_error = next((r.get("compile_output") or r.get("stderr") for r in results if r.get("compile_output") or r.get("stderr")), "Unknown compile error")
+            leetcode_response["compile_error"] = compile_error
+        
+        return leetcode_response
+            
+    async def submit_solution(
+        self,
+        source_code: str,
+        language: str,
+        test_cases: List[Dict],
+        test_cases_fingerprint: Optional[str] = None,
+        multi_test_harness: bool = False,
+        cpu_time_limit: Optional[float] = None,
+        early_exit: Optional[EarlyExitPolicy] = None
+    ) -> Dict:
+        """
+        Submit solution to Judge0 and get LeetCode-style response.
+        multi_test_harness runs all test cases in one sandbox for languages
+        with a harness (see packed_execution.HARNESS_LANGUAGES);
+        cpu_time_limit is the per-test limit (default: JUDGE0_SUBMISSION_LIMITS);
+        early_exit decides when to stop running tests (skipped ones are
+        reported with "skipped": True).
+        """
         try:
             # Get language ID
             language_id = self.get_language_id(language)
-            
-            # Run tests for each test case
-            results = []
-            passed_tests = 0
-            
-            def format_stdin(input_data: Any) -> str:
-                """
-                Converts structured input into Judge0-safe stdin
-                """
-                if input_data is None:
-                    return ""
-                    
-                if isinstance(input_data, dict):
-                    # Handle dict inputs - convert to lines
-                    lines = []
-                    for key, value in input_data.items():
-                        if isinstance(value, list):
-                            lines.append(" ".join(map(str, value)))
-                        else:
-                            lines.append(str(value))
-                    return "\n".join(lines)
-
-                if isinstance(input_data, list):
-                    # Handle list inputs - space-separated
-                    return " ".join(map(str, input_data))
-
-                # Handle string/primitive inputs
-                return str(input_data).strip()
-            
-            # ✅ FIX: Use single session for all test cases
-            session = await self._get_session()
-            
-            for i, test_case in enumerate(test_cases):
+            early_exit = early_exit or EarlyExitPolicy()
+            executor = get_executor(self.executor_backend, language_id)
+
+            # Obviously broken code is rejected here instead of in a sandbox per test
+            ok, preflight_error = run_preflight(source_code, language_id, executor.name)
+            if not ok:
+                print(f"Preflight rejected submission: {preflight_error}")
+                results = early_exit.apply(
+                    self.build_compile_error_results(len(test_cases), preflight_error), len(test_cases)
+                )
+                leetcode_response = self.build_leetcode_response(results, len(test_cases))
+                leetcode_response["preflight"] = True
+                return leetcode_response
+
+            packed_language = None
+            if executor.name == JUDGE0:
+                packed_language = self._packed_language(language_id, multi_test_harness and bool(test_cases))
+
+            # Identical code against identical tests and limits was already judged
+            if test_cases_fingerprint is None:
+                test_cases_fingerprint = fingerprint_test_cases(
+                    self._stdin_and_expected(tc) for tc in test_cases
+                )
+            limits = self.submission_limits(cpu_time_limit)
+            # Skipped tests are part of the verdict
+            cache_limits = {**limits, "early_exit": early_exit.to_dict(), "executor": executor.name}
+            cache_key = make_result_key(source_code, language_id, test_cases_fingerprint, cache_limits)
+            cached_response = self.result_cache.get(cache_key)
+            if cached_response is not None:
+                print(f"Reusing cached Judge0 result ({len(test_cases)} test cases)")
+                cached_response["cached"] = True
+                return cached_response
+
+            results = None
+            if executor.name != JUDGE0:
+                results = await self.run_test_cases_with_executor(
+                    executor, source_code, language_id, test_cases, limits, early_exit
+                )
+            elif packed_language is not None and test_cases:
                 try:
-                    # Format inputs
-                    stdin_data = format_stdin(test_case["input"])
-                    expected_output = self.normalize_output(test_case["output"])
-                    
-                    # ✅ FIX: Include expected_output for Judge0 to compare
-                    submission_payload = {
-                        "source_code": source_code,
-                        "language_id": language_id,
-                        "stdin": stdin_data,
-                        "expected_output": expected_output,  # Let Judge0 compare
-                        "cpu_time_limit": 5,
-                        "memory_limit": 128000,
-                        "max_processes_and_or_threads": 60,
-                        "enable_per_process_and_thread_time_limit": True,
-                        "enable_per_process_and_thread_memory_limit": True,
-                        "max_file_size": 1024
-                    }
-                    
-                    print(f"Test Case {i+1} - Submitting to Judge0:")
-                    print(f"  stdin: {repr(stdin_data)}")
-                    print(f"  expected: {repr(expected_output)}")
-                    
-                    # Submit to Judge0 with wait=true
-                    async with session.post(
-                        f"{self.api_url}submissions?wait=true",
-                        json=submission_payload,
-                        headers={"Content-Type": "application/json"},
-                        timeout=aiohttp.ClientTimeout(total=30)  # ✅ Add timeout
-                    ) as response:
-                        response_text = await response.text()
-                        
-                        if response.status not in [200, 201]:
-                            print(f"Judge0 error response: {response_text}")
-                            results.append({
-                                "test_case": i + 1,
-                                "passed": False,
-                                "error": f"Judge0 error: {response_text}",
-                                "status_id": 13,
-                                "status": "Internal Error"
-                            })
-                            continue
-                        
-                        result = json.loads(response_text)
-                        
-                        # ✅ FIX: Properly handle null outputs
-                        actual_output = self.normalize_output(result.get("stdout") or "")
-                        stderr = result.get("stderr") or ""
-                        compile_output = result.get("compile_output") or ""
-                        
-                        # Get status correctly from nested object
-                        status_obj = result.get("status", {})
-                        status_id = status_obj.get("id") if isinstance(status_obj, dict) else None
-                        status_desc = status_obj.get("description") if isinstance(status_obj, dict) else "Unknown"
-                        
-                        # Judge0 status: 3 = Accepted, 4 = Wrong Answer
-                        test_passed = (status_id == 3)
-                        
-                        # Debug logging 
-                        print(f"Test Case {i+1} Result:")
-                        print(f"  Status ID: {status_id} ({status_desc})")
-                        print(f"  stdout: {repr(result.get('stdout'))}")
-                        print(f"  stderr: {repr(stderr)}")
-                        print(f"  actual: {repr(actual_output)}")
-                        print(f"  expected: {repr(expected_output)}")
-                        print(f"  Passed: {test_passed}")
-                        print("-" * 50)
-                        
-                        if test_passed:
-                            passed_tests += 1
-                        
-                        results.append({
-                            "test_case": i + 1,
-                            "passed": test_passed,
-                            "expected": expected_output,
-                            "actual": actual_output,
-                            "status_id": status_id,
-                            "status": status_desc,
-                            "time": result.get("time") or "0",
-                            "memory": result.get("memory") or "0",
-                            "stderr": stderr,
-                            "compile_output": compile_output
-                        })
-                        
-                except asyncio.TimeoutError:
-                    print(f"Test case {i+1} timed out")
-                    results.append({
-                        "test_case": i + 1,
-                        "passed": False,
-                        "error": "Execution timeout",
-                        "status_id": 5,
-                        "status": "Time Limit Exceeded"
-                    })
-                except Exception as e:
-                    print(f"Test case {i+1} exception: {str(e)}")
-                    results.append({
-                        "test_case": i + 1,
-                        "passed": False,
-                        "error": str(e),
-                        "status_id": 13,
-                        "status": "Internal Error"
-                    })
-            
-            # Get first result for overall status
-            first_result = results[0] if results else {}
-            
-            # Determine overall status code
-            if any(r.get("status_id") == 13 for r in results):
-                status_code = 99  # Internal Error
-            elif any(r.get("status_id") == 6 for r in results):
-                status_code = 20  # Compile Error
-            elif passed_tests == len(test_cases):
-                status_code = 10  # Accepted
-            else:
-                status_code = 11  # Wrong Answer
-            
-            # Create LeetCode-style response
-            leetcode_response = {
-                "status_code": status_code,
-                "status_runtime": first_result.get("time") or "0",
-                "memory": first_result.get("memory") or "0",
-                "total_correct": passed_tests,
-                "total_testcases": len(test_cases),
-                "token": first_result.get("token", ""),
-                "test_results": results
-            }
-            
-            # Add error-specific fields
-            if status_code == 11:  # Wrong Answer
-                failed_test = next((r for r in results if not r["passed"]), {})
-                leetcode_response.update({
-                    "last_testcase": failed_test.get("test_case", 1),
-                    "expected_output": failed_test.get("expected", ""),
-                    "code_output": [r.get("actual", "") for r in results]
-                })
-            elif status_code == 20:  # Compile Error
-                compile_error = next((r.get("compile_output") or r.get("stderr") for r in results if r.get("compile_output") or r.get("stderr")), "Unknown compile error")
-                leetcode_response["compile_error"] = compile_error
-            
+                    # One sandbox runs every test, one process each
+                    results = await self.run_test_cases_packed(
+                        source_code, language_id, test_cases, packed_language, limits, early_exit
+                    )
+                except PackedExecutionUnavailable as e:
+                    # e.g. no multi-file language on this Judge0; stop trying
+                    logger.warning(f"Packed execution unavailable, running one submission per test: {e}")
+                    self.use_compile_once = False
+                    self.use_harness = False
+            if results is None:
+                results = await self.run_test_cases_per_test(
+                    source_code, language_id, test_cases, limits, early_exit
+                )
+            results = early_exit.apply(results, len(test_cases))
+
+            leetcode_response = self.build_leetcode_response(results, len(test_cases))
+
+            # Only keep real verdicts; infrastructure errors and poll timeouts may pass on retry
+            if not any("error" in r for r in results):
+                self.result_cache.put(cache_key, leetcode_response)
+
             return leetcode_response
             
         except Exception as e:
@@ -226,7 +369,449 @@ class LeetCodeAPI:
                 "test_results": []
             }
 
-    
+    def _packed_language(self, language_id: int, multi_test_harness: bool) -> Optional[PackedLanguage]:
+        language = packed_language_for(language_id, use_harness=multi_test_harness and self.use_harness)
+        if language is not None and language.compile_command and not self.use_compile_once:
+            return None
+        return language
+
+    async def run_test_cases_with_executor(
+        self,
+        executor: Executor,
+        source_code: str,
+        language_id: int,
+        test_cases: List[Dict],
+        limits: Optional[Dict[str, Any]] = None,
+        early_exit: Optional[EarlyExitPolicy] = None
+    ) -> List[Optional[Dict]]:
+        """Run the tests on a non-Judge0 executor; unrun tests stay None"""
+        prepared = [self._stdin_and_expected(tc) for tc in test_cases]
+        runs = await executor.run_tests(source_code, language_id, prepared, limits, early_exit)
+        return [
+            self.build_test_result(i, run, prepared[i][1]) if run is not None else None
+            for i, run in enumerate(runs)
+        ]
+
+    async def run_test_cases_per_test(
+        self,
+        source_code: str,
+        language_id: int,
+        test_cases: List[Dict],
+        limits: Optional[Dict[str, Any]] = None,
+        early_exit: Optional[EarlyExitPolicy] = None
+    ) -> List[Dict]:
+        """
+        One Judge0 submission per test case, batched when Judge0 allows it.
+        Tests cut off by early_exit are left out (see EarlyExitPolicy.apply).
+        Dispatch slots are taken per Judge0 request (see judge0_dispatch),
+        never for the whole submission.
+        """
+        if self.use_batch and test_cases:
+            try:
+                return await self.run_test_cases_batched(
+                    source_code, language_id, test_cases, limits, early_exit
+                )
+            except Judge0BatchUnavailable as e:
+                # Batching disabled on this Judge0 - fall back to one request per test
+                logger.warning(f"Judge0 batch submissions unavailable, running sequentially: {e}")
+        return await self.run_test_cases_sequential(source_code, language_id, test_cases, limits, early_exit)
+
+    async def run_test_cases_sequential(
+        self,
+        source_code: str,
+        language_id: int,
+        test_cases: List[Dict],
+        limits: Optional[Dict[str, Any]] = None,
+        early_exit: Optional[EarlyExitPolicy] = None
+    ) -> List[Dict]:
+        """
+        Run each test case as its own Judge0 submission: wait=true, or with
+        callbacks a plain POST followed by waiting for the callback. Stops
+        as soon as early_exit says so.
+        """
+        results = []
+
+        # ✅ FIX: Use single session for all test cases
+        session = await self._get_session()
+        
+        for i, test_case in enumerate(test_cases):
+            if early_exit and early_exit.stop_point(results):
+                break
+            try:
+                # Format inputs
+                stdin_data, expected_output = self._stdin_and_expected(test_case)
+                
+                submission_payload = self.build_submission_payload(
+                    source_code, language_id, stdin_data, expected_output, limits
+                )
+                
+                print(f"Test Case {i+1} - Submitting to Judge0:")
+                print(f"  stdin: {repr(stdin_data)}")
+                print(f"  expected: {repr(expected_output)}")
+                
+                async with judge0_dispatcher.slot(self.lane):
+                    # Submit to Judge0; with callbacks don't hold the connection open
+                    async with session.post(
+                        f"{self.api_url}submissions?wait={'false' if self.use_callbacks else 'true'}",
+                        json=submission_payload,
+                        headers={"Content-Type": "application/json"},
+                        timeout=self.client.timeout("submit" if self.use_callbacks else "wait")
+                    ) as response:
+                        response_text = await response.text()
+
+                        if response.status not in [200, 201]:
+                            print(f"Judge0 error response: {response_text}")
+                            results.append(self.build_error_result(
+                                i, f"Judge0 error: {response_text}", 13, "Internal Error"
+                            ))
+                            continue
+
+                        result = json.loads(response_text)
+
+                    if self.use_callbacks:
+                        single: List[Optional[Dict]] = [None]
+                        await self._collect_results(
+                            session, {result["token"]: 0}, [(stdin_data, expected_output)], single
+                        )
+                        results.append({**single[0], "test_case": i + 1})
+                        continue
+
+                results.append(self.build_test_result(i, result, expected_output))
+                    
+            except asyncio.TimeoutError:
+                print(f"Test case {i+1} timed out")
+                results.append(self.build_error_result(i, "Execution timeout", 5, "Time Limit Exceeded"))
+            except Exception as e:
+                print(f"Test case {i+1} exception: {str(e)}")
+                results.append(self.build_error_result(i, str(e), 13, "Internal Error"))
+
+        return results
+
+    async def run_test_cases_batched(
+        self,
+        source_code: str,
+        language_id: int,
+        test_cases: List[Dict],
+        limits: Optional[Dict[str, Any]] = None,
+        early_exit: Optional[EarlyExitPolicy] = None
+    ) -> List[Dict]:
+        """
+        Run all test cases through /submissions/batch and poll the tokens,
+        JUDGE0_BATCH_SIZE at a time. The first batch runs alone so a Judge0
+        without batching is detected before anything else is queued; the
+        rest run concurrently, or one after the other with an incremental
+        early_exit policy so each can be checked first. Unrun tests stay None.
+        Raises Judge0BatchUnavailable if Judge0 rejects the very first batch.
+        """
+        session = await self._get_session()
+
+        prepared = [self._stdin_and_expected(tc) for tc in test_cases]
+        results: List[Optional[Dict]] = [None] * len(prepared)
+        starts = list(range(0, len(prepared), JUDGE0_BATCH_SIZE))
+
+        await self._run_batch_chunk(session, source_code, language_id, prepared, 0, results, limits, first=True)
+        if early_exit is not None and early_exit.incremental:
+            for start in starts[1:]:
+                if early_exit.stop_point(results[:start]):
+                    break
+                await self._run_batch_chunk(session, source_code, language_id, prepared, start, results, limits)
+        elif len(starts) > 1:
+            await asyncio.gather(*(
+                self._run_batch_chunk(session, source_code, language_id, prepared, start, results, limits)
+                for start in starts[1:]
+            ))
+        return results
+
+    async def _run_batch_chunk(
+        self,
+        session: aiohttp.ClientSession,
+        source_code: str,
+        language_id: int,
+        prepared: List[Tuple[str, str]],
+        start: int,
+        results: List[Optional[Dict]],
+        limits: Optional[Dict[str, Any]] = None,
+        first: bool = False
+    ):
+        """
+        Create one batch of up to JUDGE0_BATCH_SIZE submissions from
+        prepared[start:] and fill their results, holding one dispatch slot
+        per submission while they are in Judge0.
+        """
+        chunk = prepared[start:start + JUDGE0_BATCH_SIZE]
+        payload = {
+            "submissions": [
+                self.build_submission_payload(source_code, language_id, stdin_data, expected_output, limits)
+                for stdin_data, expected_output in chunk
+            ]
+        }
+        async with judge0_dispatcher.slot(self.lane, len(chunk)):
+            try:
+                async with session.post(
+                    f"{self.api_url}submissions/batch?base64_encoded=false",
+                    json=payload,
+                    headers={"Content-Type": "application/json"},
+                    timeout=self.client.timeout("submit")
+                ) as response:
+                    response_text = await response.text()
+                    if response.status not in [200, 201]:
+                        raise Judge0BatchUnavailable(f"{response.status} - {response_text}")
+                    created = json.loads(response_text)
+            except Exception as e:
+                if first:
+                    if isinstance(e, Judge0BatchUnavailable):
+                        raise
+                    raise Judge0BatchUnavailable(str(e)) from e
+                # Earlier chunks are already queued; fail only this chunk
+                for offset in range(len(chunk)):
+                    results[start + offset] = self.build_error_result(
+                        start + offset, f"Judge0 error: {e}", 13, "Internal Error"
+                    )
+                return
+
+            pending: Dict[str, int] = {}  # token -> test case index
+            for offset, item in enumerate(created):
+                index = start + offset
+                token = item.get("token") if isinstance(item, dict) else None
+                if token:
+                    pending[token] = index
+                else:
+                    # Judge0 returns per-item validation errors in place of a token
+                    results[index] = self.build_error_result(
+                        index, f"Judge0 error: {item}", 13, "Internal Error"
+                    )
+            await self._collect_results(session, pending, prepared, results)
+
+    async def _collect_results(
+        self,
+        session: aiohttp.ClientSession,
+        pending: Dict[str, int],
+        prepared: List[Tuple[str, str]],
+        results: List[Optional[Dict]]
+    ):
+        """
+        Fill `results` for every pending token (token -> test case index).
+        Tokens still pending at the deadline become timeouts.
+        """
+        finished = await self._wait_for_tokens(session, list(pending))
+        for token, index in pending.items():
+            submission = finished.get(token)
+            if submission is None:
+                print(f"Test case {index+1} timed out waiting for Judge0 (token {token})")
+                results[index] = self.build_error_result(index, "Execution timeout", 5, "Time Limit Exceeded")
+            else:
+                results[index] = self.build_test_result(index, submission, prepared[index][1])
+
+    async def _wait_for_tokens(
+        self,
+        session: aiohttp.ClientSession,
+        tokens: List[str],
+        timeout: float = JUDGE0_BATCH_POLL_TIMEOUT
+    ) -> Dict[str, Dict]:
+        """
+        Finished Judge0 submissions by token; tokens missing from the result
+        timed out. With callbacks, verdicts arrive through judge0_callbacks
+        and polling is only a slow safety net; otherwise poll with backoff.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiting = set(tokens)
+        finished: Dict[str, Dict] = {}
+        futures = judge0_callbacks.expect(waiting) if self.use_callbacks else {}
+        interval = JUDGE0_CALLBACK_POLL_INTERVAL if futures else JUDGE0_BATCH_POLL_INTERVAL
+
+        try:
+            while waiting:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+
+                if futures:
+                    await asyncio.wait(
+                        [futures[token] for token in waiting],
+                        timeout=min(interval, remaining)
+                    )
+                    for token in list(waiting):
+                        if futures[token].done():
+                            waiting.discard(token)
+                            finished[token] = futures[token].result()
+                    if not waiting:
+                        break
+                else:
+                    await asyncio.sleep(min(interval, remaining))
+                    interval = min(interval * 1.5, JUDGE0_BATCH_POLL_MAX_INTERVAL)
+
+                await self._poll_tokens(session, waiting, finished)
+        finally:
+            judge0_callbacks.forget(futures)
+        return finished
+
+    async def _poll_tokens(
+        self,
+        session: aiohttp.ClientSession,
+        waiting: set,
+        finished: Dict[str, Dict]
+    ):
+        """One GET /submissions/batch round; moves finished tokens out of `waiting`"""
+        tokens = list(waiting)
+        for start in range(0, len(tokens), JUDGE0_BATCH_SIZE):
+            chunk = tokens[start:start + JUDGE0_BATCH_SIZE]
+            try:
+                async with session.get(
+                    f"{self.api_url}submissions/batch",
+                    params={
+                        "tokens": ",".join(chunk),
+                        "base64_encoded": "false",
+                        "fields": JUDGE0_RESULT_FIELDS
+                    },
+                    timeout=self.client.timeout("poll")
+                ) as response:
+                    if response.status != 200:
+                        logger.warning(f"Judge0 batch poll failed: {response.status} - {await response.text()}")
+                        continue
+                    data = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Transient; retry on the next poll until the deadline
+                logger.warning(f"Judge0 batch poll error: {e}")
+                continue
+
+            for submission in data.get("submissions") or []:
+                if not isinstance(submission, dict):
+                    continue
+                status_obj = submission.get("status") or {}
+                if status_obj.get("id") in JUDGE0_PENDING_STATUSES:
+                    continue
+                token = submission.get("token")
+                if token in waiting:
+                    waiting.discard(token)
+                    finished[token] = submission
+
+    async def run_test_cases_packed(
+        self,
+        source_code: str,
+        language_id: int,
+        test_cases: List[Dict],
+        language: PackedLanguage,
+        limits: Optional[Dict[str, Any]] = None,
+        early_exit: Optional[EarlyExitPolicy] = None
+    ) -> List[Dict]:
+        """
+        One multi-file Judge0 submission runs the program against every test
+        case, each test in its own process: compiled languages are built
+        once, harness languages start an interpreter per test. A compile
+        error is reported once and no test runs; tests the packed run could
+        not finish (or whose frame is missing or repeated) are re-run one
+        submission per test.
+        Raises PackedExecutionUnavailable if Judge0 rejects the submission.
+        """
+        session = await self._get_session()
+        prepared = [self._stdin_and_expected(tc) for tc in test_cases]
+        boundary = new_boundary()
+        limits = limits or JUDGE0_SUBMISSION_LIMITS
+        # The question's per-test limit is enforced inside the run script
+        test_time_limit = min(float(limits["cpu_time_limit"]), JUDGE0_PACKED_TEST_TIME_LIMIT)
+
+        payload = {
+            "language_id": JUDGE0_MULTI_FILE_LANGUAGE_ID,
+            "additional_files": build_additional_files(
+                language, source_code, [stdin_data for stdin_data, _ in prepared], test_time_limit,
+                early_exit.max_consecutive_tle if early_exit else 0
+            ),
+            # The run script reads the frame marker from here (see new_boundary)
+            "stdin": boundary + "\n",
+            **limits,
+            # Per process: each test is its own process under the run script
+            "cpu_time_limit": test_time_limit,
+            "wall_time_limit": JUDGE0_PACKED_WALL_TIME_LIMIT,
+        }
+        if self.use_callbacks:
+            payload["callback_url"] = judge0_callbacks.callback_url
+
+        # One Judge0 execution; released before any leftover re-run takes its own
+        async with judge0_dispatcher.slot(self.lane):
+            try:
+                async with session.post(
+                    f"{self.api_url}submissions?base64_encoded=false&wait=false",
+                    json=payload,
+                    headers={"Content-Type": "application/json"},
+                    timeout=self.client.timeout("submit")
+                ) as response:
+                    response_text = await response.text()
+                    if response.status not in [200, 201]:
+                        raise PackedExecutionUnavailable(f"{response.status} - {response_text}")
+                    token = json.loads(response_text)["token"]
+            except (aiohttp.ClientError, asyncio.TimeoutError, KeyError, ValueError) as e:
+                raise PackedExecutionUnavailable(str(e)) from e
+
+            finished = await self._wait_for_tokens(
+                session, [token], timeout=JUDGE0_BATCH_POLL_TIMEOUT + JUDGE0_PACKED_WALL_TIME_LIMIT
+            )
+        submission = finished.get(token)
+        if submission is None:
+            return [
+                self.build_error_result(i, "Execution timeout", 5, "Time Limit Exceeded")
+                for i in range(len(test_cases))
+            ]
+
+        status_id = (submission.get("status") or {}).get("id")
+        if status_id == 6:
+            # Compiled once, failed once: every test is a compile error, no test ran
+            return self.build_compile_error_results(
+                len(test_cases), submission.get("compile_output") or "", token
+            )
+
+        runs = parse_packed_output(submission.get("stdout"), boundary)
+        results: List[Optional[Dict]] = [None] * len(test_cases)
+        for index, run in runs.items():
+            if index >= len(test_cases):
+                continue
+            expected_output = prepared[index][1]
+            verdict = judge_packed_test(run, expected_output, test_time_limit)
+            results[index] = {
+                "test_case": index + 1,
+                "passed": verdict["status_id"] == 3,
+                "expected": expected_output,
+                "actual": self.normalize_output(run["stdout"]),
+                "status_id": verdict["status_id"],
+                "status": verdict["status"],
+                "time": verdict["time"],
+                "memory": submission.get("memory") or "0",
+                "stderr": run["stderr"],
+                "compile_output": "",
+                "token": token
+            }
+
+        # Stopped by the early-exit policy: the rest is skipped, not re-run
+        stopped = early_exit is not None and early_exit.stop_point(results) is not None
+        leftover = [] if stopped else [i for i, result in enumerate(results) if result is None]
+        if leftover:
+            # Wall-clock budget or output limit hit before these ran
+            print(f"Packed run finished {len(test_cases) - len(leftover)}/{len(test_cases)} tests; "
+                  f"running the rest individually")
+            rerun = await self.run_test_cases_per_test(
+                source_code, language_id, [test_cases[i] for i in leftover], limits, early_exit
+            )
+            for i, result in zip(leftover, rerun):
+                if result is not None:
+                    results[i] = {**result, "test_case": i + 1}
+
+        return results
+
+    async def get_queue_depth(self) -> Optional[int]:
+        """Total submissions waiting in Judge0's worker queues, or None if unavailable"""
+        session = await self._get_session()
+        try:
+            async with session.get(
+                f"{self.api_url}workers",
+                timeout=self.client.timeout("workers")
+            ) as response:
+                if response.status != 200:
+                    return None
+                workers = await response.json()
+            return sum(int(worker.get("size") or 0) for worker in workers)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, TypeError, AttributeError):
+            return None
+
     def get_language_id(self, language: str) -> int:
         """Map language string to Judge0 language ID"""
         language_map = {
@@ -243,106 +828,243 @@ class LeetCodeAPI:
 class SubmissionProcessor:
     def __init__(self):
         self.judge0_api_url = os.getenv("JUDGE0_API_URL", "http://server:2358/")
-        self.processing_jobs = {}
         self.leetcode_api = LeetCodeAPI(self.judge0_api_url)
-        
-    async def process_submissions_batch(
-        self, 
-        exam_id: str, 
-        submissions: List[Dict], 
-        job_id: str
+        # Snapshot of this process's worker, for diagnostics
+        self.worker_stats: Dict[str, Any] = {}
+
+    async def run_queue_worker(
+        self,
+        stop_event: asyncio.Event,
+        worker_id: Optional[str] = None,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None
     ):
-        """Process submissions asynchronously with progress tracking"""
-        total_submissions = len(submissions)
-        completed = 0
-        failed = 0
-        
-        # Initialize job status
-        self.processing_jobs[job_id] = {
-            "status": "processing",
-            "total": total_submissions,
-            "completed": 0,
-            "failed": 0,
-            "start_time": datetime.utcnow().isoformat(),
-            "errors": []
-        }
-        
+        """
+        Claim grading tasks from the database queue and grade them until
+        stop_event is set, then finish what is in flight. Any number of these
+        can run across processes; each task is claimed by exactly one of them.
+        """
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        limiter = limiter or AdaptiveConcurrencyLimiter.from_env()
+        # Tasks are marked finished in the same transaction that stores their results
+        result_writer = SubmissionResultWriter(
+            after_insert=lambda db, tags: grading_queue.finish_tasks(db, worker_id, tags)
+        )
+        claimed = deque()
+        loop = asyncio.get_running_loop()
+        last_requeue = None
+
+        async def flush_results():
+            try:
+                await result_writer.flush()
+            except Exception as e:
+                # The tasks stay running and are re-queued once they go stale
+                logger.error(f"Grading worker {worker_id}: {e}")
+
+        async def send_heartbeats():
+            # Keeps our running tasks from being re-queued by other workers
+            while True:
+                await asyncio.sleep(grading_queue.GRADING_TASK_HEARTBEAT_SECONDS)
+                try:
+                    await grading_queue.heartbeat(worker_id)
+                except Exception as e:
+                    logger.error(f"Grading worker {worker_id} heartbeat failed: {e}")
+
+        async def next_tasks():
+            nonlocal last_requeue
+            while not stop_event.is_set():
+                if last_requeue is None or loop.time() - last_requeue >= GRADING_QUEUE_REQUEUE_INTERVAL:
+                    last_requeue = loop.time()
+                    try:
+                        await grading_queue.requeue_stale()
+                    except Exception as e:
+                        logger.error(f"Failed to re-queue stale grading tasks: {e}")
+
+                if not claimed:
+                    # One slot is already held for the task we are about to hand out
+                    free_slots = max(1, limiter.limit - limiter.in_flight + 1)
+                    try:
+                        tasks = await grading_queue.claim(worker_id, free_slots)
+                        missing = [
+                            (task["task_id"], "Submission no longer exists")
+                            for task in tasks if task["submission"] is None
+                        ]
+                        if missing:
+                            await grading_queue.fail_tasks(worker_id, missing)
+                    except Exception as e:
+                        logger.error(f"Failed to claim grading tasks: {e}")
+                        tasks = []
+                    claimed.extend(task for task in tasks if task["submission"] is not None)
+
+                if claimed:
+                    yield claimed.popleft()
+                    continue
+
+                # Queue is empty: persist what is buffered, then wait for more work
+                await flush_results()
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=GRADING_QUEUE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+        def on_done(task: Dict, result: Optional[Dict], exc: Optional[BaseException]):
+            if exc is not None:
+                logger.error(f"Submission {task['submission']['id']} failed: {exc}")
+            self.worker_stats.update({
+                "worker_id": worker_id,
+                "scheduler": limiter.stats(),
+                "result_cache": self.leetcode_api.result_cache.stats()
+            })
+
+        logger.info(f"Grading worker {worker_id} started")
+        heartbeat_task = asyncio.create_task(send_heartbeats())
         try:
-            # Process submissions in batches of 3 to avoid overwhelming Judge0
-            batch_size = 3
-            for i in range(0, total_submissions, batch_size):
-                batch = submissions[i:i + batch_size]
-                
-                # Process batch concurrently
-                tasks = [
-                    self.process_single_submission(submission) 
-                    for submission in batch
-                ]
-                
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                # Update progress
-                for result in results:
-                    if isinstance(result, Exception):
-                        failed += 1
-                        self.processing_jobs[job_id]["errors"].append(str(result))
-                        logger.error(f"Submission processing failed: {result}")
-                    else:
-                        completed += 1
-                
-                # Update job status
-                self.processing_jobs[job_id].update({
-                    "completed": completed,
-                    "failed": failed
-                })
-                
-                # Longer delay between batches to avoid rate limiting
-                await asyncio.sleep(2)
-                
-        except Exception as e:
-            logger.error(f"Batch processing failed: {e}")
-            self.processing_jobs[job_id]["status"] = "failed"
-            self.processing_jobs[job_id]["error"] = str(e)
-            return
+            # Sliding window over the queue: a task is only claimed once a slot
+            # is free, with the window size adapted to how Judge0 is coping
+            await run_adaptive(
+                next_tasks(),
+                lambda task: self.process_task(task, TaskResultWriter(result_writer, task["task_id"])),
+                limiter,
+                on_done=on_done,
+                is_error=lambda result: bool(result) and result.get("status") == "internal_error",
+                queue_depth_probe=self.leetcode_api.get_queue_depth,
+            )
         finally:
-            # ✅ FIX: Close session when batch is done
-            await self.leetcode_api.close_session()
-            
-        # Mark job as completed
-        self.processing_jobs[job_id]["status"] = "completed"
-        self.processing_jobs[job_id]["end_time"] = datetime.utcnow().isoformat()
-        
-    async def process_single_submission(self, submission: Dict) -> Dict[str, Any]:
+            heartbeat_task.cancel()
+            await flush_results()
+            # Anything still running under our id (claimed but never started,
+            # or cut short) goes straight back to the queue
+            try:
+                released = await grading_queue.release(worker_id)
+                if released:
+                    logger.info(f"Grading worker {worker_id} released {released} unfinished tasks")
+            except Exception as e:
+                logger.error(f"Failed to release grading tasks: {e}")
+            logger.info(f"Grading worker {worker_id} stopped")
+
+    async def process_task(self, task: Dict, result_writer: SubmissionResultWriter) -> Dict[str, Any]:
+        """Grade a claimed task's submission, or re-grade it for re-grade jobs"""
+        if task.get("mode") == regrade.JOB_MODE_REGRADE:
+            return await self.regrade_submission(task["submission"], result_writer)
+        return await self.process_single_submission(task["submission"], result_writer)
+
+    async def regrade_submission(
+        self,
+        submission: Dict,
+        result_writer: Optional[SubmissionResultWriter] = None
+    ) -> Dict[str, Any]:
+        """
+        Re-run only the test cases that changed since the submission's latest
+        result was graded, merge them into that result and recompute its
+        score in place. Falls back to a full grade when the stored result
+        can't be merged into (see regrade.plan_regrade).
+        """
+        cached = await test_case_cache.get(
+            submission["question_id"],
+            prepare=self.leetcode_api.prepare_test_case
+        )
+        test_cases = cached.test_cases
+        stored = await grading_store.run_in_session(regrade.load_latest_result, UUID(submission["id"]))
+        rerun = regrade.plan_regrade(stored, test_cases) if stored and test_cases else None
+        if rerun is None:
+            return await self.process_single_submission(submission, result_writer)
+
+        try:
+            print(f"Re-grading submission {submission['id']}: {len(rerun)}/{len(test_cases)} test cases changed")
+            status_code = regrade.STATUS_CODE_ACCEPTED
+            new_details = []
+            if rerun:
+                language_id = self.leetcode_api.get_language_id(submission["language"])
+                formatted = [cached.formatted[index] for index in rerun]
+                policy = EarlyExitPolicy.from_options(cached.options.get("early_exit"))
+                result = await self.leetcode_api.submit_solution(
+                    submission["source_code"],
+                    submission["language"],
+                    formatted,
+                    test_cases_fingerprint=fingerprint_test_cases((tc["stdin"], tc["expected"]) for tc in formatted),
+                    multi_test_harness=cached.options.get("multi_test_harness", False),
+                    cpu_time_limit=resolve_cpu_time_limit(
+                        cached.options.get("time_limit_seconds"),
+                        cached.options.get("reference_runtimes"),
+                        language_id
+                    ),
+                    # Stopping at the first failure would leave the stored tests
+                    # after it unscored; other stops only cut the re-run short
+                    early_exit=EarlyExitPolicy(policy.max_consecutive_tle, policy.stop_on_compile_error)
+                )
+                status_code = result.get("status_code", 99)
+                new_details = self.calculate_score(result, [test_cases[index] for index in rerun])["test_results"]["details"]
+
+            details = regrade.merge_details(stored, test_cases, rerun, new_details)
+            score_data = regrade.score_details(details, test_cases, status_code)
+            regraded = {
+                "id": stored["id"],
+                "submission_id": submission["id"],
+                "status": regrade.STATUS_CODES.get(score_data["status_code"], "internal_error"),
+                "score": int(score_data["score"]),
+                "max_score": int(score_data["max_score"]),
+                "test_results": score_data["test_results"],
+                "extra_data": regrade.regraded_extra_data(stored, test_cases, rerun),
+            }
+        except Exception as e:
+            logger.error(f"Failed to re-grade submission {submission['id']}: {e}")
+            # Keep the stored result as it was; only note the failure on it
+            regraded = {
+                "id": stored["id"],
+                "submission_id": submission["id"],
+                "extra_data": {**stored["extra_data"], "regrade_error": str(e), "error": str(e)},
+            }
+            if result_writer is not None:
+                await result_writer.add(regraded)
+            raise
+
+        if result_writer is not None:
+            await result_writer.add(regraded)
+        else:
+            await grading_store.run_in_session(grading_store.update_submission_results, [regraded])
+        return regraded
+
+    async def process_single_submission(
+        self,
+        submission: Dict,
+        result_writer: Optional[SubmissionResultWriter] = None
+    ) -> Dict[str, Any]:
         """Process a single submission"""
         try:
             print(f"\n{'='*60}")
             print(f"Processing submission {submission['id']}")
             print(f"{'='*60}")
             
-            # Get test cases for the question
-            test_cases = await self.get_test_cases(submission["question_id"])
+            # Get test cases for the question (cached per question, already formatted for Judge0)
+            cached = await test_case_cache.get(
+                submission["question_id"],
+                prepare=self.leetcode_api.prepare_test_case
+            )
+            test_cases = cached.test_cases
             
             if not test_cases:
                 raise Exception(f"No test cases found for question {submission['question_id']}")
             
-            # Format test cases for Judge0
-            formatted_test_cases = []
-            for tc in test_cases:
-                formatted_test_cases.append({
-                    "input": tc["input_data"],
-                    "output": tc["expected_output"]
-                })
+            formatted_test_cases = cached.formatted
             
-            print(f"Running {len(formatted_test_cases)} test cases")
+            cpu_time_limit = resolve_cpu_time_limit(
+                cached.options.get("time_limit_seconds"),
+                cached.options.get("reference_runtimes"),
+                self.leetcode_api.get_language_id(submission["language"])
+            )
+            print(f"Running {len(formatted_test_cases)} test cases ({cpu_time_limit}s CPU each)")
             
             # Run the submission against test cases using Judge0
             result = await self.leetcode_api.submit_solution(
                 submission["source_code"],
                 submission["language"],
-                formatted_test_cases
+                formatted_test_cases,
+                test_cases_fingerprint=cached.content_fingerprint,
+                multi_test_harness=cached.options.get("multi_test_harness", False),
+                cpu_time_limit=cpu_time_limit,
+                early_exit=EarlyExitPolicy.from_options(cached.options.get("early_exit"))
             )
             
-            print(f"\nJudge0 Final Result:")
+            print("\nJudge0 Final Result:")
             print(f"  Status Code: {result.get('status_code')}")
             print(f"  Passed: {result.get('total_correct')}/{result.get('total_testcases')}")
             
@@ -383,14 +1105,18 @@ class SubmissionProcessor:
                 "score": int(score_data["score"]),
                 "max_score": int(score_data["max_score"]),
                 "test_results": score_data["test_results"],
-                "extra_data": {"judge0_response": result},
+                "extra_data": {
+                    "judge0_response": result,
+                    # What incremental re-grades compare against (see regrade)
+                    regrade.FINGERPRINT_KEY: regrade.test_set_fingerprint(test_cases)
+                },
                 "submission_id": str(submission["id"])
             }
             
-            print(f"\nSaving submission result...")
+            print("\nSaving submission result...")
             
             # Save submission result
-            await self.save_submission_result(submission_result)
+            await self.save_submission_result(submission_result, result_writer)
             
             print(f"✅ Successfully processed submission {submission['id']}\n")
             
@@ -418,28 +1144,12 @@ class SubmissionProcessor:
             }
             
             try:
-                await self.save_submission_result(failed_result)
+                await self.save_submission_result(failed_result, result_writer)
             except Exception as save_error:
                 print(f"Failed to save error result: {save_error}")
             
             raise e
     
-    async def get_test_cases(self, question_id: str) -> List[Dict]:
-        """Fetch test cases for a question"""
-        async with aiohttp.ClientSession() as session:
-            host_ip = os.getenv("VITE_HOST_IP")
-            async with session.get(
-                f"http://{host_ip}:8000/questions/{question_id}/test-cases/",
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                if response.status == 200:
-                    test_cases = await response.json()
-                    print(f"Fetched {len(test_cases)} test cases for question {question_id}")
-                    return test_cases
-                else:
-                    error_text = await response.text()
-                    raise Exception(f"Failed to fetch test cases: {response.status} - {error_text}")
-    
     def calculate_score(self, result: Dict, test_cases: List[Dict]) -> Dict:
         """Calculate score based on test results"""
         total_weight = sum(tc.get("weight", 1) for tc in test_cases)
@@ -468,6 +1178,8 @@ class SubmissionProcessor:
                 "expected": tc["expected_output"],
                 "actual": test_result.get("actual", ""),
                 "status": test_result.get("status", "Unknown"),
+                "skipped": test_result.get("skipped", False),
+                "fingerprint": regrade.test_case_fingerprint(tc),
                 "time": test_result.get("time", "0"),
                 "memory": test_result.get("memory", "0")
             })
@@ -478,12 +1190,17 @@ class SubmissionProcessor:
             "test_results": {
                 "total_tests": len(test_cases),
                 "passed_tests": total_correct,
+                "skipped_tests": result.get("total_skipped", 0),
                 "status_code": result.get("status_code", 99),
                 "details": detailed_results
             }
         }
     
-    async def save_submission_result(self, result: Dict):
+    async def save_submission_result(
+        self,
+        result: Dict,
+        result_writer: Optional[SubmissionResultWriter] = None
+    ):
         """Save submission result to database"""
         
         # Ensure all fields match the exact schema from your CURL command
@@ -506,35 +1223,18 @@ class SubmissionProcessor:
         # Debug logging to see what we're sending
         print(f"Saving submission result for {submission_result_data['submission_id']}")
         
-        async with aiohttp.ClientSession() as session:
-            host_ip = os.getenv("VITE_HOST_IP")
-            async with session.post(
-                f"http://{host_ip}:8000/submission-results/",
-                json=submission_result_data,
-                headers={
-                    "accept": "application/json",
-                    "Content-Type": "application/json"
-                },
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                if response.status not in [200, 201]:
-                    # Get detailed error information
-                    error_text = await response.text()
-                    print(f"Failed to save submission result. Status: {response.status}")
-                    print(f"Error response: {error_text}")
-                    print(f"Sent data: {json.dumps(submission_result_data, indent=2)}")
-                    raise Exception(f"Failed to save submission result: {response.status} - {error_text}")
-                else:
-                    print(f"✅ Successfully saved submission result with status: {response.status}")
-    
-    def get_job_status(self, job_id: str) -> Optional[Dict]:
-        """Get processing job status"""
-        return self.processing_jobs.get(job_id)
-    
-    def cleanup_job(self, job_id: str):
-        """Clean up completed job from memory"""
-        if job_id in self.processing_jobs:
-            del self.processing_jobs[job_id]
+        if result_writer is not None:
+            # Buffered: written in bulk with the rest of the job
+            await result_writer.add(submission_result_data)
+            return
+        
+        try:
+            await grading_store.save_submission_results([submission_result_data])
+        except Exception as e:
+            print(f"Failed to save submission result: {e}")
+            print(f"Sent data: {json.dumps(submission_result_data, indent=2)}")
+            raise Exception(f"Failed to save submission result: {e}")
+        print("✅ Successfully saved submission result")
 
 
 # Global processor instance
@@ -0,0 +1,140 @@
+"""
+Test Case Cache
+Bounded per-question cache of test cases (and their Judge0-ready stdin /
+expected output) for the grading pipeline
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal
+from .grading_store import load_question_grading_options, load_test_cases
+from .result_cache import fingerprint_test_cases
+
+logger = logging.getLogger(__name__)
+
+TEST_CASE_CACHE_SIZE = int(os.getenv("GRADING_TEST_CASE_CACHE_SIZE", "256"))
+# How long an entry is trusted before its fingerprint is re-checked. Edits made
+# through this process invalidate immediately; this bounds staleness for edits
+# made through other API workers.
+TEST_CASE_CACHE_REVALIDATE_SECONDS = float(os.getenv("GRADING_TEST_CASE_CACHE_REVALIDATE_SECONDS", "5"))
+
+
+def load_test_case_fingerprint(db: Session, question_id: UUID) -> str:
+    """
+    Version of a question's test cases: max(updated_at) plus row count, and
+    the question's own updated_at for its grading options
+    """
+    last_updated, count = db.query(
+        func.max(models.QuestionTestCase.updated_at),
+        func.count(models.QuestionTestCase.id),
+    ).filter(models.QuestionTestCase.question_id == question_id).one()
+    question_updated = db.query(models.Question.updated_at).filter(models.Question.id == question_id).scalar()
+    return (
+        f"{last_updated.isoformat() if last_updated else '-'}:{count}:"
+        f"{question_updated.isoformat() if question_updated else '-'}"
+    )
+
+
+class CachedTestCases:
+    """One question's test cases as graded, with their fingerprint"""
+
+    def __init__(
+        self,
+        fingerprint: str,
+        test_cases: List[Dict[str, Any]],
+        formatted: List[Dict[str, Any]],
+        options: Optional[Dict[str, Any]] = None,
+    ):
+        self.fingerprint = fingerprint
+        self.test_cases = test_cases
+        # Judge0-ready form: {"input", "output", "stdin", "expected"}
+        self.formatted = formatted
+        # Question-level grading switches (see load_question_grading_options)
+        self.options = options or {}
+        # Content hash used to key execution results (see result_cache)
+        self.content_fingerprint = fingerprint_test_cases(
+            (tc["stdin"], tc["expected"]) for tc in formatted
+        )
+        self.checked_at = time.monotonic()
+
+
+class TestCaseCache:
+    def __init__(
+        self,
+        max_entries: int = TEST_CASE_CACHE_SIZE,
+        revalidate_seconds: float = TEST_CASE_CACHE_REVALIDATE_SECONDS,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: "OrderedDict[str, CachedTestCases]" = OrderedDict()
+        # Entries are read and filled from worker threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(
+        self,
+        question_id: str,
+        prepare: Callable[[Dict[str, Any]], Dict[str, Any]],
+    ) -> CachedTestCases:
+        """Test cases for a question, reloaded only when their fingerprint changed"""
+        return await asyncio.to_thread(self._get_sync, str(question_id), prepare)
+
+    def _get_sync(self, question_id: str, prepare) -> CachedTestCases:
+        with self._lock:
+            entry = self._entries.get(question_id)
+            if entry and time.monotonic() - entry.checked_at < self.revalidate_seconds:
+                self._entries.move_to_end(question_id)
+                self.hits += 1
+                return entry
+
+        db = SessionLocal()
+        try:
+            fingerprint = load_test_case_fingerprint(db, UUID(question_id))
+            if entry and entry.fingerprint == fingerprint:
+                with self._lock:
+                    entry.checked_at = time.monotonic()
+                    if question_id in self._entries:
+                        self._entries.move_to_end(question_id)
+                    self.hits += 1
+                return entry
+
+            test_cases = load_test_cases(db, UUID(question_id))
+            options = load_question_grading_options(db, UUID(question_id))
+        finally:
+            db.close()
+
+        entry = CachedTestCases(fingerprint, test_cases, [prepare(tc) for tc in test_cases], options)
+        with self._lock:
+            self.misses += 1
+            self._entries[question_id] = entry
+            self._entries.move_to_end(question_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, question_id: Optional[Any] = None):
+        """Drop one question's entry, or everything when question_id is None"""
+        with self._lock:
+            if question_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(question_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Global cache shared by the grader and the test-case endpoints
+test_case_cache = TestCaseCache()
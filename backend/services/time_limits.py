@@ -0,0 +1,79 @@
+"""
+Time Limits
+Per-question Judge0 CPU limits: Question.time_limit_seconds, optionally
+tightened by an adaptive limit calibrated from a reference solution's
+measured runtime times a safety factor
+"""
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Ceiling for any per-test CPU limit (must stay <= MAX_CPU_TIME_LIMIT in judge0.conf).
+# Questions default to time_limit_seconds=30, so this is what most of them get.
+GRADING_MAX_CPU_TIME_LIMIT = float(os.getenv("GRADING_MAX_CPU_TIME_LIMIT", "5"))
+# Floor, so a very fast reference solution doesn't make limits flaky
+GRADING_MIN_CPU_TIME_LIMIT = float(os.getenv("GRADING_MIN_CPU_TIME_LIMIT", "0.5"))
+# Adaptive limit = slowest reference test x this factor
+TIME_LIMIT_SAFETY_FACTOR = float(os.getenv("TIME_LIMIT_SAFETY_FACTOR", "3"))
+# Wall clock allowed per test, as a multiple of its CPU limit (I/O, sleeps)
+WALL_TIME_LIMIT_FACTOR = 2.0
+# MAX_WALL_TIME_LIMIT in judge0.conf
+JUDGE0_MAX_WALL_TIME_LIMIT = float(os.getenv("JUDGE0_MAX_WALL_TIME_LIMIT", "20"))
+
+# Question.extra_data key holding calibrations, by Judge0 language id
+REFERENCE_RUNTIMES_KEY = "reference_runtimes"
+
+
+def resolve_cpu_time_limit(
+    time_limit_seconds: Optional[float] = None,
+    reference_runtimes: Optional[Dict[str, Any]] = None,
+    language_id: Optional[int] = None,
+) -> float:
+    """
+    Per-test CPU seconds for a question: its own limit, tightened by a
+    calibration for the same language if there is one, within the
+    configured floor and ceiling
+    """
+    limit = GRADING_MAX_CPU_TIME_LIMIT
+    if time_limit_seconds:
+        limit = min(limit, float(time_limit_seconds))
+
+    calibration = (reference_runtimes or {}).get(str(language_id)) if language_id is not None else None
+    if calibration:
+        limit = min(limit, calibration["time_ms"] / 1000 * calibration.get("safety_factor", TIME_LIMIT_SAFETY_FACTOR))
+
+    return round(max(GRADING_MIN_CPU_TIME_LIMIT, limit), 3)
+
+
+def sandbox_time_limits(cpu_time_limit: float) -> Dict[str, float]:
+    """Judge0 cpu/wall limit fields for one test"""
+    return {
+        "cpu_time_limit": cpu_time_limit,
+        "wall_time_limit": round(min(cpu_time_limit * WALL_TIME_LIMIT_FACTOR, JUDGE0_MAX_WALL_TIME_LIMIT), 3),
+    }
+
+
+def build_calibration(
+    test_results: List[Dict[str, Any]],
+    language_id: int,
+    safety_factor: float = TIME_LIMIT_SAFETY_FACTOR,
+) -> Dict[str, Any]:
+    """
+    Calibration entry from a reference run's per-test results. Raises
+    ValueError unless every test passed, since a failing reference says
+    nothing about how long a correct solution needs.
+    """
+    if not test_results:
+        raise ValueError("Reference solution produced no test results")
+    failed = [r.get("test_case") for r in test_results if not r.get("passed")]
+    if failed:
+        raise ValueError(f"Reference solution failed test cases {failed}")
+
+    slowest = max(float(r.get("time") or 0) for r in test_results)
+    return {
+        "language_id": language_id,
+        "time_ms": int(round(slowest * 1000)),
+        "safety_factor": safety_factor,
+        "test_cases": len(test_results),
+        "calibrated_at": datetime.now().isoformat(),
+    }
@@ -0,0 +1,113 @@
+"""Which of a student's attempts gets graded under each attempt policy"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.benchmarks.grading_benchmark import cleanup, seed_exam
+from backend.services import attempt_selection
+from backend.services.attempt_selection import (
+    ATTEMPTS_ALL,
+    ATTEMPTS_BEST,
+    ATTEMPTS_LATEST,
+    iter_attempt_pages,
+    resolve_attempt_policy,
+)
+
+
+def test_resolve_attempt_policy():
+    assert resolve_attempt_policy(None) == attempt_selection.GRADING_ATTEMPT_POLICY
+    assert resolve_attempt_policy({"grading_attempts": "Best"}) == ATTEMPTS_BEST
+    assert resolve_attempt_policy({"grading_attempts": "best"}, "all") == ATTEMPTS_ALL
+    with pytest.raises(ValueError):
+        resolve_attempt_policy({"grading_attempts": "first"})
+
+
+def selected_attempts(db, exam_id, policy):
+    selected, superseded = [], []
+    # Pages of one group, so the keyset step is exercised too
+    for page, page_superseded in iter_attempt_pages(db, exam_id, policy, chunk_size=1):
+        selected += page
+        superseded += page_superseded
+    return selected, superseded
+
+
+def add_attempts(db, seeded, first, count):
+    """Later attempts by the same student at the same question as `first`"""
+    original = db.get(models.Submission, first)
+    attempts = [first]
+    for attempt_number in range(2, count + 2):
+        attempt = models.Submission(
+            exam_id=original.exam_id, question_id=original.question_id, student_id=original.student_id,
+            source_code=f"# attempt {attempt_number}\n", language=original.language,
+            attempt_number=attempt_number,
+            submitted_at=datetime.utcnow() + timedelta(minutes=attempt_number),
+        )
+        db.add(attempt)
+        db.flush()
+        attempts.append(attempt.id)
+        seeded["submission_ids"].append(attempt.id)
+    db.commit()
+    return attempts
+
+
+def add_result(db, submission_id, score):
+    db.add(models.SubmissionResult(
+        submission_id=submission_id, status=models.ExecutionStatus.WRONG_ANSWER, score=score, max_score=100,
+    ))
+    db.commit()
+
+
+def test_attempt_policies(db):
+    seeded = seed_exam(db, f"attempts-{uuid.uuid4().hex[:8]}", 2, 1, 1)
+    try:
+        first, other = seeded["submission_ids"]
+        attempts = add_attempts(db, seeded, first, 2)
+        # Attempt 1 scored best; attempt 3 was never graded
+        add_result(db, attempts[0], 90)
+        add_result(db, attempts[1], 50)
+        exam_id = seeded["exam_id"]
+
+        selected, superseded = selected_attempts(db, exam_id, ATTEMPTS_LATEST)
+        assert sorted(selected, key=str) == sorted([attempts[2], other], key=str)
+        assert sorted(superseded, key=str) == sorted([(attempts[0], attempts[2]), (attempts[1], attempts[2])], key=str)
+
+        # best: attempt 3 has no score yet, so it is graded and nothing is skipped
+        selected, superseded = selected_attempts(db, exam_id, ATTEMPTS_BEST)
+        assert sorted(selected, key=str) == sorted([attempts[2], other], key=str)
+        assert superseded == []
+        add_result(db, attempts[2], 70)
+        add_result(db, other, 10)
+        selected, superseded = selected_attempts(db, exam_id, ATTEMPTS_BEST)
+        assert sorted(selected, key=str) == sorted([attempts[0], other], key=str)
+        assert sorted(superseded, key=str) == sorted([(attempts[1], attempts[0]), (attempts[2], attempts[0])], key=str)
+
+        selected, superseded = selected_attempts(db, exam_id, ATTEMPTS_ALL)
+        assert sorted(selected, key=str) == sorted(attempts + [other], key=str)
+        assert superseded == []
+    finally:
+        db.rollback()
+        cleanup(db, seeded)
+
+
+def test_best_grades_every_ungraded_attempt_first(db):
+    seeded = seed_exam(db, f"attempts-{uuid.uuid4().hex[:8]}", 1, 1, 1)
+    try:
+        earlier, later = add_attempts(db, seeded, seeded["submission_ids"][0], 1)
+        exam_id = seeded["exam_id"]
+
+        # Neither is graded: both are queued, neither is skipped
+        selected, superseded = selected_attempts(db, exam_id, ATTEMPTS_BEST)
+        assert sorted(selected, key=str) == sorted([earlier, later], key=str)
+        assert superseded == []
+
+        # Once both have a score the earlier, better one wins
+        add_result(db, earlier, 80)
+        add_result(db, later, 40)
+        selected, superseded = selected_attempts(db, exam_id, ATTEMPTS_BEST)
+        assert selected == [earlier]
+        assert superseded == [(later, earlier)]
+    finally:
+        db.rollback()
+        cleanup(db, seeded)
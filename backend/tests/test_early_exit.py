@@ -0,0 +1,49 @@
+"""EarlyExitPolicy stop points and how cut-off tests are reported"""
+from backend.services.early_exit import SKIPPED_STATUS, EarlyExitPolicy
+
+PASSED = {"status_id": 3, "passed": True}
+WRONG = {"status_id": 4, "passed": False}
+TLE = {"status_id": 5, "passed": False}
+COMPILE_ERROR = {"status_id": 6, "passed": False}
+
+
+def test_no_stop_without_trigger():
+    policy = EarlyExitPolicy(max_consecutive_tle=2, stop_on_compile_error=True)
+    assert policy.stop_point([PASSED, TLE, WRONG, TLE, PASSED]) is None
+
+
+def test_stop_reasons():
+    assert EarlyExitPolicy(0, True).stop_point([COMPILE_ERROR, COMPILE_ERROR]) == (0, "compile_error")
+    assert EarlyExitPolicy(0, False).stop_point([COMPILE_ERROR, PASSED]) is None
+    first_failure = EarlyExitPolicy(0, False, stop_on_first_failure=True)
+    assert first_failure.stop_point([PASSED, WRONG, PASSED]) == (1, "first_failure")
+    assert EarlyExitPolicy(2, False).stop_point([TLE, PASSED, TLE, TLE, PASSED]) == (3, "consecutive_tle")
+
+
+def test_stop_point_only_looks_at_finished_prefix():
+    policy = EarlyExitPolicy(max_consecutive_tle=2, stop_on_compile_error=False)
+    assert policy.stop_point([TLE, None, TLE]) is None
+
+
+def test_apply_marks_everything_after_the_stop_skipped():
+    policy = EarlyExitPolicy(max_consecutive_tle=2, stop_on_compile_error=False)
+    # The last test happened to run before the stop was seen; it is still skipped
+    applied = policy.apply([PASSED, TLE, TLE, PASSED], total=5)
+    assert applied[:3] == [PASSED, TLE, TLE]
+    assert [r["test_case"] for r in applied[3:]] == [4, 5]
+    assert all(r["skipped"] and r["skip_reason"] == "consecutive_tle" for r in applied[3:])
+    assert all(r["status"] == SKIPPED_STATUS and not r["passed"] for r in applied[3:])
+
+
+def test_apply_pads_unrun_tests_as_not_run():
+    applied = EarlyExitPolicy(0, False).apply([PASSED, None], total=3)
+    assert applied[0] == PASSED
+    assert [(r["test_case"], r["skip_reason"]) for r in applied[1:]] == [(2, "not_run"), (3, "not_run")]
+
+
+def test_from_options_keeps_defaults_for_missing_keys():
+    policy = EarlyExitPolicy.from_options({"max_consecutive_tle": 3})
+    assert policy.max_consecutive_tle == 3
+    assert policy.stop_on_first_failure is False
+    assert policy.incremental
+    assert not EarlyExitPolicy.from_options({"max_consecutive_tle": 0}).incremental
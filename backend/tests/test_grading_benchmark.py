@@ -0,0 +1,10 @@
+"""Smoke run of the grading benchmark at a tiny size (needs Postgres)"""
+from backend.benchmarks import grading_benchmark
+
+
+def test_benchmark_grades_every_submission(database, capsys):
+    exit_code = grading_benchmark.main([
+        "--students", "3", "--questions", "2", "--tests", "2",
+        "--latency-ms", "1", "--jitter-ms", "0", "--timeout", "120",
+    ])
+    assert exit_code == 0, capsys.readouterr().out
@@ -0,0 +1,13 @@
+"""Import smoke test: the app, the grading worker and the benchmark load"""
+import importlib
+
+import pytest
+
+
+@pytest.mark.parametrize("module", [
+    "backend.main",
+    "backend.services.grader",
+    "backend.benchmarks.grading_benchmark",
+])
+def test_module_imports(module):
+    importlib.import_module(module)
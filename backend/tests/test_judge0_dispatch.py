@@ -0,0 +1,63 @@
+"""Judge0 dispatch: grading takes slots per batch chunk, not per submission"""
+import asyncio
+
+from backend.benchmarks.judge0_stub import Judge0Stub, StubConfig
+from backend.services import submission_processor
+from backend.services.early_exit import EarlyExitPolicy
+from backend.services.judge0_client import Judge0Client
+from backend.services.judge0_dispatch import LANE_BULK, Judge0Dispatcher
+
+
+def test_dispatcher_keeps_bulk_out_of_reserved_share():
+    async def scenario():
+        dispatcher = Judge0Dispatcher(capacity=8, interactive_reserved=2)
+        await dispatcher.acquire(LANE_BULK, dispatcher.weight_for(LANE_BULK, 20))
+        assert dispatcher.lanes[LANE_BULK].in_flight == 6
+        # The reserved share is left for interactive runs
+        await asyncio.wait_for(dispatcher.acquire("interactive", 2), timeout=1)
+        assert dispatcher.stats()["in_flight"] == 8
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_gradings_share_the_bulk_lane(monkeypatch):
+    # Lane of 8 slots, batches of 4: two 8-test submissions checked batch by
+    # batch. Holding slots for whole submissions ran them one after the
+    # other with half of Judge0 idle; per batch both run side by side.
+    dispatcher = Judge0Dispatcher(capacity=8, interactive_reserved=0)
+    monkeypatch.setattr(submission_processor, "judge0_dispatcher", dispatcher)
+    monkeypatch.setattr(submission_processor, "JUDGE0_BATCH_SIZE", 4)
+    test_cases = [{"input": str(i), "output": str(i)} for i in range(8)]
+
+    async def scenario():
+        stub = Judge0Stub(StubConfig(workers=8, latency_ms=200, verdicts={"accepted": 1}))
+        url = await stub.start()
+        client = Judge0Client(url)
+        api = submission_processor.LeetCodeAPI(url, use_batch=True, use_callbacks=False, client=client)
+        peak = {"working": 0, "in_flight": 0}
+
+        async def sample():
+            while True:
+                peak["working"] = max(peak["working"], stub.busy)
+                peak["in_flight"] = max(peak["in_flight"], dispatcher.stats()["in_flight"])
+                await asyncio.sleep(0.01)
+
+        sampler = asyncio.create_task(sample())
+        try:
+            return await asyncio.gather(*(
+                api.run_test_cases_per_test(
+                    f"print({n})", 71, test_cases, early_exit=EarlyExitPolicy(stop_on_first_failure=True)
+                )
+                for n in range(2)
+            )), peak
+        finally:
+            sampler.cancel()
+            await client.close()
+            await stub.stop()
+
+    runs, peak = asyncio.run(scenario())
+    assert all(len(results) == 8 and all(r["passed"] for r in results) for results in runs)
+    # Each submission has one batch of 4 in Judge0 at a time
+    assert peak["working"] == 8
+    assert peak["in_flight"] == 8
+    assert dispatcher.stats()["in_flight"] == 0
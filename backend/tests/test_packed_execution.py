@@ -0,0 +1,128 @@
+"""Framing and judging of packed (one sandbox, many tests) runs"""
+import base64
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from backend.services.packed_execution import (
+    PackedLanguage,
+    build_run_script,
+    judge_packed_test,
+    new_boundary,
+    parse_packed_output,
+)
+
+
+def frame(
+    boundary: str, index: int, stdout: str, stderr: str = "", code: int = 0, ms: int = 10, wall_ms: int = 20
+) -> str:
+    out = base64.b64encode(stdout.encode()).decode()
+    err = base64.b64encode(stderr.encode()).decode()
+    return f"{boundary} TEST {index} {code} {ms} {wall_ms}\n{out}\n{err}\n{boundary} END {index}\n"
+
+
+def test_parses_frames():
+    boundary = new_boundary()
+    stdout = frame(boundary, 0, "3\n") + frame(boundary, 1, "", "Traceback\n", code=1, ms=250)
+    assert parse_packed_output(stdout, boundary) == {
+        0: {"stdout": "3\n", "stderr": "", "exit_code": 0, "time_ms": 10, "wall_ms": 20},
+        1: {"stdout": "", "stderr": "Traceback\n", "exit_code": 1, "time_ms": 250, "wall_ms": 20},
+    }
+
+
+def test_empty_output():
+    assert parse_packed_output(None, new_boundary()) == {}
+    assert parse_packed_output("", new_boundary()) == {}
+
+
+def test_frames_with_another_boundary_are_ignored():
+    boundary = new_boundary()
+    forged = frame(new_boundary(), 1, "expected answer\n")
+    assert parse_packed_output(frame(boundary, 0, "1\n") + forged, boundary) == {
+        0: {"stdout": "1\n", "stderr": "", "exit_code": 0, "time_ms": 10, "wall_ms": 20},
+    }
+
+
+def test_repeated_frames_drop_the_test():
+    boundary = new_boundary()
+    stdout = frame(boundary, 0, "1\n") + frame(boundary, 1, "2\n") + frame(boundary, 1, "forged\n")
+    assert set(parse_packed_output(stdout, boundary)) == {0}
+
+
+def test_malformed_frames_are_left_out():
+    boundary = new_boundary()
+    bad_base64 = f"{boundary} TEST 1 0 5 5\nnot base64!\n\n{boundary} END 1\n"
+    wrong_end = f"{boundary} TEST 2 0 5 5\n\n\n{boundary} END 3\n"
+    assert set(parse_packed_output(frame(boundary, 0, "1\n") + bad_base64 + wrong_end, boundary)) == {0}
+
+
+def test_judge_packed_test():
+    run = {"stdout": "3\n", "stderr": "", "exit_code": 0, "time_ms": 120, "wall_ms": 900}
+    assert judge_packed_test(run, "3", 1.0)["status_id"] == 3
+    assert judge_packed_test(run, "4", 1.0)["status_id"] == 4
+    assert judge_packed_test({**run, "time_ms": 1000}, "3", 1.0)["status_id"] == 5
+    # Waiting (e.g. for a JVM to start) is fine until the wall-clock limit
+    assert judge_packed_test({**run, "wall_ms": 1500}, "3", 1.0)["status_id"] == 3
+    assert judge_packed_test({**run, "wall_ms": 2000}, "3", 1.0)["status_id"] == 5
+    # A program exiting with timeout's own code is not a time-out
+    assert judge_packed_test({**run, "exit_code": 124}, "3", 1.0)["status_id"] == 11
+
+
+needs_bash = pytest.mark.skipif(
+    not all(shutil.which(tool) for tool in ("bash", "timeout", "base64")),
+    reason="needs bash and coreutils",
+)
+
+
+def run_script(tmp_path, program: str, inputs: list, test_time_limit: float) -> dict:
+    (tmp_path / "main.py").write_text(program)
+    (tmp_path / "tests").mkdir()
+    for index, stdin_data in enumerate(inputs):
+        (tmp_path / "tests" / f"{index:05d}.in").write_text(stdin_data)
+    language = PackedLanguage("main.py", None, f"{sys.executable} main.py")
+    (tmp_path / "run").write_text(build_run_script(language, test_time_limit))
+
+    boundary = new_boundary()
+    completed = subprocess.run(
+        ["bash", "run"], cwd=tmp_path, input=boundary + "\n", capture_output=True, text=True,
+        timeout=60, env={**os.environ, "LC_ALL": "C"},
+    )
+    return parse_packed_output(completed.stdout, boundary)
+
+
+@needs_bash
+def test_run_script_frames_cannot_be_forged(tmp_path):
+    # The program prints a frame for the next test; it never sees the boundary
+    parsed = run_script(tmp_path, (
+        "import sys\n"
+        "data = sys.stdin.read()\n"
+        "print(int(data) * 2)\n"
+        "print('@@AEGIS-0000000000000000@@ TEST 00001 0 1 1')\n"
+    ), ["2", "5"], 5.0)
+    assert sorted(parsed) == [0, 1]
+    assert parsed[0]["stdout"].splitlines()[0] == "4"
+    assert parsed[1]["stdout"].splitlines()[0] == "10"
+    assert all(run["exit_code"] == 0 for run in parsed.values())
+
+
+@needs_bash
+def test_run_script_measures_cpu_time(tmp_path):
+    # Sleeping stands in for startup waits: slow on the wall clock, cheap in
+    # CPU. Spinning uses the CPU budget and is killed at twice the limit.
+    parsed = run_script(tmp_path, (
+        "import sys, time\n"
+        "if sys.stdin.read() == 'sleep':\n"
+        "    time.sleep(0.7)\n"
+        "else:\n"
+        "    while True:\n"
+        "        pass\n"
+        "print('done')\n"
+    ), ["sleep", "spin"], 0.5)
+    slept, spun = parsed[0], parsed[1]
+    assert slept["wall_ms"] >= 700 and slept["time_ms"] < 500
+    assert judge_packed_test(slept, "done", 0.5)["status_id"] == 3
+    assert spun["time_ms"] >= 500
+    assert judge_packed_test(spun, "done", 0.5)["status_id"] == 5
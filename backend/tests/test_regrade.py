@@ -0,0 +1,75 @@
+"""Incremental re-grading: which tests to re-run and how results are merged"""
+import uuid
+
+from backend import models
+from backend.benchmarks.grading_benchmark import cleanup, seed_exam
+from backend.services import regrade
+from backend.services.regrade import merge_details, plan_regrade, score_details
+
+TEST_CASES = [
+    {"id": "t1", "input_data": "1 2", "expected_output": "3", "weight": 1},
+    {"id": "t2", "input_data": "2 2", "expected_output": "4", "weight": 2},
+    {"id": "t3", "input_data": "3 2", "expected_output": "5", "weight": 3},
+]
+
+
+def graded(test_cases, passed, status_code=11, **test_results):
+    details = [
+        {
+            "test_case_id": tc["id"], "passed": ok, "weight": tc["weight"],
+            "fingerprint": regrade.test_case_fingerprint(tc),
+        }
+        for tc, ok in zip(test_cases, passed)
+    ]
+    return {"test_results": {"status_code": status_code, "details": details, **test_results}}
+
+
+def test_plan_regrade_reruns_only_changed_tests():
+    stored = graded(TEST_CASES, [True, False, True])
+    assert plan_regrade(stored, TEST_CASES) == []
+    edited = [TEST_CASES[0], {**TEST_CASES[1], "expected_output": "5"}, {**TEST_CASES[2], "weight": 9}]
+    assert plan_regrade(stored, edited) == [1]
+    added = TEST_CASES + [{"id": "t4", "input_data": "4 2", "expected_output": "6", "weight": 1}]
+    assert plan_regrade(stored, added) == [3]
+
+
+def test_plan_regrade_needs_full_regrade():
+    assert plan_regrade({}, TEST_CASES) is None
+    assert plan_regrade(graded(TEST_CASES, [False] * 3, status_code=20), TEST_CASES) is None
+    assert plan_regrade(graded(TEST_CASES, [True] * 3, error="Judge0 down"), TEST_CASES) is None
+    stopped = graded(TEST_CASES, [False] * 3)
+    stopped["test_results"]["details"][2]["skipped"] = True
+    assert plan_regrade(stopped, TEST_CASES) is None
+
+
+def test_merge_details_and_score():
+    stored = graded(TEST_CASES, [True, False, True])
+    edited = [{**TEST_CASES[0], "weight": 4}, {**TEST_CASES[1], "expected_output": "5"}, TEST_CASES[2]]
+    rerun = plan_regrade(stored, edited)
+    fresh = {"test_case_id": "t2", "passed": True, "weight": 2, "fingerprint": regrade.test_case_fingerprint(edited[1])}
+    merged = merge_details(stored, edited, rerun, [fresh])
+    assert [d["test_case_id"] for d in merged] == ["t1", "t2", "t3"]
+    assert merged[0]["weight"] == 4
+    assert merged[1] is fresh
+
+    score = score_details(merged, edited, 11)
+    assert (score["score"], score["max_score"], score["status_code"]) == (9, 9, 10)
+    merged[2] = {**merged[2], "passed": False}
+    score = score_details(merged, edited, 10)
+    assert (score["score"], score["max_score"], score["status_code"]) == (6, 9, 11)
+
+
+def test_exam_fingerprints_cover_questions_assigned_per_student(db):
+    seeded = seed_exam(db, f"regrade-{uuid.uuid4().hex[:8]}", 1, 2, 1)
+    try:
+        # Questions handed out per student (StudentExamQuestion) have no ExamQuestion row
+        db.query(models.ExamQuestion).filter(models.ExamQuestion.exam_id == seeded["exam_id"]).delete()
+        db.commit()
+        fingerprints = regrade.load_exam_fingerprints(db, seeded["exam_id"])
+        assert set(fingerprints) == set(seeded["question_ids"])
+        first = seeded["question_ids"][0]
+        assert list(regrade.load_exam_fingerprints(db, seeded["exam_id"], first)) == [first]
+        assert regrade.load_exam_fingerprints(db, seeded["exam_id"], uuid.uuid4()) == {}
+    finally:
+        db.rollback()
+        cleanup(db, seeded)
@@ -0,0 +1,87 @@
+"""Rescoring stored results after test case weights change"""
+import uuid
+
+from backend import models
+from backend.benchmarks.grading_benchmark import cleanup, seed_exam
+from backend.services import regrade
+from backend.services.grading_store import load_test_cases
+from backend.services.rescoring import load_exam_test_cases, rescore_exam_results, rescore_result
+
+TEST_CASES = [
+    {"id": "t1", "input_data": "1 2", "expected_output": "3", "weight": 1},
+    {"id": "t2", "input_data": "2 2", "expected_output": "4", "weight": 1},
+]
+
+
+def stored_results(test_cases, passed):
+    return {
+        "status_code": 11,
+        "details": [
+            {
+                "test_case_id": tc["id"], "passed": ok, "weight": tc["weight"],
+                "fingerprint": regrade.test_case_fingerprint(tc),
+            }
+            for tc, ok in zip(test_cases, passed)
+        ],
+    }
+
+
+def test_rescore_result_uses_current_weights():
+    reweighted = [TEST_CASES[0], {**TEST_CASES[1], "weight": 3}]
+    rescored = rescore_result(stored_results(TEST_CASES, [False, True]), reweighted)
+    # Proportional: half the tests passed, so half the new total weight
+    assert (rescored["score"], rescored["max_score"]) == (2, 4)
+    assert [d["weight"] for d in rescored["test_results"]["details"]] == [1, 3]
+
+
+def test_rescore_result_refuses_changed_tests():
+    stored = stored_results(TEST_CASES, [True, True])
+    assert rescore_result(stored, [TEST_CASES[0], {**TEST_CASES[1], "expected_output": "5"}]) is None
+    assert rescore_result(stored, TEST_CASES[:1]) is None
+    assert rescore_result(stored, [TEST_CASES[0], {**TEST_CASES[1], "id": "t3"}]) is None
+    assert rescore_result({}, TEST_CASES) is None
+
+
+def test_rescore_exam_results(db):
+    seeded = seed_exam(db, f"rescore-{uuid.uuid4().hex[:8]}", 1, 1, 2)
+    try:
+        question_id = seeded["question_ids"][0]
+        test_cases = load_test_cases(db, question_id)
+        db.add(models.SubmissionResult(
+            submission_id=seeded["submission_ids"][0],
+            status=models.ExecutionStatus.WRONG_ANSWER,
+            score=1,
+            max_score=2,
+            test_results=stored_results(test_cases, [False, True]),
+        ))
+        db.query(models.QuestionTestCase).filter(
+            models.QuestionTestCase.id == uuid.UUID(test_cases[1]["id"])
+        ).update({"weight": 4})
+        db.commit()
+
+        summary = rescore_exam_results(db, seeded["exam_id"])
+        assert (summary["results"], summary["rescored"], summary["needs_regrade"]) == (1, 1, 0)
+        result = db.query(models.SubmissionResult).filter(
+            models.SubmissionResult.submission_id == seeded["submission_ids"][0]
+        ).one()
+        db.refresh(result)
+        assert (result.score, result.max_score) == (2, 5)
+        assert "rescored_at" in result.extra_data
+        assert rescore_exam_results(db, seeded["exam_id"])["unchanged"] == 1
+    finally:
+        db.rollback()
+        cleanup(db, seeded)
+
+
+def test_exam_test_cases_cover_questions_assigned_per_student(db):
+    seeded = seed_exam(db, f"rescore-{uuid.uuid4().hex[:8]}", 1, 2, 1)
+    try:
+        # Questions handed out per student (StudentExamQuestion) have no ExamQuestion row
+        db.query(models.ExamQuestion).filter(models.ExamQuestion.exam_id == seeded["exam_id"]).delete()
+        db.commit()
+        assert set(load_exam_test_cases(db, seeded["exam_id"])) == set(seeded["question_ids"])
+        first = seeded["question_ids"][0]
+        assert list(load_exam_test_cases(db, seeded["exam_id"], first)) == [first]
+    finally:
+        db.rollback()
+        cleanup(db, seeded)
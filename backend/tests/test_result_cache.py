@@ -0,0 +1,81 @@
+"""RunResultCache: identical runs in flight are coalesced, failures aren't cached"""
+import asyncio
+
+from backend.services.result_cache import RunResultCache, make_result_key
+
+
+def test_identical_runs_share_one_execution():
+    async def scenario():
+        cache = RunResultCache(max_entries=10, ttl=60)
+        calls = 0
+        release = asyncio.Event()
+
+        async def run():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"status": {"id": 3}, "stdout": "ok"}
+
+        waiters = [asyncio.ensure_future(cache.get_or_run("key", run)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        assert calls == 1
+        assert all(result["stdout"] == "ok" for result in results)
+        # Callers get their own copies
+        results[0]["stdout"] = "changed"
+        assert (await cache.get_or_run("key", run))["stdout"] == "ok"
+        stats = cache.stats()
+        assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 2, 1)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_run():
+    async def scenario():
+        cache = RunResultCache(max_entries=10, ttl=60)
+        release = asyncio.Event()
+
+        async def run():
+            await release.wait()
+            return {"status": {"id": 3}, "stdout": "ok"}
+
+        first = asyncio.ensure_future(cache.get_or_run("key", run))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.get_or_run("key", run))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert (await second)["stdout"] == "ok"
+        assert cache.get("key")["stdout"] == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_internal_errors_are_not_cached():
+    async def scenario():
+        cache = RunResultCache(max_entries=10, ttl=60)
+        calls = 0
+
+        async def run():
+            nonlocal calls
+            calls += 1
+            return {"status": {"id": 13}}
+
+        await cache.get_or_run("key", run)
+        await cache.get_or_run("key", run)
+        assert calls == 2
+        assert cache.get("key") is None
+
+    asyncio.run(scenario())
+
+
+def test_result_key_only_ignores_line_endings_and_the_final_newline():
+    def key(source):
+        return make_result_key(source, 71, "tests", {})
+
+    source = 'print("a")\nprint("b")'
+    assert key(source) == key(source + "\n") == key(source.replace("\n", "\r\n") + "\r\n")
+    # Whitespace a program can see stays part of the key
+    assert key('print("""a  \n""")') != key('print("""a\n""")')
+    assert key("\n" + source) != key(source)
@@ -0,0 +1,82 @@
+"""Run-code admission: per-student token bucket, one run in flight, bounded queue"""
+import asyncio
+
+import pytest
+
+from backend.services.run_admission import (
+    REJECT_IN_PROGRESS,
+    REJECT_QUEUE_FULL,
+    REJECT_QUEUE_TIMEOUT,
+    REJECT_RATE_LIMITED,
+    RunAdmission,
+    RunRejected,
+)
+
+
+def test_burst_then_rate_limited():
+    admission = RunAdmission(rate_per_minute=6, burst=2, max_concurrent=10)
+    for _ in range(2):
+        admission.release(admission.admit("student"))
+    with pytest.raises(RunRejected) as rejected:
+        admission.admit("student")
+    assert rejected.value.reason == REJECT_RATE_LIMITED
+    assert rejected.value.status_code == 429
+    # One token every 10 seconds at 6 per minute
+    assert 9 < rejected.value.retry_after <= 10
+    # Other students have their own bucket
+    admission.release(admission.admit("other"))
+
+
+def test_one_run_in_flight_per_student():
+    admission = RunAdmission(rate_per_minute=60, burst=5, max_concurrent=10)
+    ticket = admission.admit("student")
+    with pytest.raises(RunRejected) as rejected:
+        admission.admit("student")
+    assert rejected.value.reason == REJECT_IN_PROGRESS
+    assert rejected.value.status_code == 429
+    assert rejected.value.queue_position == 0
+    admission.release(ticket)
+    admission.release(admission.admit("student"))
+
+
+def test_queue_positions_and_hand_over():
+    async def scenario():
+        admission = RunAdmission(rate_per_minute=60, burst=5, max_concurrent=1, max_queue=1)
+        first = admission.admit("a")
+        second = admission.admit("b")
+        assert first.started and not second.started
+
+        with pytest.raises(RunRejected) as in_progress:
+            admission.admit("b")
+        assert in_progress.value.reason == REJECT_IN_PROGRESS
+        assert in_progress.value.queue_position == 1
+
+        with pytest.raises(RunRejected) as full:
+            admission.admit("c")
+        assert full.value.reason == REJECT_QUEUE_FULL
+        assert full.value.status_code == 503
+        assert full.value.queue_position == 2
+
+        admission.release(first)
+        await admission.wait_turn(second)
+        assert second.started
+        assert admission.stats()["running"] == 1
+        admission.release(second)
+        assert admission.stats()["running"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout():
+    async def scenario():
+        admission = RunAdmission(rate_per_minute=60, burst=5, max_concurrent=1, max_queue=1, queue_timeout=0.01)
+        first = admission.admit("a")
+        with pytest.raises(RunRejected) as rejected:
+            async with admission.run("b"):
+                pass
+        assert rejected.value.reason == REJECT_QUEUE_TIMEOUT
+        # The timed-out ticket gave its queue place back
+        assert admission.stats()["queue_depth"] == 0
+        admission.release(first)
+
+    asyncio.run(scenario())
@@ -0,0 +1,25 @@
+"""Per-question CPU limits from the question limit and reference calibrations"""
+from backend.services import time_limits
+from backend.services.time_limits import resolve_cpu_time_limit
+
+
+def test_ceiling_and_question_limit():
+    assert resolve_cpu_time_limit() == time_limits.GRADING_MAX_CPU_TIME_LIMIT
+    assert resolve_cpu_time_limit(30) == time_limits.GRADING_MAX_CPU_TIME_LIMIT
+    assert resolve_cpu_time_limit(2) == 2
+
+
+def test_calibration_for_the_same_language_tightens_the_limit():
+    runtimes = {"71": {"time_ms": 400, "safety_factor": 3}}
+    assert resolve_cpu_time_limit(2, runtimes, 71) == 1.2
+    # Never loosens the question's own limit
+    assert resolve_cpu_time_limit(1, runtimes, 71) == 1
+    # Other languages aren't calibrated
+    assert resolve_cpu_time_limit(2, runtimes, 54) == 2
+    assert resolve_cpu_time_limit(2, runtimes) == 2
+
+
+def test_floor():
+    runtimes = {"54": {"time_ms": 10}}
+    assert resolve_cpu_time_limit(2, runtimes, 54) == time_limits.GRADING_MIN_CPU_TIME_LIMIT
+    assert resolve_cpu_time_limit(0.1) == time_limits.GRADING_MIN_CPU_TIME_LIMIT
@@ -757,7 +757,8 @@ const Practice_Platform = () => {
                 body: JSON.stringify({
                     source_code: code,
                     language: languageMapping[language] || language,
-                    stdin: stdin || ""
+                    stdin: stdin || "",
+                    question_id: currentQuestion?.id
                 })
             });
 
@@ -789,7 +790,7 @@ const Practice_Platform = () => {
         } finally {
             setIsRunning(false);
         }
-    }, [code, language, languageMapping, examId, makeAPICall, stdin]);
+    }, [code, language, languageMapping, examId, makeAPICall, stdin, currentQuestion]);
 
     // Solution unlock handler
     const handleUnlockSolution = useCallback(() => {
@@ -1118,7 +1118,8 @@ const Student_UI = () => {
         body: JSON.stringify({
           source_code: code,
           language: languageMapping[language] || language,
-          stdin: stdin || ""
+          stdin: stdin || "",
+          question_id: currentQuestion?.id
         })
       });
 
@@ -1150,7 +1151,7 @@ const Student_UI = () => {
     } finally {
       setIsRunning(false);
     }
-  }, [code, language, languageMapping, examId, makeAPICall, stdin]);
+  }, [code, language, languageMapping, examId, makeAPICall, stdin, currentQuestion]);
 
 
   // Utility functions
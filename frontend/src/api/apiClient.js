@@ -4,7 +4,7 @@ import axios from "axios";
 const host_ip = import.meta.env.VITE_HOST_IP;
 console.log("Using API host:", host_ip);
 
-const API_BASE = `http://${host_ip}:8000`;
+export const API_BASE = `http://${host_ip}:8000`;
 
 const api = axios.create({
   baseURL: API_BASE,
@@ -4,7 +4,7 @@ import { Progress } from '@/components/ui/progress';
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { Alert, AlertDescription } from '@/components/ui/alert';
 import { CheckCircle, XCircle, Clock } from 'lucide-react';
-import api from '../api/apiClient'; // Import your API client
+import api, { API_BASE } from '../api/apiClient'; // Import your API client
 
 export const SubmissionProcessor = ({ examId }) => {
   const [isProcessing, setIsProcessing] = useState(false);
@@ -26,14 +26,67 @@ export const SubmissionProcessor = ({ examId }) => {
       setIsProcessing(true);
       setShowDialog(true);
       
-      // Start polling for status
-      pollStatus(data.job_id);
+      // Follow progress as it happens
+      watchStatus(data.job_id);
     } catch (error) {
       console.error('Error starting processing:', error);
       alert(`Failed to start processing submissions: ${error.response?.data?.detail || error.message}`);
     }
   };
 
+  const finishJob = (currentJobId) => {
+    setIsProcessing(false);
+    // Clean up job after 30 seconds
+    setTimeout(async () => {
+      try {
+        await api.delete(`/processing-jobs/${currentJobId}`);
+      } catch (error) {
+        console.error('Error cleaning up job:', error);
+      }
+    }, 30000);
+  };
+
+  // Server-Sent Events: one update per graded submission. EventSource
+  // reconnects on its own and resumes from the last event id it saw.
+  const watchStatus = (currentJobId) => {
+    if (typeof EventSource === 'undefined') {
+      pollStatus(currentJobId);
+      return;
+    }
+
+    const source = new EventSource(
+      `${API_BASE}/processing-jobs/${currentJobId}/events`,
+      { withCredentials: true }
+    );
+
+    const applySnapshot = (event) => setStatus(JSON.parse(event.data));
+
+    source.addEventListener('status', applySnapshot);
+    source.addEventListener('job', applySnapshot);
+    source.addEventListener('submission', (event) => {
+      const { outcome, error, ...progress } = JSON.parse(event.data);
+      setStatus((prev) => ({
+        ...prev,
+        ...progress,
+        errors: error ? [...(prev?.errors || []), error] : (prev?.errors || [])
+      }));
+    });
+    source.addEventListener('end', (event) => {
+      source.close();
+      const finalStatus = JSON.parse(event.data);
+      if (finalStatus.status !== 'deleted') {
+        setStatus(finalStatus);
+      }
+      finishJob(currentJobId);
+    });
+    source.onerror = () => {
+      // Closed for good (e.g. 404 or no SSE support on a proxy): fall back to polling
+      if (source.readyState === EventSource.CLOSED) {
+        pollStatus(currentJobId);
+      }
+    };
+  };
+
   const pollStatus = async (currentJobId) => {
     const poll = async () => {
       try {
@@ -48,15 +101,7 @@ export const SubmissionProcessor = ({ examId }) => {
         setStatus(statusData);
 
         if (statusData.status === 'completed' || statusData.status === 'failed') {
-          setIsProcessing(false);
-          // Clean up job after 30 seconds
-          setTimeout(async () => {
-            try {
-              await api.delete(`/processing-jobs/${currentJobId}`);
-            } catch (error) {
-              console.error('Error cleaning up job:', error);
-            }
-          }, 30000);
+          finishJob(currentJobId);
         } else {
           // Continue polling every 2 seconds
           setTimeout(poll, 2000);